@@ -0,0 +1,175 @@
+#
+#  Batch translation of DSET JSON record files into ISO 19139 XML files.
+#
+import itertools
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import api.inputjson as dset_input
+import api.output as dset_output
+import api.translate.dset as dset_translate
+import api.util.profile as dset_profile
+
+
+def translateFileToBytes(inputFile, inputDir, outputDir, templatePath):
+    """ Translate a single DSET record file, without writing the ISO record.
+        Returns (inputFile, outputFile, isoBytes, errorMessage), for dset_output.writeFiles(); a failed record does
+        not raise, it returns its error message.
+    """
+    try:
+        jsonData = dset_input.getJSONFileData(inputFile)
+        isoBytes = dset_translate.transformDSETToISOBytes(jsonData, templatePath)
+    except Exception as error:
+        return inputFile, None, None, '%s: %s' % (type(error).__name__, error)
+    return inputFile, dset_output.getOutputFileName(inputFile, inputDir, outputDir), isoBytes, None
+
+
+def translateFileChunk(inputFiles, translate, writerThreads):
+    """ Translate and write a chunk of files in a worker process; a list of dset_output.writeOutputFile() results. """
+    return list(dset_output.writeFiles(map(translate, inputFiles), writerThreads))
+
+
+def initializeWorker(templatePath, profiling=False):
+    """ Load the ISO template, and compile its translation plan, once per worker process, before any records are
+        translated.  With profiling, the worker starts from zeroed counters, whether it was forked or spawned. """
+    if profiling:
+        dset_profile.enable()
+        dset_profile.profile.reset()
+    dset_translate.getTemplateAnchors(templatePath)
+
+
+def mapTasks(executor, function, tasks, chunkSize, profiling):
+    """ Yield executor.map(function, tasks) results in order.  With profiling, each worker returns the counters
+        collected for its task along with the result, and they are merged into this process's profile. """
+    if not profiling:
+        yield from executor.map(function, tasks, chunksize=chunkSize)
+        return
+    for (result, counters) in executor.map(partial(dset_profile.callAndTakeCounters, function), tasks,
+                                           chunksize=chunkSize):
+        dset_profile.profile.merge(counters)
+        yield result
+
+
+def getChunkSize(numFiles, numWorkers):
+    """ Choose how many files to send to a worker at once: large enough to amortize task overhead,
+        small enough that all workers stay busy until the end of the run. """
+    return max(1, min(64, numFiles // (numWorkers * 8)))
+
+
+def translateFiles(inputFiles, inputDir, outputDir, templatePath, numWorkers=1, profiling=False, writerThreads=0):
+    """ Translate a list of DSET record files, yielding (inputFile, outputFile, errorMessage) results
+        in input order, as dset_output.writeOutputFile() returns them; a failed record has its error message.
+        With more than one worker, records are translated and written by a pool of worker processes.
+        With writerThreads, each process writes its files on that many threads while it translates the next records.
+        With profiling, the workers' profile counters are added to this process's profile.
+    """
+    translate = partial(translateFileToBytes, inputDir=inputDir, outputDir=outputDir, templatePath=templatePath)
+    if numWorkers <= 1:
+        yield from dset_output.writeFiles(map(translate, inputFiles), writerThreads)
+        return
+
+    # Each task is a chunk of files, so a worker's writes overlap its translation of the rest of the chunk.
+    chunkSize = getChunkSize(len(inputFiles), numWorkers)
+    chunks = [inputFiles[start:start + chunkSize] for start in range(0, len(inputFiles), chunkSize)]
+    translateChunk = partial(translateFileChunk, translate=translate, writerThreads=writerThreads)
+    with ProcessPoolExecutor(max_workers=numWorkers, initializer=initializeWorker,
+                             initargs=(templatePath, profiling)) as executor:
+        for results in mapTasks(executor, translateChunk, chunks, 1, profiling):
+            yield from results
+
+
+def getRecordID(jsonData):
+    """ Return a record's metadata_id as a string, for naming its output; a number is converted to a string.
+        Raises ValueError for a record without a metadata_id, or with one that is not a string or a number. """
+    recordID = jsonData.get('metadata_id')
+    if isinstance(recordID, (int, float)) and not isinstance(recordID, bool):
+        recordID = str(recordID)
+    if not isinstance(recordID, str) or not recordID:
+        raise ValueError('metadata_id is missing or not a string: %r' % (recordID,))
+    return recordID
+
+
+def translateRecordLines(numberedLines, templatePath):
+    """ Translate a chunk of (lineNumber, lineText) JSON Lines records.
+        Returns a list of (lineNumber, recordID, isoText, errorMessage); errorMessage is None on success, and
+        recordID is always a non-empty string then.
+    """
+    results = []
+    for (lineNumber, lineText) in numberedLines:
+        try:
+            jsonData = dset_input.getJSONData(lineText)
+            isoText = dset_translate.transformDSETToISO(jsonData, templatePath)
+            results.append((lineNumber, getRecordID(jsonData), isoText, None))
+        except Exception as error:
+            results.append((lineNumber, None, None, '%s: %s' % (type(error).__name__, error)))
+    return results
+
+
+def translateStream(numberedLines, templatePath, numWorkers=1, chunkSize=32, profiling=False):
+    """ Translate a stream of (lineNumber, lineText) JSON Lines records, yielding translateRecordLines() results
+        in input order.  Only a fixed number of chunks is in flight at once, so memory use stays constant
+        no matter how long the input stream is.  With profiling, the workers' profile counters are added to this
+        process's profile.
+    """
+    numberedLines = iter(numberedLines)
+    chunks = iter(lambda: list(itertools.islice(numberedLines, chunkSize)), [])
+    if numWorkers <= 1:
+        for chunk in chunks:
+            yield from translateRecordLines(chunk, templatePath)
+        return
+
+    translate = translateRecordLines
+    if profiling:
+        translate = partial(dset_profile.callAndTakeCounters, translateRecordLines)
+
+    def getResults(future):
+        if not profiling:
+            return future.result()
+        (results, counters) = future.result()
+        dset_profile.profile.merge(counters)
+        return results
+
+    with ProcessPoolExecutor(max_workers=numWorkers, initializer=initializeWorker,
+                             initargs=(templatePath, profiling)) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(translate, chunk, templatePath))
+            if len(pending) >= 2 * numWorkers:
+                yield from getResults(pending.popleft())
+        while pending:
+            yield from getResults(pending.popleft())
+
+
+class BatchSummary:
+    """ Tally of a batch run: records translated, records that failed, and the error for each failed file.
+        action and itemName word the report for other kinds of batch, e.g. 'Parsed' and 'files'. """
+
+    def __init__(self, action='Translated', itemName='records'):
+        self.action = action
+        self.itemName = itemName
+        self.startTime = time.perf_counter()
+        self.translated = 0
+        self.skipped = 0            # unchanged records skipped by an incremental run
+        self.removed = 0            # outputs deleted because their input files disappeared
+        self.errors = []            # list of (inputFile, errorMessage)
+
+    def add(self, inputFile, errorMessage):
+        if errorMessage:
+            self.errors.append((inputFile, errorMessage))
+        else:
+            self.translated += 1
+
+    def report(self, stream):
+        elapsed = time.perf_counter() - self.startTime
+        total = self.translated + len(self.errors)
+        rate = total / elapsed if elapsed > 0 else 0.0
+        print('%s %d of %d %s in %.2f seconds (%.1f %s/sec); %d failures.'
+              % (self.action, self.translated, total, self.itemName, elapsed, rate, self.itemName, len(self.errors)),
+              file=stream)
+        if self.skipped or self.removed:
+            print('Skipped %d unchanged records; removed %d outputs of deleted input files.'
+                  % (self.skipped, self.removed), file=stream)
+        for (inputFile, errorMessage) in self.errors:
+            print('  FAILED ' + inputFile + ': ' + errorMessage, file=stream)
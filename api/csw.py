@@ -0,0 +1,238 @@
+#
+#  Functions for publishing ISO records to a CSW-T (catalogue service transaction) endpoint such as GeoNetwork's
+#  csw-publication service.  Many Insert or Delete operations are packed into each csw:Transaction request, and
+#  batches are sent concurrently over a pool of keep-alive connections.  Each TransactionResponse is parsed, so the
+#  records of a batch the service did not fully apply are sent again in smaller batches, and the records it refused
+#  are reported, with their identifiers, for a later retry.
+#
+import html
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from lxml import etree
+
+GEONETWORK_BASE_URL = 'https://geonetwork.prototype.ucar.edu'
+CSW_PUBLICATION_PATH = '/geonetwork/srv/eng/csw-publication'
+
+NAMESPACES = {'csw': 'http://www.opengis.net/cat/csw/2.0.2',
+              'ogc': 'http://www.opengis.net/ogc',
+              'apiso': 'http://www.opengis.net/cat/csw/apiso/1.0',
+              'ows': 'http://www.opengis.net/ows',
+              'dc': 'http://purl.org/dc/elements/1.1/'}
+
+DEFAULT_BATCH_SIZE = 100
+
+# Seconds to wait for the service to connect, and to answer a transaction; a large Insert batch can take minutes.
+TRANSACTION_TIMEOUT = (10, 300)
+
+# HTTP status codes worth retrying: rate limiting and temporary server trouble.
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Status codes after which a transaction that is not safe to repeat, such as an Insert, is retried: the service
+# refused it before applying it.  A 500, 502 or 504, or a response that timed out, may follow a transaction the
+# service applied.
+UNAPPLIED_STATUS_CODES = {429, 503}
+
+TRANSACTION_START = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+                     '<csw:Transaction service="CSW" version="2.0.2" xmlns:csw="%(csw)s" xmlns:ogc="%(ogc)s"'
+                     ' xmlns:apiso="%(apiso)s">\n' % NAMESPACES).encode('utf-8')
+TRANSACTION_END = b'</csw:Transaction>\n'
+
+# A Delete operation matches one record by its exact identifier.  The deleteCSW.xml template uses PropertyIsLike,
+# in which '_' and '%' in an identifier would act as wildcards.
+DELETE_OPERATION = ('    <csw:Delete>\n'
+                    '        <csw:Constraint version="1.0.0">\n'
+                    '            <ogc:Filter>\n'
+                    '                <ogc:PropertyIsEqualTo>\n'
+                    '                    <ogc:PropertyName>apiso:identifier</ogc:PropertyName>\n'
+                    '                    <ogc:Literal>%s</ogc:Literal>\n'
+                    '                </ogc:PropertyIsEqualTo>\n'
+                    '            </ogc:Filter>\n'
+                    '        </csw:Constraint>\n'
+                    '    </csw:Delete>\n')
+
+
+class TransactionError(Exception):
+    """ Raised when a CSW transaction request fails, after all retries. """
+
+
+def getPublicationURL(baseURL=GEONETWORK_BASE_URL):
+    """ Return the CSW-T endpoint of a GeoNetwork server, given its base URL, e.g. http://localhost:8080 . """
+    return baseURL + CSW_PUBLICATION_PATH
+
+
+def getSession(poolSize):
+    """ Return a requests session that keeps up to poolSize connections open for reuse.
+        Transactions are POST requests, so they are retried by sendTransaction() rather than by the session. """
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=poolSize)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+#
+#  Transaction documents
+#
+def stripXMLDeclaration(recordXML):
+    """ Return UTF-8 XML bytes without their XML declaration, so they can be embedded in a larger document. """
+    recordXML = recordXML.lstrip()
+    if recordXML.startswith(b'<?xml'):
+        recordXML = recordXML[recordXML.index(b'?>') + 2:].lstrip()
+    return recordXML
+
+
+def makeInsertTransaction(records):
+    """ Return a csw:Transaction inserting every record of a list of UTF-8 encoded ISO XML records.
+        The records are copied into the transaction as they are, without being parsed again. """
+    parts = [TRANSACTION_START, b'    <csw:Insert>\n']
+    for recordXML in records:
+        parts.append(stripXMLDeclaration(recordXML))
+        parts.append(b'\n')
+    parts += [b'    </csw:Insert>\n', TRANSACTION_END]
+    return b''.join(parts)
+
+
+def makeDeleteTransaction(identifiers):
+    """ Return a csw:Transaction deleting the record with each identifier of a list. """
+    operations = ''.join(DELETE_OPERATION % html.escape(identifier, quote=False) for identifier in identifiers)
+    return TRANSACTION_START + operations.encode('utf-8') + TRANSACTION_END
+
+
+def parseTransactionResponse(content):
+    """ Return {'totalInserted': n, 'totalUpdated': n, 'totalDeleted': n, 'insertedIdentifiers': [...]} from a
+        csw:TransactionResponse; insertedIdentifiers lists the identifiers of its csw:InsertResult records, if any.
+        Raises TransactionError for an ows:ExceptionReport, or a response that is not a TransactionResponse. """
+    try:
+        root = etree.fromstring(content)
+    except etree.XMLSyntaxError as error:
+        raise TransactionError('Response is not XML: %s' % error)
+    if root.tag == '{%s}ExceptionReport' % NAMESPACES['ows']:
+        messages = root.xpath('.//ows:ExceptionText/text()', namespaces=NAMESPACES)
+        raise TransactionError('Exception report: %s' % ' '.join(messages).strip())
+    summary = root.find('csw:TransactionSummary', namespaces=NAMESPACES)
+    if root.tag != '{%s}TransactionResponse' % NAMESPACES['csw'] or summary is None:
+        raise TransactionError('Response is not a csw:TransactionResponse: %s' % etree.QName(root).localname)
+    totals = {name: int(summary.findtext('csw:' + name, default='0', namespaces=NAMESPACES))
+              for name in ('totalInserted', 'totalUpdated', 'totalDeleted')}
+    totals['insertedIdentifiers'] = root.xpath('csw:InsertResult/csw:BriefRecord/dc:identifier/text()',
+                                               namespaces=NAMESPACES)
+    return totals
+
+
+#
+#  Sending transactions
+#
+def sendTransaction(session, url, transaction, auth=None, retries=3, backoff=1.0, idempotent=True,
+                    timeout=TRANSACTION_TIMEOUT):
+    """ POST a csw:Transaction and return the totals of its TransactionResponse.
+        Connection failures and retryable status codes are retried, waiting backoff * 2**attempt seconds;
+        any other failure raises TransactionError at once.  A transaction that is not idempotent, such as an
+        Insert, is retried only when the service cannot have applied it: after a failure to connect, a 429 or a 503.
+    """
+    headers = {'Content-Type': 'application/xml'}
+    (retryErrors, retryStatusCodes) = (((requests.ConnectionError, requests.Timeout), RETRY_STATUS_CODES) if idempotent
+                                       else ((requests.ConnectionError,), UNAPPLIED_STATUS_CODES))
+    for attempt in range(retries + 1):
+        try:
+            response = session.post(url, data=transaction, headers=headers, auth=auth, timeout=timeout)
+            if response.status_code == 200:
+                return parseTransactionResponse(response.content)
+            error = TransactionError('HTTP %d: %s' % (response.status_code, response.text[:200]))
+            if response.status_code not in retryStatusCodes:
+                raise error
+        except requests.RequestException as requestError:
+            error = TransactionError(str(requestError))
+            if not isinstance(requestError, retryErrors):
+                raise error
+        if attempt < retries:
+            time.sleep(backoff * 2 ** attempt)
+    raise error
+
+
+def getBatches(items, batchSize):
+    """ Yield lists of up to batchSize items from an iterable. """
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batchSize:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def sendBatches(session, url, batches, makeTransaction, totalName, auth=None, numWorkers=4, retries=3, backoff=1.0,
+                idempotent=True, timeout=TRANSACTION_TIMEOUT):
+    """ Send one transaction per batch of (identifier, operation data) pairs, on numWorkers threads.
+        Yields (identifiers, totals, errorMessage) for the records of each batch, in batch order; totals is None for
+        a failed request, and errorMessage is None for records the service applied.
+
+        When a response counts fewer records under totalName than the batch holds:
+          - an idempotent operation, such as a Delete, is complete: the records it did not count no longer exist.
+          - otherwise the records the response lists as applied are yielded as done, and the rest are sent again
+            in halves, down to single records, so that only the records the service refuses are yielded with an
+            error message.  If the response does not list the records it applied, the batch is yielded with an
+            error, since sending any of it again could apply a record twice.
+    """
+    def send(batch):
+        identifiers = [identifier for (identifier, data) in batch]
+        try:
+            totals = sendTransaction(session, url, makeTransaction([data for (identifier, data) in batch]), auth,
+                                     retries, backoff, idempotent, timeout)
+        except TransactionError as error:
+            return [(identifiers, None, str(error))]
+        if totals[totalName] >= len(batch) or idempotent:
+            return [(identifiers, totals, None)]
+
+        errorMessage = '%s is %d for a batch of %d records' % (totalName, totals[totalName], len(batch))
+        applied = set(totals['insertedIdentifiers'])
+        if totals[totalName] > len(applied):
+            return [(identifiers, totals, errorMessage + ', and the response does not list them')]
+        if len(batch) == 1:
+            return [(identifiers, totals, errorMessage)]
+        results = []
+        done = [identifier for identifier in identifiers if getRecordIdentifier(identifier) in applied]
+        if done:
+            results.append((done, dict(totals, **{totalName: len(done)}), None))
+        rest = [(identifier, data) for (identifier, data) in batch if getRecordIdentifier(identifier) not in applied]
+        half = (len(rest) + 1) // 2
+        for smallerBatch in (rest[:half], rest[half:]):
+            if smallerBatch:
+                results += send(smallerBatch)
+        return results
+
+    # Keep a bounded number of batches in flight, so a long record list is not built into transactions all at once.
+    with ThreadPoolExecutor(max_workers=numWorkers) as executor:
+        pending = deque()
+        for batch in batches:
+            pending.append(executor.submit(send, batch))
+            if len(pending) >= 2 * numWorkers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def getRecordIdentifier(identifier):
+    """ Return the record identifier of a batch item's identifier, which is the record identifier itself, or a
+        tuple starting with it, e.g. (record identifier, file path). """
+    return identifier[0] if isinstance(identifier, tuple) else identifier
+
+
+def insertRecords(session, url, records, batchSize=DEFAULT_BATCH_SIZE, **options):
+    """ Insert (identifier, UTF-8 ISO XML) records, batchSize records per transaction; an identifier is the record's
+        fileIdentifier, or a tuple starting with it.
+        Yields (identifiers, totals, errorMessage) as sendBatches() does; options are passed to it. """
+    return sendBatches(session, url, getBatches(records, batchSize), makeInsertTransaction, 'totalInserted',
+                       idempotent=False, **options)
+
+
+def deleteRecords(session, url, identifiers, batchSize=DEFAULT_BATCH_SIZE, **options):
+    """ Delete the records with the given identifiers, batchSize records per transaction.
+        Yields (identifiers, totals, errorMessage) per batch, as sendBatches() does; options are passed to it.
+        A record that no longer exists counts as deleted. """
+    return sendBatches(session, url, getBatches(((identifier, identifier) for identifier in identifiers), batchSize),
+                       makeDeleteTransaction, 'totalDeleted', **options)
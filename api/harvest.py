@@ -0,0 +1,160 @@
+#
+#  Functions for harvesting many DataCite records: paging through the DataCite /dois listing,
+#  and fetching lists of DOIs concurrently over a bounded pool of HTTP connections.
+#
+import email.utils
+import json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from api.httpcache import NotCachedError
+
+DATACITE_API_URL = 'https://api.datacite.org'
+
+# DataCite allows at most 1000 records per page of a /dois listing.
+MAX_PAGE_SIZE = 1000
+
+
+def getSession(poolSize):
+    """ Return a requests session whose connection pool holds up to poolSize keep-alive connections.
+        Connection errors and temporary server errors are retried with exponential backoff. """
+    retries = Retry(total=5, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504],
+                    allowed_methods=['GET'])
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=poolSize, max_retries=retries)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def getDOIFileList(doiFilePath):
+    """ Return the DOIs listed in a text file, one DOI per line; blank lines and '#' comments are ignored. """
+    dois = []
+    with open(doiFilePath, 'r') as doiFile:
+        for line in doiFile:
+            doi = line.split('#')[0].strip()
+            if doi:
+                dois.append(doi)
+    return dois
+
+
+def getAttributes(responseBody):
+    """ Return the record attributes from the body of a DataCite /dois/<doi> response. """
+    return json.loads(responseBody)['data']['attributes']
+
+
+def getLastModified(attributes):
+    """ Return a record's 'updated' time as an HTTP date, for use as its Last-Modified validator; None if the record
+        has no valid 'updated' time.  Records from a /dois listing come without the ETag of a /dois/<doi> response. """
+    try:
+        updated = datetime.fromisoformat(attributes['updated'].replace('Z', '+00:00'))
+    except (KeyError, AttributeError, ValueError):
+        return None
+    if updated.tzinfo is None:
+        updated = updated.replace(tzinfo=timezone.utc)
+    return email.utils.format_datetime(updated.astimezone(timezone.utc), usegmt=True)
+
+
+def fetchDataCiteRecord(session, doi, baseURL=DATACITE_API_URL, cache=None):
+    """ Return the DataCite attributes for a single DOI, or None if the DOI does not exist.
+        With a response cache, fresh cached responses are served without any request, and stale ones are
+        revalidated with a conditional request.  In offline mode, a DOI missing from the cache raises NotCachedError.
+    """
+    entry = cache.get(doi) if cache else None
+    if entry and cache.isFresh(entry):
+        return getAttributes(entry.body)
+    if cache and cache.offline:
+        raise NotCachedError('DOI is not in the response cache: ' + doi)
+
+    headers = entry.getValidationHeaders() if entry else {}
+    response = session.get(baseURL + '/dois/' + doi, headers=headers)
+    if response.status_code == 304 and entry:
+        cache.markRevalidated(doi)
+        return getAttributes(entry.body)
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    if cache:
+        cache.put(doi, response.content, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+    return getAttributes(response.content)
+
+
+def fetchListingPage(session, url, params=None):
+    """ Return one page of a DataCite /dois listing as a dictionary. """
+    response = session.get(url, params=params)
+    response.raise_for_status()
+    return response.json()
+
+
+def getPrefixRecords(session, prefix, baseURL=DATACITE_API_URL, pageSize=MAX_PAGE_SIZE, cache=None):
+    """ Yield the DataCite attributes of every DOI registered under a prefix.
+        Pages are requested with cursor pagination, following each page's 'next' link until the last page.
+        The next page is downloaded in the background while records from the current page are being consumed.
+        With a response cache, each record is also cached under its DOI; in offline mode, only cached records are
+        returned and no listing is requested.
+    """
+    if cache and cache.offline:
+        for (doi, body) in cache.getPrefixBodies(prefix):
+            yield getAttributes(body)
+        return
+
+    params = {'prefix': prefix, 'page[cursor]': 1, 'page[size]': min(pageSize, MAX_PAGE_SIZE)}
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        nextPage = executor.submit(fetchListingPage, session, baseURL + '/dois', params)
+        while nextPage:
+            page = nextPage.result()
+
+            # The 'next' link already carries the cursor and the other query parameters.
+            nextURL = page.get('links', {}).get('next')
+            nextPage = executor.submit(fetchListingPage, session, nextURL) if nextURL else None
+            if cache:
+                cache.putMany([(item['attributes']['doi'], json.dumps({'data': item}).encode('utf-8'), None,
+                                getLastModified(item['attributes'])) for item in page['data']])
+            for item in page['data']:
+                yield item['attributes']
+
+
+def getPrefixResults(session, prefix, baseURL=DATACITE_API_URL, cache=None):
+    """ Yield (doi, record, errorMessage) for every DOI registered under a prefix, as getDOIRecords() does.
+        A listing page that cannot be fetched, even after retries, ends the listing with a result for the prefix
+        itself, whose error message says how many records were listed before it; those records are kept. """
+    count = 0
+    try:
+        for record in getPrefixRecords(session, prefix, baseURL, cache=cache):
+            count += 1
+            yield record['doi'], record, None
+    except (requests.RequestException, ValueError) as error:
+        yield ('prefix %s listing' % prefix, None,
+               '%s: %s (after %d records)' % (type(error).__name__, error, count))
+
+
+def getDOIRecords(session, dois, baseURL=DATACITE_API_URL, numWorkers=8, cache=None):
+    """ Fetch DataCite records for a list of DOIs on numWorkers threads.
+        Yields (doi, record, errorMessage) in DOI list order as soon as each record is available;
+        record is None for a DOI that was not found or could not be fetched.
+    """
+    def fetch(doi):
+        try:
+            return doi, fetchDataCiteRecord(session, doi, baseURL, cache), None
+        except (requests.RequestException, LookupError, ValueError) as error:
+            return doi, None, '%s: %s' % (type(error).__name__, error)
+
+    # Keep a bounded number of requests in flight, so a long DOI list is not queued all at once.
+    with ThreadPoolExecutor(max_workers=numWorkers) as executor:
+        pending = deque()
+        for doi in dois:
+            pending.append(executor.submit(fetch, doi))
+            if len(pending) >= 2 * numWorkers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def getOutputFileName(doi):
+    """ Return the ISO output file name for a DOI, e.g. '10.5065/D6WD3XH5' -> '10.5065_D6WD3XH5.xml'. """
+    return doi.replace('/', '_') + '.xml'
@@ -0,0 +1,134 @@
+#
+#  Persistent on-disk cache of DataCite JSON responses, keyed by DOI and stored in a SQLite database.
+#
+import os
+import os.path
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_FILE = os.path.join(os.path.expanduser('~'), '.cache', 'data-tools', 'datacite_responses.sqlite')
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+class NotCachedError(LookupError):
+    """ Raised in offline mode when a DOI is requested that is not in the cache. """
+
+
+class CacheEntry:
+    """ A cached response: the JSON body and the validators needed to revalidate it with the server. """
+
+    def __init__(self, body, etag, lastModified, fetchedAt):
+        self.body = body
+        self.etag = etag
+        self.lastModified = lastModified
+        self.fetchedAt = fetchedAt
+
+    def getValidationHeaders(self):
+        """ Return conditional request headers, so the server can answer '304 Not Modified'. """
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.lastModified:
+            headers['If-Modified-Since'] = self.lastModified
+        return headers
+
+
+class ResponseCache:
+    """ SQLite store of DataCite responses.
+
+        * Entries younger than ttlSeconds are served without contacting DataCite.
+        * Older entries are revalidated with their ETag/Last-Modified values before they are served again.
+        * When the stored bodies exceed maxBytes, the least recently used entries are evicted.
+        * In offline mode, only cached entries are served, however old they are.
+
+        The cache may be shared by several download threads.
+    """
+
+    def __init__(self, cacheFile=DEFAULT_CACHE_FILE, ttlSeconds=DEFAULT_TTL_SECONDS, maxBytes=DEFAULT_MAX_BYTES,
+                 offline=False):
+        cacheDir = os.path.dirname(cacheFile)
+        if cacheDir:
+            os.makedirs(cacheDir, exist_ok=True)
+        self.ttlSeconds = ttlSeconds
+        self.maxBytes = maxBytes
+        self.offline = offline
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(cacheFile, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute('CREATE TABLE IF NOT EXISTS responses ('
+                                 ' doi TEXT PRIMARY KEY, body BLOB NOT NULL, etag TEXT, last_modified TEXT,'
+                                 ' fetched_at REAL NOT NULL, accessed_at REAL NOT NULL, size INTEGER NOT NULL)')
+        self._connection.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)')
+        self._connection.commit()
+        # Size of the stored bodies, kept up to date by each write, so writes need not sum the whole table.
+        self._totalBytes = self._connection.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    def get(self, doi):
+        """ Return the CacheEntry for a DOI, or None if the DOI is not cached. """
+        with self._lock:
+            row = self._connection.execute('SELECT body, etag, last_modified, fetched_at FROM responses WHERE doi = ?',
+                                           (doi.lower(),)).fetchone()
+            if row is None:
+                return None
+            self._connection.execute('UPDATE responses SET accessed_at = ? WHERE doi = ?', (time.time(), doi.lower()))
+            self._connection.commit()
+        return CacheEntry(*row)
+
+    def isFresh(self, entry):
+        """ Return True if an entry may be served without revalidation. """
+        return self.offline or (time.time() - entry.fetchedAt) < self.ttlSeconds
+
+    def put(self, doi, body, etag=None, lastModified=None):
+        """ Store a response body for a DOI, then evict old entries if the cache is over its size limit. """
+        self.putMany([(doi, body, etag, lastModified)])
+
+    def putMany(self, responses):
+        """ Store a list of (doi, body, etag, lastModified) responses in a single transaction. """
+        now = time.time()
+        with self._lock:
+            for (doi, body, etag, lastModified) in responses:
+                replaced = self._connection.execute('SELECT size FROM responses WHERE doi = ?',
+                                                    (doi.lower(),)).fetchone()
+                self._connection.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                         (doi.lower(), body, etag, lastModified, now, now, len(body)))
+                self._totalBytes += len(body) - (replaced[0] if replaced else 0)
+            self._evict()
+            self._connection.commit()
+
+    def markRevalidated(self, doi):
+        """ Restart the time-to-live of an entry that the server confirmed is unchanged. """
+        with self._lock:
+            self._connection.execute('UPDATE responses SET fetched_at = ? WHERE doi = ?', (time.time(), doi.lower()))
+            self._connection.commit()
+
+    def getPrefixBodies(self, prefix):
+        """ Yield (doi, body) for every cached DOI under a prefix; used to harvest a prefix in offline mode. """
+        with self._lock:
+            cursor = self._connection.execute('SELECT doi, body FROM responses WHERE doi LIKE ? ORDER BY doi',
+                                              (prefix.lower() + '/%',))
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(500)
+            if not rows:
+                break
+            yield from rows
+
+    def _evict(self):
+        """ Delete the least recently used entries, a batch at a time, until the stored bodies fit in maxBytes. """
+        while self._totalBytes > self.maxBytes:
+            rows = self._connection.execute('SELECT doi, size FROM responses ORDER BY accessed_at LIMIT 100').fetchall()
+            if not rows:
+                self._totalBytes = 0
+                break
+            for (doi, size) in rows:
+                if self._totalBytes <= self.maxBytes:
+                    break
+                self._connection.execute('DELETE FROM responses WHERE doi = ?', (doi,))
+                self._totalBytes -= size
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -1,21 +1,63 @@
 
 
+import os
 import os.path
 import json
-from urllib.request import urlopen
+import mmap
+
+# orjson, when installed, decodes JSON from bytes, and from memory-mapped files, without decoding it to text first.
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 #import sys
 #import pprint
 
+# Files at least this large are memory-mapped and decoded in place, when orjson is installed.
+MMAP_THRESHOLD = 1024 * 1024
+
 #
 #  Functions for finding and loading text files containing DSET JSON.
 #
 def getJSONData(jsonText):
-    """ Transform a text version of JSON data into a python dictionary. """
+    """ Transform JSON data, as text, UTF-8 bytes or a memoryview of them, into a python dictionary. """
+    if orjson is not None:
+        try:
+            return orjson.loads(jsonText)
+        except orjson.JSONDecodeError:
+            # The json module reports the error, or accepts what orjson does not: NaN, integers over 64 bits.
+            pass
+    if isinstance(jsonText, memoryview):
+        jsonText = jsonText.tobytes()
     jsonData = json.loads(jsonText)
     return jsonData
 
 
+def getJSONFileData(filePath):
+    """ Read a JSON file as bytes, in a single read, and decode it.  With orjson, large files are memory-mapped and
+        decoded in place, so the file's contents are never copied into this process's memory. """
+    with open(filePath, 'rb') as jsonFile:
+        if orjson is not None and os.fstat(jsonFile.fileno()).st_size >= MMAP_THRESHOLD:
+            with mmap.mmap(jsonFile.fileno(), 0, access=mmap.ACCESS_READ) as mappedFile:
+                with memoryview(mappedFile) as mappedBytes:
+                    return getJSONData(mappedBytes)
+        jsonBytes = jsonFile.read()
+    if orjson is None:
+        # The json module parses text; decoding the bytes here frees them before parsing, rather than after.
+        jsonBytes = jsonBytes.decode(json.detect_encoding(jsonBytes))
+    return getJSONData(jsonBytes)
+
+
+def getJSONLines(textStream):
+    """ Yield (lineNumber, lineText) for each non-blank line of a JSON Lines stream, one DSET record per line.
+        Lines are read one at a time, so memory use does not grow with the size of the stream.  A binary stream
+        yields lines as bytes, which getJSONData() decodes without converting them to text. """
+    for lineNumber, lineText in enumerate(textStream, start=1):
+        if lineText.strip():
+            yield lineNumber, lineText
+
+
 def getJSONFileNames(dirPath):
     """ Return a list of paths to files containing JSON records, found by recursive search in a given directory. """
     jsonExtension = '.txt'
@@ -38,45 +80,3 @@ def getTemplateFilePath(templateArgument, defaultTemplate):
 
     templatePath = templateFolder + template
     return templatePath
-
-#
-#  Functions for pulling DataCite records and converting them to JSON.
-#
-
-def getDataCiteRecords(doi):
-    """ Return a list of JSON records obtained from the DataCite DOI website. """
-    dataCiteURL = 'https://api.datacite.org/dois/'
-    filterQuery = '&fq=prefix:10.5065&fq=is_active:true&wt=json'
-    filterResult = '&fl=doi,relatedIdentifier,resourceTypeGeneral,title,description,publicationYear,subject,creator,contributor,contributorType,publisher,rights,rightsURI'
-
-    if doi:
-        textFilter =  doi
-    else:
-        textFilter = '?q=*'
-
-    #fullQuery = dataCiteURL + textFilter + filterQuery + filterResult
-    fullQuery = dataCiteURL + textFilter 
-
-    #print(f'fullQuery == {fullQuery}')
-    #sys.stderr.write('fullQuery: %s\n' % fullQuery)
-
-    ## Determine number of records
-    #with urlopen(fullQuery + '&rows=0') as url:
-    #    response = url.read()
-    #jsonData = json.load(response)
-    #response = jsonData["response"]
-    #numRecords = response["numFound"]
-
-
-    # Get the records
-    #with urlopen(fullQuery + '&rows=' + str(numRecords)) as url:
-    with urlopen(fullQuery) as url:
-        response = url.read()
-    #sys.stderr.write('response: %s\n' % response)
-    jsonData = json.loads(response.decode('utf-8'))
-
-    #pprint.pprint(jsonData)
-
-    response = jsonData['data']['attributes']
-    return response
-
@@ -0,0 +1,109 @@
+#
+#  Manifest of translated records, kept in the output directory so later batch runs can skip records
+#  whose input file, template and tool version are all unchanged.
+#
+import hashlib
+import json
+import os
+import os.path
+
+MANIFEST_FILE_NAME = '.dset2iso_manifest.json'
+
+
+def getFileHash(filePath):
+    """ Return the SHA-256 hex digest of a file's contents. """
+    digest = hashlib.sha256()
+    with open(filePath, 'rb') as file:
+        for block in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def loadManifest(outputDir):
+    """ Return the manifest dictionary saved in an output directory: input path -> record entry.
+        An output directory without a manifest (or with an unreadable one) yields an empty manifest. """
+    manifestPath = os.path.join(outputDir, MANIFEST_FILE_NAME)
+    try:
+        with open(manifestPath, 'r') as manifestFile:
+            return json.load(manifestFile)
+    except (OSError, ValueError):
+        return {}
+
+
+def saveManifest(outputDir, manifest):
+    """ Save the manifest to the output directory, replacing the previous manifest in a single step. """
+    manifestPath = os.path.join(outputDir, MANIFEST_FILE_NAME)
+    temporaryPath = manifestPath + '.tmp'
+    with open(temporaryPath, 'w') as manifestFile:
+        json.dump(manifest, manifestFile, indent=1, sort_keys=True)
+    os.replace(temporaryPath, manifestPath)
+
+
+def getFileState(inputFile):
+    """ Return {'inputHash', 'size', 'mtime'} for an input file.  The file's status is taken before its contents are
+        hashed, so a file edited in the meantime has a newer status than its entry and is hashed again next time. """
+    fileStatus = os.stat(inputFile)
+    return {'inputHash': getFileHash(inputFile), 'size': fileStatus.st_size, 'mtime': fileStatus.st_mtime_ns}
+
+
+def makeEntry(fileState, templateHash, toolVersion, outputFile, outputDir):
+    """ Create the manifest entry recording a successful translation of an input file with the given state. """
+    return dict(fileState, templateHash=templateHash, toolVersion=toolVersion,
+                outputFile=os.path.relpath(outputFile, outputDir))
+
+
+def getManifestKey(inputFile, inputDir):
+    """ Manifest entries are keyed by input path relative to the input directory. """
+    return os.path.relpath(inputFile, inputDir)
+
+
+def isUnchanged(entry, inputFile, templateHash, toolVersion, outputDir, force=False):
+    """ Return (unchanged, fileState) for an input file compared with its manifest entry; see getFileState().
+        Files whose size and modification time match the entry are not re-read; fileState then holds the recorded hash.
+        With force, every file is hashed and reported as changed.
+    """
+    sameSettings = bool(entry) and entry['templateHash'] == templateHash and entry['toolVersion'] == toolVersion
+    outputExists = bool(entry) and os.path.exists(os.path.join(outputDir, entry['outputFile']))
+    if sameSettings and outputExists and not force:
+        fileStatus = os.stat(inputFile)
+        if fileStatus.st_size == entry['size'] and fileStatus.st_mtime_ns == entry['mtime']:
+            return True, {'inputHash': entry['inputHash'], 'size': entry['size'], 'mtime': entry['mtime']}
+    fileState = getFileState(inputFile)
+    unchanged = sameSettings and outputExists and not force and fileState['inputHash'] == entry['inputHash']
+    if unchanged:
+        # The file was touched but its contents are the same; remember its new status to avoid hashing it next time.
+        entry['size'] = fileState['size']
+        entry['mtime'] = fileState['mtime']
+    return unchanged, fileState
+
+
+def planIncrementalRun(manifest, inputFiles, inputDir, outputDir, templateHash, toolVersion, force=False):
+    """ Compare the input files with the manifest.  Returns three lists:
+          * changed:   (inputFile, fileState) for files that must be translated; see getFileState(),
+          * unchanged: input files that can be skipped,
+          * removed:   manifest keys whose input files no longer exist.
+        With force, every input file is changed, but the manifest still finds the removed ones.
+    """
+    changed = []
+    unchanged = []
+    currentKeys = set()
+    for inputFile in inputFiles:
+        key = getManifestKey(inputFile, inputDir)
+        currentKeys.add(key)
+        isSame, fileState = isUnchanged(manifest.get(key), inputFile, templateHash, toolVersion, outputDir, force)
+        if isSame:
+            unchanged.append(inputFile)
+        else:
+            changed.append((inputFile, fileState))
+
+    removed = [key for key in manifest if key not in currentKeys]
+    return changed, unchanged, removed
+
+
+def removeOutputs(manifest, removedKeys, outputDir):
+    """ Delete the output files of inputs that no longer exist, and drop them from the manifest. """
+    for key in removedKeys:
+        entry = manifest.pop(key)
+        outputFile = os.path.join(outputDir, entry['outputFile'])
+        if os.path.exists(outputFile):
+            os.remove(outputFile)
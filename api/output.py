@@ -1,11 +1,157 @@
+import io
+import json
+import os
 import os.path
+import re
+import tarfile
+import threading
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
-def prepareOutputFile(inputFile, inputDir, outputDir):
+
+#
+#  Output files of batch runs.  Each file is written to a temporary file and renamed into place, so a run that is
+#  interrupted leaves complete records only.  Output folders are created once per process, not checked per record.
+#
+def getOutputFileName(inputFile, inputDir, outputDir):
+    """ Return the ISO output file for an input file: its path below outputDir, with the extension '.xml'. """
     outputFile = inputFile.replace(inputDir,outputDir,1)
-    outputFile = os.path.splitext(outputFile)[0] + '.xml'
+    return os.path.splitext(outputFile)[0] + '.xml'
+
+
+# Folders this process has created, or found to exist; writer threads share them.
+createdFolders = set()
+createdFoldersLock = threading.Lock()
+
+
+def makeFolder(folder):
+    """ Create a folder and its parents, unless this process has done so already. """
+    if folder and folder not in createdFolders:
+        with createdFoldersLock:
+            if folder not in createdFolders:
+                # Another batch worker process may create the same directory at the same time.
+                os.makedirs(folder, exist_ok=True)
+                createdFolders.add(folder)
+
+
+def writeFileAtomically(outputFile, data):
+    """ Write bytes to a temporary file beside outputFile, and rename it over outputFile once it is complete.
+        Readers, and runs that are interrupted, see the previous file or the new one, never a partial one. """
+    makeFolder(os.path.dirname(outputFile))
+    temporaryFile = '%s.%d.tmp' % (outputFile, os.getpid())
+    try:
+        with open(temporaryFile, 'wb') as file:
+            file.write(data)
+        os.replace(temporaryFile, outputFile)
+    except BaseException:
+        if os.path.exists(temporaryFile):
+            os.remove(temporaryFile)
+        raise
+
+
+def writeOutputFile(translation):
+    """ Write one (inputFile, outputFile, isoBytes, errorMessage) translation, and return
+        (inputFile, outputFile, errorMessage); a translation that failed is passed on without writing. """
+    (inputFile, outputFile, isoBytes, errorMessage) = translation
+    if errorMessage:
+        return inputFile, None, errorMessage
+    try:
+        writeFileAtomically(outputFile, isoBytes)
+    except Exception as error:
+        return inputFile, None, '%s: %s' % (type(error).__name__, error)
+    return inputFile, outputFile, None
+
+
+def writeFiles(translations, numThreads=0):
+    """ Write an iterable of (inputFile, outputFile, isoBytes, errorMessage) translations, yielding
+        writeOutputFile() results in order.  With numThreads, files are written on that many background threads
+        while the caller produces the next translations; at most 2 * numThreads files wait to be written. """
+    if numThreads <= 0:
+        for translation in translations:
+            yield writeOutputFile(translation)
+        return
+
+    with ThreadPoolExecutor(max_workers=numThreads) as executor:
+        pending = deque()
+        for translation in translations:
+            pending.append(executor.submit(writeOutputFile, translation))
+            if len(pending) >= 2 * numThreads:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+#
+#  Writers for streams of ISO records.  Each writer accepts one record at a time and writes it to a binary
+#  output stream immediately, so nothing accumulates in memory.
+#
+def getArchiveMemberName(recordID, usedNames=None):
+    """ Return a safe file name for a record inside an archive, based on its metadata identifier.
+        Names already in the set usedNames, from a repeated identifier or one that is made safe the same way, get a
+        numeric suffix, e.g. 'id_2.xml'; the name returned is added to usedNames. """
+    baseName = re.sub(r'[^\w.\-]', '_', recordID)
+    memberName = baseName + '.xml'
+    if usedNames is None:
+        return memberName
+    suffix = 1
+    while memberName in usedNames:
+        suffix += 1
+        memberName = '%s_%d.xml' % (baseName, suffix)
+    usedNames.add(memberName)
+    return memberName
+
+
+class JSONLinesWriter:
+    """ Write each ISO record as one line of JSON: {"metadata_id": ..., "iso": ...}. """
+
+    def __init__(self, binaryStream):
+        self.stream = binaryStream
+
+    def write(self, recordID, isoText):
+        line = json.dumps({'metadata_id': recordID, 'iso': isoText}, ensure_ascii=False) + '\n'
+        self.stream.write(line.encode('utf-8'))
+
+    def close(self):
+        self.stream.flush()
+
+
+class TarWriter:
+    """ Write each ISO record as a file in an uncompressed tar archive; the stream need not be seekable. """
+
+    def __init__(self, binaryStream):
+        self.archive = tarfile.open(fileobj=binaryStream, mode='w|')
+        self.memberNames = set()
+
+    def write(self, recordID, isoText):
+        data = isoText.encode('utf-8')
+        memberInfo = tarfile.TarInfo(getArchiveMemberName(recordID, self.memberNames))
+        memberInfo.size = len(data)
+        memberInfo.mtime = time.time()
+        self.archive.addfile(memberInfo, io.BytesIO(data))
+
+    def close(self):
+        self.archive.close()
+
+
+class ZipWriter:
+    """ Write each ISO record as a compressed file in a zip archive; the stream need not be seekable. """
+
+    def __init__(self, binaryStream):
+        self.archive = zipfile.ZipFile(binaryStream, mode='w', compression=zipfile.ZIP_DEFLATED)
+        self.memberNames = set()
+
+    def write(self, recordID, isoText):
+        self.archive.writestr(getArchiveMemberName(recordID, self.memberNames), isoText.encode('utf-8'))
+
+    def close(self):
+        self.archive.close()
+
+
+STREAM_WRITERS = {'jsonl': JSONLinesWriter, 'tar': TarWriter, 'zip': ZipWriter}
 
-    outputFileDir = os.path.dirname(outputFile)
-    if not os.path.exists(outputFileDir):
-        os.makedirs(outputFileDir)
 
-    return outputFile
+def getStreamWriter(outputFormat, binaryStream):
+    """ Return a record writer for the given output format: 'jsonl', 'tar' or 'zip'. """
+    return STREAM_WRITERS[outputFormat](binaryStream)
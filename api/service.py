@@ -0,0 +1,272 @@
+#
+#  Long-running HTTP translation service: DSET or DataCite JSON in, ISO 19139 XML out.
+#
+#  Each process parses its templates, and compiles their translation plans and XPaths, once, so a request pays only
+#  for its own translation rather than for interpreter startup, imports and template parsing.  Translations run in a
+#  bounded pool of worker processes, leaving the asyncio event loop free to accept and answer connections; requests
+#  beyond maxPending are refused with 503 rather than queued without limit.  With no workers, records are
+#  translated one at a time in a thread of the service process.  A pool whose worker process died is replaced.
+#
+#      POST /dset[?template=<file>]       DSET JSON record                  -> ISO 19139 XML
+#      POST /datacite[?template=<file>]   DataCite JSON record attributes   -> ISO 19139 XML
+#      GET  /health                       JSON request counters
+#
+#  Templates are file names in the templates_ISO19139 folder; the defaults are dset_full.xml and datacite.xml.
+#
+#  To run the service: type "python -m api.service --port 8080 --workers 4" in the top-level folder.
+#
+import argparse
+import asyncio
+import json
+import os.path
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http import HTTPStatus
+from urllib.parse import urlsplit, parse_qs
+
+import api.inputjson as dset_input
+import api.translate.dset as dset_translate
+import api.translate.datacite as datacite_translate
+import api.util.xml as xml
+
+TEMPLATE_FOLDER = './templates_ISO19139/'
+
+# Translator name -> default template file.
+DEFAULT_TEMPLATES = {'dset': 'dset_full.xml', 'datacite': 'datacite.xml'}
+
+MAX_BODY_BYTES = 16 * 2**20
+
+
+#
+#  Translation, in worker processes or in the service process
+#
+def loadTemplates(templatePaths):
+    """ Parse templates, locate their anchors and render the DSET template's slots, before the first request needs
+        them.  Raises xml.TemplateError if a template lacks elements its translator needs. """
+    for (translatorName, templatePath) in templatePaths.items():
+        if translatorName == 'dset':
+            xml.getTemplateSlots(templatePath, dset_translate.anchorXPaths, requireAll=True)
+        else:
+            datacite_translate.getTemplateAnchors(templatePath)
+
+
+def translateRecord(translatorName, recordText, templatePath):
+    """ Translate one JSON record, and return (HTTP status, content type, body bytes). """
+    try:
+        record = dset_input.getJSONData(recordText)
+    except ValueError as error:
+        return 400, 'text/plain', ('Invalid JSON: %s' % error).encode('utf-8')
+    try:
+        if translatorName == 'dset':
+            body = dset_translate.transformDSETToISOBytes(record, templatePath)
+        else:
+            body = datacite_translate.translateDataCiteRecord(record, templatePath).encode('utf-8')
+    except xml.TemplateError as error:
+        return 400, 'text/plain', str(error).encode('utf-8')
+    except Exception as error:
+        return 422, 'text/plain', ('%s: %s' % (type(error).__name__, error)).encode('utf-8')
+    return 200, 'application/xml; charset=utf-8', body
+
+
+def getTemplatePath(translatorName, query):
+    """ Return the template requested by a ?template= query parameter, or the translator's default template;
+        None if the template is not a file in the template folder. """
+    templateName = query.get('template', [DEFAULT_TEMPLATES[translatorName]])[0]
+    templatePath = TEMPLATE_FOLDER + templateName
+    if os.path.basename(templateName) != templateName or not os.path.isfile(templatePath):
+        return None
+    return templatePath
+
+
+#
+#  HTTP service
+#
+class BadRequest(Exception):
+    """ Raised for a request that cannot be read; the connection is closed after the error response. """
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+async def readRequest(reader):
+    """ Read one HTTP/1.1 request; return (method, target, version, headers, body), or None at end of stream. """
+    try:
+        requestLine = await reader.readline()
+        if not requestLine.strip():
+            return None
+        (method, target, version) = requestLine.decode('latin-1').split()
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            (name, separator, value) = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+    except ValueError:
+        # A malformed request line, or a line longer than the stream reader's limit.
+        raise BadRequest(400, 'Malformed request')
+    if 'transfer-encoding' in headers:
+        raise BadRequest(411, 'Content-Length is required')
+    length = headers.get('content-length', '0')
+    if not length.isdigit():
+        raise BadRequest(400, 'Invalid Content-Length')
+    length = int(length)
+    if length > MAX_BODY_BYTES:
+        raise BadRequest(413, 'Request body is larger than %d bytes' % MAX_BODY_BYTES)
+    body = await reader.readexactly(length) if length else b''
+    return method, target, version, headers, body
+
+
+def formatResponse(status, contentType, body, keepAlive=True, extraHeaders=()):
+    lines = ['HTTP/1.1 %d %s' % (status, HTTPStatus(status).phrase),
+             'Content-Type: ' + contentType,
+             'Content-Length: %d' % len(body)]
+    lines += ['%s: %s' % header for header in extraHeaders]
+    if not keepAlive:
+        lines.append('Connection: close')
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body
+
+
+class TranslationService:
+    """ Answers translation requests on keep-alive connections; see the module description.
+        numWorkers is the size of the process pool, or 0 to translate in one thread of this process; at most
+        maxPending translations are accepted at once, the rest are refused with 503 and a Retry-After header. """
+
+    def __init__(self, numWorkers=0, maxPending=None):
+        self.templatePaths = {name: TEMPLATE_FOLDER + template for (name, template) in DEFAULT_TEMPLATES.items()}
+        self.numWorkers = numWorkers
+        self.maxPending = maxPending or 4 * max(1, numWorkers)
+        self.pending = 0
+        self.poolRestarts = 0
+        self.counters = Counter()
+        self.connections = {}
+        # Templates are checked here even with workers, so a broken default template stops the service at startup.
+        loadTemplates(self.templatePaths)
+        self.executor = self.makeExecutor()
+
+    def makeExecutor(self):
+        """ Return the pool translations run on, so that the event loop is never blocked by a translation. """
+        if self.numWorkers:
+            return ProcessPoolExecutor(max_workers=self.numWorkers, initializer=loadTemplates,
+                                       initargs=(self.templatePaths,))
+        return ThreadPoolExecutor(max_workers=1)
+
+    async def translate(self, translatorName, recordText, templatePath):
+        if self.pending >= self.maxPending:
+            return 503, 'text/plain', b'Too many pending translations', [('Retry-After', '1')]
+        self.pending += 1
+        executor = self.executor
+        try:
+            loop = asyncio.get_running_loop()
+            response = await loop.run_in_executor(executor, translateRecord, translatorName, recordText, templatePath)
+        except BrokenProcessPool as error:
+            # A worker process died, e.g. killed for lack of memory, and the pool accepts no more work.  Requests
+            # in flight on it fail; the first of them replaces the pool for later requests.
+            if self.executor is executor:
+                self.executor = self.makeExecutor()
+                self.poolRestarts += 1
+                executor.shutdown(wait=False)
+            response = (500, 'text/plain', ('%s: %s' % (type(error).__name__, error)).encode('utf-8'))
+        except Exception as error:
+            # The worker process died, or the pool was shut down; translation errors are answered by translateRecord.
+            response = (500, 'text/plain', ('%s: %s' % (type(error).__name__, error)).encode('utf-8'))
+        finally:
+            self.pending -= 1
+        return response + ([],)
+
+    async def handleRequest(self, method, target, body):
+        """ Return (status, content type, body, extra headers) answering one request. """
+        url = urlsplit(target)
+        translatorName = url.path.strip('/')
+        if url.path == '/health' and method == 'GET':
+            health = {'pending': self.pending, 'workers': self.numWorkers, 'maxPending': self.maxPending,
+                      'poolRestarts': self.poolRestarts,
+                      'responses': {str(status): count for (status, count) in sorted(self.counters.items())}}
+            return 200, 'application/json', json.dumps(health).encode('utf-8'), []
+        if translatorName not in DEFAULT_TEMPLATES:
+            return 404, 'text/plain', b'Not found', []
+        if method != 'POST':
+            return 405, 'text/plain', b'Use POST', [('Allow', 'POST')]
+        templatePath = getTemplatePath(translatorName, parse_qs(url.query))
+        if templatePath is None:
+            return 400, 'text/plain', b'Unknown template', []
+        return await self.translate(translatorName, body, templatePath)
+
+    async def handleConnection(self, reader, writer):
+        self.connections[asyncio.current_task()] = writer
+        try:
+            while True:
+                try:
+                    request = await readRequest(reader)
+                except BadRequest as error:
+                    self.counters[error.status] += 1
+                    writer.write(formatResponse(error.status, 'text/plain', str(error).encode('utf-8'), False))
+                    break
+                except asyncio.IncompleteReadError:
+                    break
+                if request is None:
+                    break
+                (method, target, version, headers, body) = request
+                keepAlive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                (status, contentType, responseBody, extraHeaders) = await self.handleRequest(method, target, body)
+                self.counters[status] += 1
+                writer.write(formatResponse(status, contentType, responseBody, keepAlive, extraHeaders))
+                await writer.drain()
+                if not keepAlive:
+                    break
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            del self.connections[asyncio.current_task()]
+
+    async def start(self, host='127.0.0.1', port=8080):
+        """ Start listening, and return the asyncio server. """
+        return await asyncio.start_server(self.handleConnection, host, port)
+
+    async def stop(self, server):
+        """ Stop a server returned by start(), closing its open connections. """
+        server.close()
+        for writer in self.connections.values():
+            writer.close()
+        await asyncio.gather(*self.connections, return_exceptions=True)
+        await server.wait_closed()
+
+    def close(self):
+        self.executor.shutdown()
+
+
+async def serve(host, port, numWorkers, maxPending):
+    service = TranslationService(numWorkers, maxPending)
+    server = await service.start(host, port)
+    (address, boundPort) = server.sockets[0].getsockname()[:2]
+    print('Serving ISO translations at http://%s:%d' % (address, boundPort), flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve DSET and DataCite to ISO 19139 translations over HTTP.')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on.  Default: 127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080, help='port to listen on, or 0 for any free port')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='translation worker processes, or 0 to translate in a thread of the service process.  '
+                             'Default: number of CPUs')
+    parser.add_argument('--maxPending', type=int,
+                        help='translations accepted at once before answering 503.  Default: 4 per worker')
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, max(0, args.workers), args.maxPending))
+    except KeyboardInterrupt:
+        print('Stopped.', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -33,7 +33,6 @@ roleMappingDataCiteToISO = {
 
 parentXPaths = {
     'fileIdentifier': '/gmd:MD_Metadata/gmd:fileIdentifier/gco:CharacterString',
-    'assetType': '/gmd:MD_Metadata/gmd:hierarchyLevel/gmd:MD_ScopeCode',
     'metadataContact': '/gmd:MD_Metadata/gmd:contact/gmd:CI_ResponsibleParty',
     'metadataDate': '/gmd:MD_Metadata/gmd:dateStamp/gco:DateTime',
     'landingPage': '/gmd:MD_Metadata/gmd:dataSetURI/gco:CharacterString',
@@ -45,7 +44,6 @@ parentXPaths = {
     'resourceType': '/gmd:MD_Metadata/gmd:identificationInfo/gmd:MD_DataIdentification/gmd:descriptiveKeywords/gmd:MD_Keywords/gmd:thesaurusName/gmd:CI_Citation/gmd:title/gco:CharacterString[contains(., "Resource Type")]/../../../../gmd:keyword/gco:CharacterString',
     'resourceFormat': '/gmd:MD_Metadata/gmd:identificationInfo/gmd:MD_DataIdentification/gmd:resourceFormat',
     'keyword': '/gmd:MD_Metadata/gmd:identificationInfo/gmd:MD_DataIdentification/gmd:descriptiveKeywords/gmd:MD_Keywords/gmd:thesaurusName/gmd:CI_Citation/gmd:title/gco:CharacterString[contains(., "GCMD")]/../../../../gmd:keyword',
-    'keywordCutElement': '/gmd:MD_Metadata/gmd:identificationInfo/gmd:MD_DataIdentification/gmd:descriptiveKeywords/gmd:MD_Keywords/gmd:thesaurusName/gmd:CI_Citation/gmd:title/gco:CharacterString[contains(., "GCMD")]/../../../../../../gmd:descriptiveKeywords',
     'relatedLink': '/gmd:MD_Metadata/gmd:metadataExtensionInfo',
     'legalConstraints': '/gmd:MD_Metadata/gmd:identificationInfo/gmd:MD_DataIdentification/gmd:resourceConstraints/gmd:MD_LegalConstraints/gmd:useLimitation/gco:CharacterString',
     'accessConstraints': '/gmd:MD_Metadata/gmd:identificationInfo/gmd:MD_DataIdentification/gmd:resourceConstraints/gmd:MD_LegalConstraints/gmd:otherConstraints/gco:CharacterString',
@@ -55,6 +53,11 @@ parentXPaths = {
     'temporalExtentCutElement': '/gmd:MD_Metadata/gmd:identificationInfo/gmd:MD_DataIdentification/gmd:extent/gmd:EX_Extent/gmd:temporalElement',
 }
 
+xml.registerXPaths(parentXPaths)
+
+# Anchors filled in only for records with a rightsList; a template without them can translate other records.
+RIGHTS_ANCHOR_NAMES = ('legalConstraints', 'accessConstraints')
+
 
 # def translateDataCiteRecords():
 #     """ batch translate DataCite Records and save to output directory. """
@@ -90,47 +93,71 @@ def translateDataCiteRecord(record, templateFile):
     return outputXML
 
 
+def getTemplateAnchors(templateFileISO, withRights=False):
+    """ Return a fresh copy of the ISO template and the elements of parentXPaths, located with the template's
+        compiled plan.  Raises xml.TemplateError if the template lacks any element every translation uses, or,
+        withRights, the elements of RIGHTS_ANCHOR_NAMES; otherwise those may be None. """
+    root, anchors = xml.getTemplateAnchors(templateFileISO, parentXPaths)
+    missingXPaths = {name: parentXPaths[name] for (name, element) in anchors.items()
+                     if element is None and (withRights or name not in RIGHTS_ANCHOR_NAMES)}
+    if missingXPaths:
+        raise xml.TemplateError(templateFileISO, missingXPaths)
+    return root, anchors
+
+
 def transformDataCiteToISO(record, templateFileISO, roleMapping):
     # Load the ISO template file as an XML element tree
-    root = xml.getXMLTree(templateFileISO)
+    root, anchors = getTemplateAnchors(templateFileISO, withRights=bool(record.get('rightsList')))
+
+    populateDataCiteTree(root, record, roleMapping, anchors)
+
+    # Return ISO record and record identifier
+    recordAsISO = xml.toString(root)
+    return recordAsISO, record["doi"]
+
+
+def populateDataCiteTree(root, record, roleMapping, anchors=None):
+    """ Fill a copy of the ISO template with the values of a DataCite record.
+        anchors maps the names of parentXPaths to elements of root; they are searched for if not given. """
+    if anchors is None:
+        anchors = xml.findAnchors(root, parentXPaths)
 
     # Put DOI in fileIdentifier
     assert 'doi' in record
-    xml.setElementValue(root, parentXPaths['fileIdentifier'], record['doi'])
+    xml.setElementValue(root, anchors['fileIdentifier'], record['doi'])
 
     # Put current time in dateStamp
     currentTime = datetime.now().isoformat()
-    xml.setElementValue(root, parentXPaths['metadataDate'], currentTime)
+    xml.setElementValue(root, anchors['metadataDate'], currentTime)
 
     # Put resourceTypeGeneral in hierarchyLevelName
     assert 'resourceTypeGeneral' in record['types']
-    xml.setElementValue(root, parentXPaths['resourceType'], record['types']['resourceTypeGeneral'])
+    xml.setElementValue(root, anchors['resourceType'], record['types']['resourceTypeGeneral'])
 
     # Put title in title
     assert 'title' in record['titles'][0]
     titleValue = record['titles'][0]['title']
-    xml.setElementValue(root, parentXPaths['title'], titleValue)
+    xml.setElementValue(root, anchors['title'], titleValue)
 
     # Put description in abstract
     if 'description' in record['descriptions'][0]:
-        fullXPath = parentXPaths['abstract'] + '/gco:CharacterString'
         descriptionValue = record['descriptions'][0]['description']
-        xml.setElementValue(root, fullXPath, descriptionValue)
+        xml.setElementValue(anchors['abstract'], 'gco:CharacterString', descriptionValue)
     else:
-        xml.cutElement(parentXPaths['abstract'])
+        xml.cutElement(root, anchors['abstract'])
 
     # Put rights in legalConstraints
     if 'rightsList' in record and len(record['rightsList']) > 0:
         legalRightsText, accessRightsText = getRightsText(record['rightsList'])
-        xml.setElementValue(root, parentXPaths['legalConstraints'], legalRightsText)
-        xml.setElementValue(root, parentXPaths['accessConstraints'], accessRightsText)
+        xml.setElementValue(root, anchors['legalConstraints'], legalRightsText)
+        xml.setElementValue(root, anchors['accessConstraints'], accessRightsText)
 
     # Put publicationYear in CI_Citation/date
-    xml.setElementValue(root, parentXPaths['publicationDate'], record["publicationYear"])
+    xml.setElementValue(root, anchors['publicationDate'], record["publicationYear"])
 
     # Make DOI URL the Landing Page
     url = "https://doi.org/" + record["doi"]
-    xml.setElementValue(root, parentXPaths['landingPage'], url)
+    xml.setElementValue(root, anchors['landingPage'], url)
 
     # Add relatedIdentifier as online resource if it is a URL
     relatedIdentifierList = record.get("relatedIdentifiers", [])
@@ -138,7 +165,7 @@ def transformDataCiteToISO(record, templateFileISO, roleMapping):
     relatedLinks = []
     for url in relatedURLs:
         relatedLinks.append({"name": "Unknown URL title", "linkage": url, "description": "Unknown URL description"})
-    iso.addRelatedLinks(root, parentXPaths['relatedLink'], relatedLinks)
+    iso.addRelatedLinks(root, anchors['relatedLink'], relatedLinks)
 
     # Add "subject" keywords.  Fill existing element first, then create copies.   If no keywords are present, cut XML element.
     keywords = []
@@ -146,14 +173,14 @@ def transformDataCiteToISO(record, templateFileISO, roleMapping):
         keywords = [s['subject'] for s in record['subjects']]
 
     # Call this even if keywords are empty, so any unpopulated keyword XML elements are removed. 
-    iso.addKeywords(root, parentXPaths['keyword'], keywords)
+    iso.addKeywords(root, anchors['keyword'], keywords)
 
     formats = []
     if 'formats' in record:
         formats = record['formats']
 
     # Call this even if no formats exist, so the template XML element for resourceFormat is removed.
-    createResourceFormats(formats, root)
+    createResourceFormats(formats, root, anchors['resourceFormat'])
 
     # Create list of cited contacts from three keys: "creators", "publisher", and "contributors".
     # Also obtain a list of support contacts from "contributors".
@@ -171,13 +198,13 @@ def transformDataCiteToISO(record, templateFileISO, roleMapping):
         metadataContacts = []
 
     # Fill in cited contacts.
-    createResponsibleParties(root, parentXPaths['citedContact'], citedContacts)
+    createResponsibleParties(root, anchors['citedContact'], citedContacts)
 
     # Fill in Resource Support contacts.
-    createResponsibleParties(root, parentXPaths['supportContact'], supportContacts)
+    createResponsibleParties(root, anchors['supportContact'], supportContacts)
 
     # Fill in Metadata contacts.
-    createResponsibleParties(root, parentXPaths['metadataContact'], metadataContacts)
+    createResponsibleParties(root, anchors['metadataContact'], metadataContacts)
 
     # Fill in geographical bounding box if provided. Otherwise, delete the empty XML element to keep the XML valid.
     if ('geoLocations' in record) and (len(record['geoLocations']) > 0) and (
@@ -188,9 +215,9 @@ def transformDataCiteToISO(record, templateFileISO, roleMapping):
                     'north': bbox['northBoundLatitude'],
                     'south': bbox['southBoundLatitude']
                     }
-        iso.modifyBoundingBox(root, parentXPaths['geoExtent'], bbox_new)
+        iso.modifyBoundingBox(root, anchors['geoExtent'], bbox_new)
     else:
-        xml.cutElement(root, parentXPaths['geoExtentCutElement'])
+        xml.cutElement(root, anchors['geoExtentCutElement'])
 
     # Fill in temporal extent if provided.  Otherwise, delete the empty XML element to keep the XML valid.
     temporalExtentExists = False
@@ -199,14 +226,12 @@ def transformDataCiteToISO(record, templateFileISO, roleMapping):
         if beginDate or endDate:
             temporalExtentExists = True
             extentRecord = {'start': beginDate, 'end': endDate}
-            iso.modifyTemporalExtent(root, parentXPaths['temporalExtent'], extentRecord)
+            iso.modifyTemporalExtent(root, anchors['temporalExtent'], extentRecord)
 
     if not temporalExtentExists:
-        xml.cutElement(root, parentXPaths['temporalExtentCutElement'])
+        xml.cutElement(root, anchors['temporalExtentCutElement'])
 
-    # Return ISO record and record identifier
-    recordAsISO = xml.toString(root)
-    return recordAsISO, record["doi"]
+    return root
 
 
 def getTemporalExtent(dates):
@@ -322,19 +347,15 @@ def getRightsText(rightsList):
 def createResponsibleParties(root, contactXPath, contactList):
     """ Insert XML elements for a list of contact records. """
     contactTemplate, contactParent, contactIndex = xml.cutElement(root, contactXPath, True)
-    insertCounter = 0
-    for contactRecord in contactList:
-        contactElement = xml.copyElement(contactTemplate)
-        iso.modifyContactDataSelectively(contactElement, contactRecord)
-        contactParent.insert(contactIndex + insertCounter, contactElement)
-        insertCounter += 1
+    block = xml.RepeatableBlock(contactTemplate, iso.contactChildXPaths)
+    block.insertCopies(contactParent, contactIndex, contactList, iso.fillContactDataSelectively)
 
 
-def createResourceFormats(formats, root):
+def createResourceFormats(formats, root, formatXPath=parentXPaths['resourceFormat']):
     """
     Given a list of format strings and an XML tree, insert a ResourceFormat element for each format string.
     """
-    emptyElement, parent, originalIndex = xml.cutElement(root, parentXPaths['resourceFormat'], True)
+    emptyElement, parent, originalIndex = xml.cutElement(root, formatXPath, True)
     indexCounter = 0
     for format in formats:
         elementCopy = xml.copyElement(emptyElement)
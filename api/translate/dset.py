@@ -4,23 +4,47 @@
 from api.translate.dset_tiers.required    import transformRequiredFields
 from api.translate.dset_tiers.recommended import transformRecommendedFields
 from api.translate.dset_tiers.optional    import transformOptionalFields
+from api.translate.dset_tiers import required, recommended, optional
 
 import api.util.xml as xml
 
 
+# Anchor elements of all three tiers; tiers that share an anchor name use the same XPath for it.
+# The tiers fill in or remove these anchors, so a template must contain them all.
+anchorXPaths = {**required.parentXPaths, **recommended.parentXPaths, **optional.parentXPaths}
+
+
+def getTemplateAnchors(pathToTemplateFileISO):
+    """ Return a fresh copy of the ISO template and its anchor elements, located with the template's compiled plan.
+        Raises xml.TemplateError if the template lacks any anchor element. """
+    return xml.getTemplateAnchors(pathToTemplateFileISO, anchorXPaths, requireAll=True)
+
+
 def transformDSETToISO(record, pathToTemplateFileISO):
     """ Transform a JSON record to ISO 19139 XML using a XML template file. """
-    root = xml.getXMLTree(pathToTemplateFileISO)
+    root, anchors = getTemplateAnchors(pathToTemplateFileISO)
 
-    root = transformRequiredFields(root, record)
+    root = transformRequiredFields(root, record, anchors)
 
-    root = transformRecommendedFields(root, record)
+    root = transformRecommendedFields(root, record, anchors)
 
-    root = transformOptionalFields(root, record)
+    root = transformOptionalFields(root, record, anchors)
 
     recordAsISO = xml.toString(root)
     return recordAsISO
 
 
+def transformDSETToISOBytes(record, pathToTemplateFileISO):
+    """ Transform a JSON record to ISO 19139 XML, returned as UTF-8 bytes.
+        The output is transformDSETToISO's, encoded, but the template's static parts are copied from bytes
+        rendered once per template, rather than copied and serialized for each record. """
+    root, anchors, plan = xml.getTemplateSlots(pathToTemplateFileISO, anchorXPaths, requireAll=True)
+
+    root = transformRequiredFields(root, record, anchors)
+
+    root = transformRecommendedFields(root, record, anchors)
+
+    root = transformOptionalFields(root, record, anchors)
 
+    return plan.toBytes(root)
 
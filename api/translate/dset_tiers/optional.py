@@ -6,6 +6,7 @@ parentXPaths = {
      'relatedLink'         : '/gmd:MD_Metadata/gmd:metadataExtensionInfo',
      'alternateTitle'      : '/gmd:MD_Metadata/gmd:identificationInfo/gmd:MD_DataIdentification/gmd:citation/gmd:CI_Citation/gmd:alternateTitle',
      'resourceVersion'     : '/gmd:MD_Metadata/gmd:identificationInfo/gmd:MD_DataIdentification/gmd:citation/gmd:CI_Citation/gmd:edition',
+     'resourceVersionText' : '/gmd:MD_Metadata/gmd:identificationInfo/gmd:MD_DataIdentification/gmd:citation/gmd:CI_Citation/gmd:edition/gco:CharacterString',
      'progressCode'        : '/gmd:MD_Metadata/gmd:identificationInfo/gmd:MD_DataIdentification/gmd:status/gmd:MD_ProgressCode',
      'resourceFormat'      : '/gmd:MD_Metadata/gmd:identificationInfo/gmd:MD_DataIdentification/gmd:resourceFormat',
      'softwareLanguage'    : '/gmd:MD_Metadata/gmd:identificationInfo/gmd:MD_DataIdentification/gmd:environmentDescription/gco:CharacterString',
@@ -15,19 +16,24 @@ parentXPaths = {
      'assetSize'           : '/gmd:MD_Metadata/gmd:distributionInfo/gmd:MD_Distribution/gmd:transferOptions',
 }
 
+xml.registerXPaths(parentXPaths)
 
-def transformOptionalFields(root, record):
+
+def transformOptionalFields(root, record, anchors=None):
+    """ anchors maps the names of parentXPaths to elements of root; they are searched for if not given. """
+    if anchors is None:
+        anchors = xml.findAnchors(root, parentXPaths)
 
     # //OPTIONAL FIELDS
     # - Related Link: repeatable
     if 'related_link' in record:
-        iso.addRelatedLinks(root, parentXPaths['relatedLink'], record['related_link'])
+        iso.addRelatedLinks(root, anchors['relatedLink'], record['related_link'])
     else:
-        xml.cutElement(root, parentXPaths['relatedLink'])
+        xml.cutElement(root, anchors['relatedLink'])
 
     # - Alternate Identifier: repeatable
     if 'alternate_identifier' in record:
-        emptyElement, parent, originalIndex = xml.cutElement(root, parentXPaths['alternateTitle'], True)
+        emptyElement, parent, originalIndex = xml.cutElement(root, anchors['alternateTitle'], True)
         indexCounter = 0
         for title in record['alternate_identifier']:
             elementCopy = xml.copyElement(emptyElement)
@@ -35,24 +41,23 @@ def transformOptionalFields(root, record):
             parent.insert(originalIndex + indexCounter, elementCopy)
             indexCounter += 1
     else:
-        xml.cutElement(root, parentXPaths['alternateTitle'])
+        xml.cutElement(root, anchors['alternateTitle'])
 
     # - Resource Version: not repeatable
     if 'resource_version' in record:
-        fullXPath = parentXPaths['resourceVersion'] + '/gco:CharacterString'
-        xml.setElementValue(root, fullXPath, record['resource_version'])
+        xml.setElementValue(root, anchors['resourceVersionText'], record['resource_version'])
     else:
-        xml.cutElement(root, parentXPaths['resourceVersion'])
+        xml.cutElement(root, anchors['resourceVersion'])
 
     # - Progress: not repeatable
     if 'progress' in record:
-        xml.setElementValue(root, parentXPaths['progressCode'], record['progress'], True)
+        xml.setElementValue(root, anchors['progressCode'], record['progress'], True)
     else:
-        xml.cutElement(root, parentXPaths['resourceVersion'])
+        xml.cutElement(root, anchors['resourceVersion'])
 
     # - Resource Format: repeatable
     if 'resource_format' in record:
-        emptyElement, parent, originalIndex = xml.cutElement(root, parentXPaths['resourceFormat'], True)
+        emptyElement, parent, originalIndex = xml.cutElement(root, anchors['resourceFormat'], True)
         indexCounter = 0
         for format in record['resource_format']:
             elementCopy = xml.copyElement(emptyElement)
@@ -62,33 +67,33 @@ def transformOptionalFields(root, record):
             parent.insert(originalIndex + indexCounter, elementCopy)
             indexCounter += 1
     else:
-        xml.cutElement(root, parentXPaths['resourceFormat'])
+        xml.cutElement(root, anchors['resourceFormat'])
 
     # - Software Implementation Language: not repeatable
     if 'software_implementation_language' in record:
-        languageElement = xml.getFirstElement(root, parentXPaths['softwareLanguage'])
+        languageElement = xml.getFirstElement(root, anchors['softwareLanguage'])
         xml.setTextOrMarkMissing(languageElement, record['software_implementation_language'])
     else:
-        xml.cutElement(root, parentXPaths['softwareLanguage'])
+        xml.cutElement(root, anchors['softwareLanguage'])
 
     # - Additional Information: not repeatable
     if 'additional_information' in record:
-        informationElement = xml.getFirstElement(root, parentXPaths['additionalInfo'])
+        informationElement = xml.getFirstElement(root, anchors['additionalInfo'])
         xml.setElementValue(informationElement, 'gco:CharacterString', record['additional_information'])
     else:
-        xml.cutElement(root, parentXPaths['additionalInfo'])
+        xml.cutElement(root, anchors['additionalInfo'])
 
     # - Distributor: not repeatable
     if 'distributor' in record:
-        distributorElement = xml.getFirstElement(root, parentXPaths['distributor'])
+        distributorElement = xml.getFirstElement(root, anchors['distributor'])
         contactElement = xml.getFirstElement(distributorElement, 'gmd:MD_Distributor/gmd:distributorContact/gmd:CI_ResponsibleParty')
         iso.modifyContactData(contactElement, record['distributor'], 'distributor')
     else:
-        xml.cutElement(root, parentXPaths['distributor'])
+        xml.cutElement(root, anchors['distributor'])
 
     # - Distribution Format: repeatable
     if 'distribution_format' in record:
-        emptyElement, parent, originalIndex = xml.cutElement(root, parentXPaths['distributionFormat'], True)
+        emptyElement, parent, originalIndex = xml.cutElement(root, anchors['distributionFormat'], True)
         indexCounter = 0
         for format in record['distribution_format']:
             elementCopy = xml.copyElement(emptyElement)
@@ -96,14 +101,14 @@ def transformOptionalFields(root, record):
             parent.insert(originalIndex + indexCounter, elementCopy)
             indexCounter += 1
     else:
-        xml.cutElement(root, parentXPaths['distributionFormat'])
+        xml.cutElement(root, anchors['distributionFormat'])
 
     # - Asset Size: not repeatable
     if 'asset_size_MB' in record:
-        sizeElement = xml.getFirstElement(root, parentXPaths['assetSize'])
+        sizeElement = xml.getFirstElement(root, anchors['assetSize'])
         xml.setElementValue(sizeElement, 'gmd:MD_DigitalTransferOptions/gmd:transferSize/gco:Real', record['asset_size_MB'])
     else:
-        xml.cutElement(root, parentXPaths['assetSize'])
+        xml.cutElement(root, anchors['assetSize'])
 
     # - Author Identifier: currently not well defined for "old ISO".
 
@@ -20,79 +20,78 @@ parentXPaths = {
     'accessConstraints': '/gmd:MD_Metadata/gmd:identificationInfo/gmd:MD_DataIdentification/gmd:resourceConstraints/gmd:MD_LegalConstraints/gmd:otherConstraints/gco:CharacterString',
 }
 
+xml.registerXPaths(parentXPaths)
 
-def transformRequiredFields(root, record):
+
+def transformRequiredFields(root, record, anchors=None):
     """Transform fields that are required according to the DSET Metadata Dialect.
        Not all required fields must be present in the record because the ISO template may have default values for them.
+       anchors maps the names of parentXPaths to elements of root; they are searched for if not given.
     """
+    if anchors is None:
+        anchors = xml.findAnchors(root, parentXPaths)
 
     # - Metadata Record ID: not repeatable
     assert 'metadata_id' in record
-    xml.setElementValue(root, parentXPaths['fileIdentifier'], record['metadata_id'])
+    xml.setElementValue(root, anchors['fileIdentifier'], record['metadata_id'])
 
     # - ISO Asset Type (default value: dataset): not repeatable
-    xml.setElementValue(root, parentXPaths['assetType'], record['asset_type'], True)
+    xml.setElementValue(root, anchors['assetType'], record['asset_type'], True)
 
     # - Metadata Point of Contact: not repeatable
     if 'metadata_contact' in record:
-        element = xml.getFirstElement(root, parentXPaths['metadataContact'])
-        iso.modifyContactData(element, record['metadata_contact'], 'pointOfContact')
+        iso.modifyContactData(anchors['metadataContact'], record['metadata_contact'], 'pointOfContact')
 
     # - Metadata Date (not repeatable): Use current time if not present in the record. 
     if 'metadata_date' in record:
         metadataDate = record['metadata_date']
     else:
         metadataDate = datetime.now().isoformat()
-    xml.setElementValue(root, parentXPaths['metadataDate'], metadataDate)
+    xml.setElementValue(root, anchors['metadataDate'], metadataDate)
 
     # - Landing Page: not repeatable
     assert 'landing_page' in record
-    xml.setElementValue(root, parentXPaths['landingPage'], record['landing_page'])
+    xml.setElementValue(root, anchors['landingPage'], record['landing_page'])
 
     # - Title: not repeatable
     assert 'title' in record
-    xml.setElementValue(root, parentXPaths['title'], record['title'])
+    xml.setElementValue(root, anchors['title'], record['title'])
 
     # - Publication Date: not repeatable
     assert 'publication_date' in record
-    xml.setElementValue(root, parentXPaths['publicationDate'], record['publication_date'])
+    xml.setElementValue(root, anchors['publicationDate'], record['publication_date'])
 
     # - Author: repeatable
     assert 'author' in record
     authors = record['author']
-    firstLoopIteration = True
-    for author in authors:
-        if firstLoopIteration:
-            contactElement = xml.getFirstElement(root, parentXPaths['citedContact'])
-            iso.modifyContactData(contactElement, author, 'author')
-        else:
-            iso.appendContactData(root, parentXPaths['citedContact'], author, 'author')
-        firstLoopIteration = False
+    if authors:
+        iso.modifyContactData(anchors['citedContact'], authors[0], 'author')
+        iso.appendContacts(anchors['citedContact'], authors[1:], 'author')
 
     # - Publisher: not repeatable
     if 'publisher' in record:
-        iso.appendContactData(root, parentXPaths['citedContact'], record['publisher'], 'publisher')
+        lastContact = xml.getLastSibling(anchors['citedContact'])
+        iso.appendContactData(root, lastContact, record['publisher'], 'publisher')
 
     # - Abstract: not repeatable
     assert 'abstract' in record
-    xml.setElementValue(root, parentXPaths['abstract'], record['abstract'])
+    xml.setElementValue(root, anchors['abstract'], record['abstract'])
 
     # - Resource Support Contact: not repeatable
     if 'resource_support' in record:
-        element = xml.getFirstElement(root, parentXPaths['supportContact'])
-        iso.modifyContactData(element, record['resource_support'], 'pointOfContact')
+        iso.modifyContactData(anchors['supportContact'], record['resource_support'], 'pointOfContact')
 
     # - DataCite Resource Type: not repeatable
     if 'resource_type' in record:
-        xml.setElementValue(root, parentXPaths['resourceType'], record['resource_type'])
+        xml.setElementValue(root, anchors['resourceType'], record['resource_type'])
 
     # - Legal Constraints: not repeatable
     if 'legal_constraints' in record:
-        xml.setElementValue(root, parentXPaths['legalConstraints'], record['legal_constraints'])
+        xml.setElementValue(root, anchors['legalConstraints'], record['legal_constraints'])
 
     # - Access Constraints: not repeatable
     if 'access_constraints' in record:
-        xml.setElementValue(root, parentXPaths['accessConstraints'], record['access_constraints'])
+        xml.setElementValue(root, anchors['accessConstraints'], record['access_constraints'])
 
     return root
 
@@ -1,6 +1,6 @@
 import datetime
 
-from api.util.xml import getElements, getFirstElement, getXMLTree, getElementText, ISO_NAMESPACES
+from api.util.xml import getElements, getFirstElement, getPrunedXMLTree, getElementText, registerXPaths, ISO_NAMESPACES
 
 
 Person_ISO_to_Zenodo = {
@@ -67,6 +67,9 @@ childXPaths = {
     'northLat':        'gmd:northBoundLatitude/gco:Decimal',
 }
 
+registerXPaths(parentXPaths)
+registerXPaths(childXPaths)
+
 #
 #  ISO File Metadata Mappings for Zenodo
 #
@@ -76,11 +79,28 @@ METADATA_PATHS = {
     'description'      : '/gmd:MD_Metadata/gmd:identificationInfo/gmd:MD_DataIdentification/gmd:abstract/gco:CharacterString',
 }
 
+registerXPaths(METADATA_PATHS)
+
+# The only parts of an ISO file that extract_metadata reads; each path ends at a repeatable element containing
+# the paths above.  Everything else, e.g. distribution and data quality information, is skipped while parsing.
+IDENTIFICATION_PATH = '/gmd:MD_Metadata/gmd:identificationInfo/gmd:MD_DataIdentification'
+CAPTURE_PATHS = [
+    '/gmd:MD_Metadata/gmd:contact',
+    '/gmd:MD_Metadata/gmd:dataSetURI',
+    '/gmd:MD_Metadata/gmd:metadataExtensionInfo',
+    IDENTIFICATION_PATH + '/gmd:citation',
+    IDENTIFICATION_PATH + '/gmd:abstract',
+    IDENTIFICATION_PATH + '/gmd:pointOfContact',
+    IDENTIFICATION_PATH + '/gmd:descriptiveKeywords',
+    IDENTIFICATION_PATH + '/gmd:spatialResolution',
+    IDENTIFICATION_PATH + '/gmd:extent',
+]
+
 def extract_metadata(iso_file):
     """ Parse ISO XML file and pull metadata for Zenodo upload.
     """
     metadata = {}
-    xml_root = getXMLTree(iso_file)
+    xml_root = getPrunedXMLTree(iso_file, CAPTURE_PATHS)
     for (key, xpath) in METADATA_PATHS.items():
         value = getElementText(xpath, xml_root)
         metadata[key] = value
@@ -222,10 +242,10 @@ def getElementsMatchingRole(roleString, contactXPath, xml_tree):
     """ Get all XML contact elements matching a specific role for the given contact XPath.
     """
     matchingContactElements = []
-    contactElements = xml_tree.xpath(contactXPath, namespaces=ISO_NAMESPACES)
+    contactElements = getElements(xml_tree, contactXPath)
 
     for contactElement in contactElements:
-        roleCodeElements = contactElement.xpath(childXPaths['roleCode'], namespaces=ISO_NAMESPACES)
+        roleCodeElements = getElements(contactElement, childXPaths['roleCode'])
 
         if roleCodeElements and roleCodeElements[0].get('codeListValue') == roleString:
             matchingContactElements.append(contactElement)
@@ -265,7 +285,7 @@ def getRoleMatchesAsJson(roleString, contactXPath, xml_tree):
 
 def extract_orcid(contactElement):
     """ Extract and return the ORCID identifier from a CitedContact element. """
-    anchorElement = contactElement.xpath(childXPaths['individualAnchor'], namespaces=ISO_NAMESPACES)
+    anchorElement = getElements(contactElement, childXPaths['individualAnchor'])
     orcid_url = anchorElement[0].get('{http://www.w3.org/1999/xlink}href')
     orcid_id = orcid_url.split('/')[-1]
     return orcid_id
@@ -361,20 +381,20 @@ def get_related_identifiers(xml_tree):
     Notes = ''
     nonEmptyTextCriterionForXPath = '[string-length(text()) > 0]'
 
-    resourceElements = xml_tree.xpath(parentXPaths['relatedLink'], namespaces=ISO_NAMESPACES)
+    resourceElements = getElements(xml_tree, parentXPaths['relatedLink'])
     for resourceElement in resourceElements:
         linkageXPath = childXPaths['linkage'] + nonEmptyTextCriterionForXPath
-        linkageElements = resourceElement.xpath(linkageXPath, namespaces=ISO_NAMESPACES)
+        linkageElements = getElements(resourceElement, linkageXPath)
         if linkageElements:
             linkageText = linkageElements[0].text
             nameXPath = childXPaths['name'] + nonEmptyTextCriterionForXPath
-            nameElements = resourceElement.xpath(nameXPath, namespaces=ISO_NAMESPACES)
+            nameElements = getElements(resourceElement, nameXPath)
             if nameElements:
                 nameText = nameElements[0].text
             else:
                 nameText = linkageText
             descriptionXPath = childXPaths['description'] + nonEmptyTextCriterionForXPath
-            descriptionElements = resourceElement.xpath(descriptionXPath, namespaces=ISO_NAMESPACES)
+            descriptionElements = getElements(resourceElement, descriptionXPath)
             if descriptionElements:
                 descriptionText = descriptionElements[0].text
             else:
@@ -36,6 +36,8 @@ childXPaths =  {
      'relatedLink'      : 'gmd:MD_MetadataExtensionInformation/gmd:extensionOnLineResource/gmd:CI_OnlineResource',
    } 
 
+xml.registerXPaths(childXPaths)
+
 #
 #  ISO Element Modification functions
 #
@@ -85,32 +87,44 @@ def modifyTemporalExtent(xml_root, extentXPath, extentRecord):
         elementEnd.attrib['indeterminatePosition'] = extentRecord['end']
 
 
+# Children of a ResponsibleParty element that contact data is written to.
+contactChildXPaths = {name: childXPaths[name] for name in
+                      ['individual', 'individual_char', 'individual_anchor', 'position', 'organization', 'email',
+                       'roleCode']}
+
+
+def getContactChildren(contactElement):
+    """ Return {name: element} for the contactChildXPaths children of a "contact" ISO element. """
+    return xml.findAnchors(contactElement, contactChildXPaths)
+
+
 def modifyContactData(contactElement, contactData, impliedRoleValue = None):
     """ Modify contents of a "contact" ISO element, a.k.a ResponsibleParty element.
         Modify all values, substituting empty text where values are not given. """
+    fillContactData(getContactChildren(contactElement), contactData, impliedRoleValue)
+
+
+def fillContactData(children, contactData, impliedRoleValue = None):
+    """ Like modifyContactData(), for a contact element whose children were found by getContactChildren(). """
 
     #  For some contact elements, a specific role value is implied.  Set this value if given.
     if impliedRoleValue:
         contactData['role'] = impliedRoleValue
 
     nameValue = contactData.get('name', "")
-    element = xml.getFirstElement(contactElement, childXPaths['individual'])
-    xml.setTextOrMarkMissing(element, nameValue)
+    xml.setTextOrMarkMissing(children['individual'], nameValue)
 
     positionValue = contactData.get('position', "")
-    element = xml.getFirstElement(contactElement, childXPaths['position'])
-    xml.setTextOrMarkMissing(element, positionValue)
+    xml.setTextOrMarkMissing(children['position'], positionValue)
 
     organizationValue = contactData.get('organization', "")
-    element = xml.getFirstElement(contactElement, childXPaths['organization'])
-    xml.setTextOrMarkMissing(element, organizationValue)
+    xml.setTextOrMarkMissing(children['organization'], organizationValue)
 
     emailValue = contactData.get('email', "")
-    element = xml.getFirstElement(contactElement, childXPaths['email'])
-    xml.setTextOrMarkMissing(element, emailValue)
+    xml.setTextOrMarkMissing(children['email'], emailValue)
 
     roleValue = contactData.get('role', "")
-    element = xml.getFirstElement(contactElement, childXPaths['roleCode'])
+    element = children['roleCode']
     xml.setTextOrMarkMissing(element, roleValue)
     element.attrib['codeListValue'] = roleValue
 
@@ -118,17 +132,22 @@ def modifyContactData(contactElement, contactData, impliedRoleValue = None):
 def modifyContactDataSelectively(contactElement, contactData):
     """ Modify contents of a "contact" XML element, a.k.a ResponsibleParty element.
         Only override XML values if fill values are given, so XML template values are unchanged. """
+    fillContactDataSelectively(getContactChildren(contactElement), contactData)
+
+
+def fillContactDataSelectively(children, contactData):
+    """ Like modifyContactDataSelectively(), for a contact element whose children were found by
+        getContactChildren(). """
     nameValue = contactData.get('name', None)
     orcidValue = contactData.get('orcid_url', None)
-    individualElement = xml.getFirstElement(contactElement, childXPaths['individual'])
-    charElement = xml.getFirstElement(individualElement, 'gco:CharacterString')
-    anchorElement = xml.getFirstElement(individualElement, 'gmx:Anchor')
+    individualElement = children['individual']
+    charElement = children['individual_char']
+    anchorElement = children['individual_anchor']
     if nameValue and not orcidValue:
-        element = xml.getFirstElement(contactElement, childXPaths['individual_char'])
-        xml.setTextOrMarkMissing(element, nameValue)
+        xml.setTextOrMarkMissing(charElement, nameValue)
         individualElement.remove(anchorElement)
     elif nameValue and orcidValue:
-        element = xml.getFirstElement(contactElement, childXPaths['individual_anchor'])
+        element = anchorElement
         xml.setTextOrMarkMissing(element, nameValue)
         titleAttrib = "{http://www.w3.org/1999/xlink}title"
         hrefAttrib = "{http://www.w3.org/1999/xlink}href"
@@ -141,22 +160,19 @@ def modifyContactDataSelectively(contactElement, contactData):
 
     positionValue = contactData.get('position', None)
     if positionValue:
-        element = xml.getFirstElement(contactElement, childXPaths['position'])
-        xml.setTextOrMarkMissing(element, positionValue)
+        xml.setTextOrMarkMissing(children['position'], positionValue)
 
     organizationValue = contactData.get('organization', None)
     if organizationValue:
-        element = xml.getFirstElement(contactElement, childXPaths['organization'])
-        xml.setTextOrMarkMissing(element, organizationValue)
+        xml.setTextOrMarkMissing(children['organization'], organizationValue)
 
     emailValue = contactData.get('email', None)
     if emailValue:
-        element = xml.getFirstElement(contactElement, childXPaths['email'])
-        xml.setTextOrMarkMissing(element, emailValue)
+        xml.setTextOrMarkMissing(children['email'], emailValue)
 
     roleValue = contactData.get('role', None)
     if roleValue:
-        element = xml.getFirstElement(contactElement, childXPaths['roleCode'])
+        element = children['roleCode']
         xml.setTextOrMarkMissing(element, roleValue)
         element.attrib['codeListValue'] = roleValue
 
@@ -164,29 +180,40 @@ def modifyContactDataSelectively(contactElement, contactData):
 # 
 # Methods for inserting a collection of related ISO elements.
 #
+# Each method copies a prototype element once per list item with an xml.RepeatableBlock, which locates the
+# children to fill in once on the prototype, and inserts all copies in one splice.
+#
 
 def addSpatialResolutionDistances(xml_root, resolutionXPath, resolutionList):
     """ Append a number of Spatial Resolution "distance" ISO elements. """
-    insertCounter = 0
     resolutionElement, resolutionParent, elementIndex = xml.cutElement(xml_root, resolutionXPath, True)
-    for resolution in resolutionList:
-        elementCopy = xml.copyElement(resolutionElement)
-        distanceElement = xml.getFirstElement(elementCopy, childXPaths['distance'])
+
+    def fillResolution(children, resolution):
+        distanceElement = children['distance']
         xml.setTextOrMarkMissing(distanceElement, resolution['distance'])
         distanceElement.attrib['uom'] = resolution['units']
-        # Insert element copies back into parent, in order of creation.
-        resolutionParent.insert(elementIndex + insertCounter, elementCopy)
-        insertCounter += 1
+
+    block = xml.RepeatableBlock(resolutionElement, {'distance': childXPaths['distance']})
+    block.insertCopies(resolutionParent, elementIndex, resolutionList, fillResolution)
+
+
+def appendContacts(contactElement, contactList, impliedRoleValue = None):
+    """ Append one copy of a contact element per item of contactList right after it, each modified with
+        modifyContactData(); returns the last new element, or contactElement if contactList is empty. """
+    if not contactList:
+        return contactElement
+    contactParent = contactElement.getparent()
+    block = xml.RepeatableBlock(contactElement, contactChildXPaths)
+    copies = block.insertCopies(contactParent, contactParent.index(contactElement) + 1, contactList,
+                                lambda children, contactData: fillContactData(children, contactData, impliedRoleValue))
+    return copies[-1]
 
 
 def appendContactData(xml_root, contactXPath, contactData, impliedRoleValue = None):
-    """ Append a new contact element to a collection of ResponsibleParty elements """
+    """ Append a new contact element to a collection of ResponsibleParty elements, after the last element matching
+        contactXPath, or after a given contact element; returns the new element. """
     contactElement = xml.getLastElement(xml_root, contactXPath)
-    contactParent = contactElement.getparent()
-    contactIndex = contactParent.index(contactElement)
-    elementCopy = xml.copyElement(contactElement)
-    modifyContactData(elementCopy, contactData, impliedRoleValue)
-    contactParent.insert(contactIndex + 1, elementCopy)
+    return appendContacts(contactElement, [contactData], impliedRoleValue)
 
 
 def fixKeywordChars(keyword):
@@ -203,23 +230,25 @@ def addKeywords(xml_root, keywordXPath, keywordList):
         keywordSectionParent = keywordSection.getparent()
         keywordSectionParent.remove(keywordSection)
         return
-    insertCounter = 0
-    for keyword in keywordList:
-        fixedKeyword = fixKeywordChars(keyword)
-        elementCopy = xml.copyElement(keywordElement)
-        xml.setElementValue(elementCopy, childXPaths['string'], fixedKeyword)
-        keywordParent.insert(originalIndex + insertCounter, elementCopy)
-        insertCounter += 1
+
+    def fillKeyword(children, keyword):
+        xml.setTextOrMarkMissing(children['string'], fixKeywordChars(keyword))
+
+    block = xml.RepeatableBlock(keywordElement, {'string': childXPaths['string']})
+    block.insertCopies(keywordParent, originalIndex, keywordList, fillKeyword)
 
 
 def addRelatedLinks(xml_root, relatedLinkXPath, relatedLinks):
     """ Add related link XML elements using a list of related link records. """
     emptyLinkElement, parent, originalIndex = xml.cutElement(xml_root, relatedLinkXPath, True)
-    insertCounter = 0
-    for link in relatedLinks:
-        elementCopy = xml.copyElement(emptyLinkElement)
-        onlineResourceChild = xml.getFirstElement(elementCopy, childXPaths['relatedLink'])
-        modifyOnlineResource(onlineResourceChild, link['linkage'], link['name'], link['description'])
-        parent.insert(originalIndex + insertCounter, elementCopy)
-        insertCounter += 1
+
+    def fillLink(children, link):
+        xml.setTextOrMarkMissing(children['linkage'], link['linkage'])
+        xml.setTextOrMarkMissing(children['name'], link['name'])
+        xml.setTextOrMarkMissing(children['description'], link['description'])
+
+    resourcePath = childXPaths['relatedLink'] + '/'
+    block = xml.RepeatableBlock(emptyLinkElement, {name: resourcePath + childXPaths[name]
+                                                   for name in ['linkage', 'name', 'description']})
+    block.insertCopies(parent, originalIndex, relatedLinks, fillLink)
 
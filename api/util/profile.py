@@ -0,0 +1,133 @@
+#
+#  Opt-in profiling of translation runs: call counts and wall time per translation stage and per XML helper.
+#
+#  Profiling is off by default and then costs nothing: enable() replaces the profiled module functions with timing
+#  wrappers, and disable() puts the originals back.  Callers look these functions up as module attributes
+#  (xml.getElements, dset.transformRequiredFields, ...), so the wrappers see every call.
+#
+#  Times are inclusive: a stage's time includes the time of the XML helpers it calls, and helpers that call other
+#  helpers (setElementValue calls getFirstElement, which calls getElements) include those as well.
+#
+import importlib
+import time
+from collections import defaultdict
+
+# Functions to profile, as (module name, short module name for reports, function names).
+PROFILED_FUNCTIONS = [
+    ('api.translate.dset', 'dset', ['transformDSETToISO', 'transformDSETToISOBytes', 'getTemplateAnchors',
+                                    'transformRequiredFields', 'transformRecommendedFields',
+                                    'transformOptionalFields']),
+    ('api.translate.datacite', 'datacite', ['transformDataCiteToISO', 'populateDataCiteTree']),
+    ('api.util.xml', 'xml', ['getTemplateTree', 'getTemplateAnchors', 'getTemplateSlots', 'getXMLTree', 'toString',
+                             'toUTF8', 'getElements', 'setElementValue', 'setTextOrMarkMissing', 'addChildList',
+                             'cutElement', 'copyElement']),
+]
+
+METRIC_PREFIX = 'iso_translation'
+
+
+class Profile:
+    """ Call counts and total seconds per profiled function, keyed by 'module.function' names. """
+
+    def __init__(self):
+        self.counters = defaultdict(lambda: [0, 0.0])      # name -> [calls, seconds]
+
+    def add(self, name, seconds, calls=1):
+        counter = self.counters[name]
+        counter[0] += calls
+        counter[1] += seconds
+
+    def merge(self, counters):
+        """ Add counters taken from another profile, e.g. one kept by a worker process. """
+        for (name, (calls, seconds)) in counters.items():
+            self.add(name, seconds, calls)
+
+    def getCounters(self):
+        """ Return {name: (calls, seconds)} for every function called at least once, as a picklable dictionary. """
+        return {name: tuple(counter) for (name, counter) in self.counters.items() if counter[0]}
+
+    def takeCounters(self):
+        """ Return the counters, and start counting from zero. """
+        counters = self.getCounters()
+        self.reset()
+        return counters
+
+    def reset(self):
+        # Counters are zeroed in place, since the timing wrappers keep references to them.
+        for counter in self.counters.values():
+            counter[0] = 0
+            counter[1] = 0.0
+
+    def formatText(self):
+        """ Return a table of calls, total and mean time per function, slowest first. """
+        lines = ['%-42s %10s %12s %12s' % ('function', 'calls', 'total ms', 'mean us')]
+        for (name, (calls, seconds)) in sorted(self.getCounters().items(), key=lambda item: -item[1][1]):
+            lines.append('%-42s %10d %12.1f %12.2f' % (name, calls, 1e3 * seconds, 1e6 * seconds / calls))
+        return '\n'.join(lines) + '\n'
+
+    def formatPrometheus(self):
+        """ Return the counters in the Prometheus text exposition format. """
+        lines = ['# HELP %s_calls_total Number of calls per translation stage or XML helper.' % METRIC_PREFIX,
+                 '# TYPE %s_calls_total counter' % METRIC_PREFIX]
+        lines += ['%s_calls_total{function="%s"} %d' % (METRIC_PREFIX, name, calls)
+                  for (name, (calls, seconds)) in sorted(self.getCounters().items())]
+        lines += ['# HELP %s_seconds_total Wall time spent per translation stage or XML helper, including the '
+                  'functions it calls.' % METRIC_PREFIX,
+                  '# TYPE %s_seconds_total counter' % METRIC_PREFIX]
+        lines += ['%s_seconds_total{function="%s"} %.6f' % (METRIC_PREFIX, name, seconds)
+                  for (name, (calls, seconds)) in sorted(self.getCounters().items())]
+        return '\n'.join(lines) + '\n'
+
+    def format(self, reportFormat):
+        return self.formatPrometheus() if reportFormat == 'prometheus' else self.formatText()
+
+
+profile = Profile()
+originalFunctions = {}          # (module, function name) -> function replaced by enable()
+
+
+def makeTimedFunction(name, function):
+    perfCounter = time.perf_counter
+    counter = profile.counters[name]
+
+    def timedFunction(*args, **kwargs):
+        start = perfCounter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            counter[0] += 1
+            counter[1] += perfCounter() - start
+
+    timedFunction.__wrapped__ = function
+    return timedFunction
+
+
+def isEnabled():
+    return bool(originalFunctions)
+
+
+def enable():
+    """ Start profiling the functions in PROFILED_FUNCTIONS; enabling twice has no further effect. """
+    if isEnabled():
+        return
+    for (moduleName, shortName, functionNames) in PROFILED_FUNCTIONS:
+        module = importlib.import_module(moduleName)
+        for functionName in functionNames:
+            function = getattr(module, functionName)
+            originalFunctions[(module, functionName)] = function
+            setattr(module, functionName, makeTimedFunction(shortName + '.' + functionName, function))
+
+
+def disable():
+    """ Restore the original functions.  The counters are kept until reset. """
+    for ((module, functionName), function) in originalFunctions.items():
+        setattr(module, functionName, function)
+    originalFunctions.clear()
+
+
+def callAndTakeCounters(function, *args):
+    """ Call a function and return (result, counters) with the counters collected since the last call.
+        Worker processes run their tasks through this, so the parent process can merge every worker's counters.
+    """
+    result = function(*args)
+    return result, profile.takeCounters()
@@ -3,14 +3,11 @@
 #
 
 import numbers
+import os.path
+from collections import OrderedDict
 from lxml import etree as element_tree      # ISO XML parser
 from copy import deepcopy                   # Allows deep copy of ISO elements
 
-# Debug
-import logging
-import pprint
-log = logging.getLogger(__name__)
-
 
 # We need XML namespace mappings in order to search the ISO element tree
 ISO_NAMESPACES = {'gmd': 'http://www.isotc211.org/2005/gmd',
@@ -28,10 +25,226 @@ def getXMLTree(templateFilePath):
     return root
 
 
+#
+# Pruned parsing: read only the parts of a record that are needed
+#
+def splitElementPath(elementPath):
+    """ Convert an absolute element path such as '/gmd:MD_Metadata/gmd:contact' into a tuple of
+        namespace-qualified tags. """
+    tags = []
+    for step in elementPath.strip('/').split('/'):
+        (prefix, name) = step.split(':')
+        tags.append('{%s}%s' % (ISO_NAMESPACES[prefix], name))
+    return tuple(tags)
+
+def removeFollowingElements(element):
+    """ Remove every element that follows the given element in document order, except its descendants. """
+    while element.getparent() is not None:
+        parent = element.getparent()
+        while element.getnext() is not None:
+            parent.remove(element.getnext())
+        element = parent
+
+def removeUnkeptSiblings(sibling, parentKey, keptPaths, backwards=True):
+    """ Remove sibling, and its consecutive siblings in the given direction, until an element whose path is kept. """
+    while sibling is not None and (parentKey + (sibling.tag,)) not in keptPaths:
+        nextSibling = sibling.getprevious() if backwards else sibling.getnext()
+        sibling.getparent().remove(sibling)
+        sibling = nextSibling
+
+# Files smaller than this are parsed whole: iterparse's event handling costs more than building the complete tree.
+PRUNED_PARSE_MIN_BYTES = 1024 * 1024
+
+def getPrunedXMLTree(source, capturePaths, minimumSize=PRUNED_PARSE_MIN_BYTES):
+    """ Stream through an XML file with iterparse and return the root of a pruned tree holding only the elements
+        at capturePaths, with their whole subtrees, and the ancestors of those elements.  Other elements are
+        removed as soon as the next element on a capture path, or the end of their parent, is read.
+
+        capturePaths are absolute element paths without predicates, e.g. '/gmd:MD_Metadata/gmd:contact'.
+        Only elements named in capturePaths raise parser events, and reading stops as soon as every capture path
+        is complete.  Completion relies on two properties of ISO 19139:
+          * repeated elements are contiguous, so a capture path is complete once a sibling element on another
+            capture path follows one of its matches;
+          * ancestors of a capture path occur only once, so a capture path is complete once its parent ends.
+        A path to a repeatable element should therefore end at the repeated element, not below it.
+        Because reading may stop early, syntax errors after the captured elements are not detected.
+
+        A file smaller than minimumSize bytes is parsed whole instead, since pruning does not pay off for it;
+        XPath searches below the capture paths give the same results on either tree.
+    """
+    if isinstance(source, (str, os.PathLike)) and os.path.getsize(source) < minimumSize:
+        return getXMLTree(source)
+    captures = {splitElementPath(path) for path in capturePaths}
+    ancestors = {capture[:depth] for capture in captures for depth in range(1, len(capture))}
+    keptPaths = captures | ancestors
+    remaining = set(captures)
+    matched = set()
+
+    openedFile = None
+    if isinstance(source, (str, os.PathLike)):
+        source = openedFile = open(source, 'rb')
+    try:
+        context = element_tree.iterparse(source, events=('start', 'end'),
+                                         tag={tag for path in keptPaths for tag in path})
+        root = None
+        stack = []              # ancestor elements from the root down to the current one
+        path = ()               # tags of the elements on the stack
+        nested = 0              # depth inside a captured subtree, or inside elements that are not kept
+        for (event, element) in context:
+            if event == 'start':
+                parent = element.getparent()
+                if nested or parent is not (stack[-1] if stack else None) or path + (element.tag,) not in keptPaths:
+                    nested += 1
+                    continue
+                key = path + (element.tag,)
+                if parent is None:
+                    root = element
+                else:
+                    removeUnkeptSiblings(element.getprevious(), path, keptPaths)
+
+                # A new sibling completes any capture path whose matches it follows.
+                completed = {capture for capture in remaining
+                             if capture in matched and capture[:-1] == path and capture != key}
+                remaining -= completed
+                if completed and not remaining:
+                    # The parser reads ahead, so drop this element and anything after it that is already built.
+                    removeFollowingElements(element)
+                    parent.remove(element)
+                    break
+                if key in captures:
+                    matched.add(key)
+                    nested = 1
+                else:
+                    stack.append(element)
+                    path = key
+                continue
+
+            # 'end' event of an ancestor element: drop unkept children read since the last kept one.
+            if nested:
+                nested -= 1
+                continue
+            if len(element):
+                removeUnkeptSiblings(element[-1], path, keptPaths)
+            remaining = {capture for capture in remaining if capture[:len(path)] != path}
+            stack.pop()
+            path = path[:-1]
+            if not remaining:
+                removeFollowingElements(element)
+                break
+        return root if root is not None else context.root
+    finally:
+        if openedFile:
+            openedFile.close()
+
+
+#
+# Parsed template cache
+#
+class TemplateError(LookupError):
+    """ A template lacks elements that a translator fills in or removes.  missingXPaths maps the name of each
+        missing anchor to its XPath. """
+
+    def __init__(self, templateFilePath, missingXPaths):
+        self.templateFilePath = templateFilePath
+        self.missingXPaths = missingXPaths
+        super().__init__('Template %s has no element for: %s' % (templateFilePath, ', '.join(missingXPaths)))
+
+
+class TemplateCache:
+    """ Keep parsed XML templates in memory so each template file is read from disk only once.
+
+        Entries are keyed by template path and modification time, so an edited template is parsed again.
+        Callers always receive a deep copy of the cached tree; the pristine tree is never modified.
+        The least recently used template is evicted once more than maxSize templates are cached.
+        Translation plans compiled for a template are kept with it, keyed by the contents of their XPath table,
+        and dropped along with it.
+    """
+
+    def __init__(self, maxSize=8):
+        self.maxSize = maxSize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()       # template path -> (modification time, root element, plans)
+
+    def _getEntry(self, templateFilePath):
+        key = os.path.abspath(templateFilePath)
+        modificationTime = os.stat(key).st_mtime_ns
+        entry = self._entries.get(key)
+        if entry and entry[0] == modificationTime:
+            self.hits += 1
+            self._entries.move_to_end(key)
+        else:
+            self.misses += 1
+            entry = (modificationTime, getXMLTree(key), {})
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxSize:
+                self._entries.popitem(last=False)
+        return entry
+
+    def getTree(self, templateFilePath):
+        """ Return a fresh copy of the parsed template's root element. """
+        return deepcopy(self._getEntry(templateFilePath)[1])
+
+    def getTreeAndPlan(self, templateFilePath, xpathTable, withSlots=False, requireAll=False):
+        """ Return a fresh copy of the template's root element, and the TranslationPlan locating the elements
+            of xpathTable in the template.  The plan is compiled on first use.
+            withSlots returns a copy of the plan's slot tree instead, in which static subtrees are slots.
+            requireAll raises TemplateError if any XPath of xpathTable matches nothing in the template. """
+        (modificationTime, root, plans) = self._getEntry(templateFilePath)
+        planKey = tuple(xpathTable.items())
+        plan = plans.get(planKey)
+        if plan is None:
+            plan = plans[planKey] = TranslationPlan(root, xpathTable)
+        if requireAll and plan.missingNames:
+            raise TemplateError(templateFilePath, {name: xpathTable[name] for name in plan.missingNames})
+        return deepcopy(plan.slotRoot if withSlots else root), plan
+
+    def invalidate(self, templateFilePath=None):
+        """ Drop one template from the cache, or every template if no path is given. """
+        if templateFilePath is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(os.path.abspath(templateFilePath), None)
+
+    def stats(self):
+        """ Return cache hit/miss counters and current size. """
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries), 'maxSize': self.maxSize}
+
+
+templateCache = TemplateCache()
+
+
+def getTemplateTree(templateFilePath):
+    """ Return a modifiable copy of an XML template, parsing the template file only on first use. """
+    return templateCache.getTree(templateFilePath)
+
+
+def getTemplateAnchors(templateFilePath, xpathTable, requireAll=False):
+    """ Return a modifiable copy of an XML template, and {name: element} for the first element in the copy
+        matching each XPath of xpathTable.  XPaths are evaluated only when the template is first used.
+        An XPath matching nothing has the anchor None, or, with requireAll, raises TemplateError. """
+    root, plan = templateCache.getTreeAndPlan(templateFilePath, xpathTable, requireAll=requireAll)
+    return root, plan.getAnchors(root)
+
+
+def getTemplateSlots(templateFilePath, xpathTable, requireAll=False):
+    """ Like getTemplateAnchors(), but return (root, anchors, plan) where root lacks the template's static
+        subtrees: every subtree that holds no anchor and is not above one is a slot, pre-rendered by the plan.
+        The copy is smaller and quicker to make, but it must only be changed through its anchors, and it must be
+        serialized with plan.toBytes(), which puts the static subtrees back. """
+    root, plan = templateCache.getTreeAndPlan(templateFilePath, xpathTable, withSlots=True, requireAll=requireAll)
+    return root, plan.getAnchors(root), plan
+
+
 def toString(xml_tree):
     outputString = element_tree.tostring(xml_tree, encoding='unicode', pretty_print=True)
     return outputString
 
+def toUTF8(xml_tree):
+    """ Serialize like toString(), as UTF-8 bytes without an XML declaration. """
+    return element_tree.tostring(xml_tree, encoding='utf-8', pretty_print=True)
+
 
 def getElementText(xpath, xml_root):
     """
@@ -39,18 +252,177 @@ def getElementText(xpath, xml_root):
     """
     assert ('gco:CharacterString' in xpath) or ('gco:Date' in xpath)
     value = None
-    element = xml_root.xpath(xpath, namespaces=ISO_NAMESPACES)
+    element = getElements(xml_root, xpath)
     if element:
         value = element[0].text
     return value
 
 
+#
+# Compiled XPath registry
+#
+# Every XPath string is compiled into an lxml XPath evaluator once and reused for all later searches.
+# Modules that define tables of XPaths register them at import time; any other XPath string is compiled
+# on first use.
+#
+xpathRegistry = {}
+
+def compileXPath(elementPath):
+    """ Return the compiled XPath evaluator for an XPath string, compiling it if it is not yet registered. """
+    compiledPath = xpathRegistry.get(elementPath)
+    if compiledPath is None:
+        compiledPath = element_tree.XPath(elementPath, namespaces=ISO_NAMESPACES)
+        xpathRegistry[elementPath] = compiledPath
+    return compiledPath
+
+def registerXPaths(xpathTable):
+    """ Compile every XPath in a dictionary of named XPath strings, and return the dictionary unchanged. """
+    for elementPath in xpathTable.values():
+        compileXPath(elementPath)
+    return xpathTable
+
+
+#
+# Compiled translation plans
+#
+# A translator finds the same anchor elements in every copy of a template.  A plan evaluates the anchor XPaths
+# once, on the cached template, and stores each anchor as the path of child indices leading to it from the root;
+# the anchors of a fresh copy are then found by indexing, without evaluating any XPath.
+#
+def getIndexPath(element, top=None):
+    """ Return the child indices leading from the root of an element's tree, or from its ancestor top, down to the
+        element. """
+    indexPath = []
+    parent = element.getparent()
+    while parent is not None and element is not top:
+        indexPath.append(parent.index(element))
+        element = parent
+        parent = element.getparent()
+    return tuple(reversed(indexPath))
+
+def getElementAtIndexPath(root, indexPath):
+    element = root
+    for index in indexPath:
+        element = element[index]
+    return element
+
+def findAnchors(root, xpathTable):
+    """ Return {name: element} holding the first element matching each XPath of xpathTable, or None. """
+    return {name: getFirstElement(root, elementPath) for (name, elementPath) in xpathTable.items()}
+
+SLOT_TARGET = 'iso-slot'
+SLOT_PREFIX = ('<?%s ' % SLOT_TARGET).encode('utf-8')
+
+def getStaticElements(root, anchors):
+    """ Return the topmost elements of root whose subtrees a translation working through anchors leaves alone:
+        those that neither hold an anchor nor lie above one, in document order.  Siblings that follow an anchor
+        and share its tag are kept out too, since repeated elements are appended after the last of them. """
+    dynamic = set()
+    for anchor in anchors:
+        dynamic.update(anchor.iter())
+        dynamic.update(anchor.iterancestors())
+        for sibling in anchor.itersiblings():
+            if sibling.tag != anchor.tag:
+                break
+            dynamic.update(sibling.iter())
+    staticElements = []
+    ancestors = [root]
+    while ancestors:
+        for child in reversed(ancestors.pop()):
+            if child in dynamic:
+                ancestors.append(child)
+            elif child.getparent() is not None:
+                staticElements.append(child)
+    staticElements.sort(key=getIndexPath)
+    return staticElements
+
+def replaceWithSlot(element, slotNumber):
+    """ Replace an element by a processing instruction naming its slot, keeping the text that follows it. """
+    slot = element_tree.ProcessingInstruction(SLOT_TARGET, str(slotNumber))
+    slot.tail = element.tail
+    element.getparent().replace(element, slot)
+
+class TranslationPlan:
+    """ Child-index paths of the anchor elements of one template, and the template's pre-rendered static subtrees;
+        see getTemplateAnchors() and getTemplateSlots().  An anchor's index path leads to its parent, followed by
+        its index in the parent; missingNames lists the anchors whose XPaths match nothing in the template. """
+
+    def __init__(self, templateRoot, xpathTable):
+        anchors = findAnchors(templateRoot, xpathTable)
+        self.indexPaths = {name: None if element is None else getIndexPath(element)
+                           for (name, element) in anchors.items()}
+        self.missingNames = [name for (name, element) in anchors.items() if element is None]
+        self.compileSlots(templateRoot, [element for element in anchors.values() if element is not None])
+
+    def compileSlots(self, templateRoot, anchors):
+        """ Render every static subtree once, in the context of the whole template, and make slotRoot, a copy of
+            the template with a slot in place of each static subtree.  Slots are used only if serializing slotRoot
+            and filling in the slots reproduces the template byte for byte; otherwise slotRoot is the template. """
+        staticPaths = [getIndexPath(element) for element in getStaticElements(templateRoot, anchors)]
+        self.slotRoot = templateRoot
+        self.fragments = []
+        if not staticPaths:
+            return
+
+        # Mark where each static subtree starts and ends, and cut its rendering out of the serialized template.
+        markedRoot = deepcopy(templateRoot)
+        markedElements = [getElementAtIndexPath(markedRoot, indexPath) for indexPath in staticPaths]
+        for (slotNumber, element) in enumerate(markedElements):
+            element.addprevious(element_tree.ProcessingInstruction(SLOT_TARGET + '-start', str(slotNumber)))
+            endMarker = element_tree.ProcessingInstruction(SLOT_TARGET + '-end', str(slotNumber))
+            (endMarker.tail, element.tail) = (element.tail, None)
+            element.addnext(endMarker)
+        markedText = toString(markedRoot)
+        fragments = []
+        for slotNumber in range(len(staticPaths)):
+            start = markedText.index('<?%s-start %d?>' % (SLOT_TARGET, slotNumber))
+            start = markedText.index('?>', start) + 2
+            fragments.append(markedText[start:markedText.index('<?%s-end %d?>' % (SLOT_TARGET, slotNumber))])
+
+        slotRoot = deepcopy(templateRoot)
+        # Replace from the last slot back, so the index paths of the remaining static elements stay valid.
+        for (slotNumber, indexPath) in reversed(list(enumerate(staticPaths))):
+            replaceWithSlot(getElementAtIndexPath(slotRoot, indexPath), slotNumber)
+        fragments = [fragment.encode('utf-8') for fragment in fragments]
+        if self.fillSlots(toUTF8(slotRoot), fragments) == toString(templateRoot).encode('utf-8'):
+            self.slotRoot = slotRoot
+            self.fragments = fragments
+
+    def fillSlots(self, utf8Text, fragments=None):
+        """ Return serialized XML, as UTF-8 bytes, with each slot replaced by its pre-rendered subtree.
+            The text is split as bytes, so a large record is not decoded and encoded again around the split. """
+        fragments = self.fragments if fragments is None else fragments
+        parts = utf8Text.split(SLOT_PREFIX)
+        # Every part after the first starts with the rest of a slot, 'number?>'.
+        output = [parts[0]]
+        for part in parts[1:]:
+            (slotNumber, end, following) = part.partition(b'?>')
+            output.append(fragments[int(slotNumber)])
+            output.append(following)
+        return b''.join(output)
+
+    def toBytes(self, root):
+        """ Serialize a tree made from the template, with or without slots, like toString() but as UTF-8 bytes. """
+        return self.fillSlots(toUTF8(root))
+
+    def getAnchors(self, root):
+        """ Return {name: element} for an unmodified copy of the template, or of slotRoot. """
+        return {name: None if indexPath is None else getElementAtIndexPath(root, indexPath)
+                for (name, indexPath) in self.indexPaths.items()}
+
+
 #
 # XML Element Query operations
 #
 def getElements(baseElement, elementPath):
-    """ Search XML element tree and return all matching elements """
-    elements = baseElement.xpath(elementPath, namespaces=ISO_NAMESPACES)
+    """ Search XML element tree and return all matching elements.
+        The element path may be an XPath string or a compiled XPath evaluator.  It may also be an element
+        that was already located, e.g. a plan anchor, which is returned as the only match. """
+    if not isinstance(elementPath, element_tree.XPath):
+        if element_tree.iselement(elementPath):
+            return [elementPath]
+        elementPath = compileXPath(elementPath)
+    elements = elementPath(baseElement)
     assert elements != None
     return elements
 
@@ -66,6 +438,14 @@ def getLastElement(baseElement, elementPath):
     element = getLast(elements)
     return element
 
+def getLastSibling(element):
+    """ Return the last of the consecutive siblings sharing an element's tag, starting from the element. """
+    nextSibling = element.getnext()
+    while nextSibling is not None and nextSibling.tag == element.tag:
+        element = nextSibling
+        nextSibling = element.getnext()
+    return element
+
 def getFirst(someList):
     """ Return first item in a list if list is nonempty (returns None otherwise). """
     if someList:
@@ -142,4 +522,46 @@ def addChildList(xml_root, elementXPath, childXPath, valueList, setCodeListValue
         parent.append(childCopy)
 
 
+def insertElements(parent, index, elements):
+    """ Insert a list of elements as children of parent, starting at child index, in a single splice.
+        Inserting n elements one by one at increasing indices costs O(n^2), since lxml walks the children to find
+        each index. """
+    parent[index:index] = elements
+
+
+class RepeatableBlock:
+    """ Copies of a prototype element, such as a keyword or a contact, made for each item of a repeatable field.
+        The children named in childXPaths are located once, on the prototype, as child-index paths, so the children
+        of each copy are found by indexing rather than by evaluating XPaths. """
+
+    def __init__(self, prototype, childXPaths=None):
+        self.prototype = prototype
+        self.childPaths = {}
+        for (name, childXPath) in (childXPaths or {}).items():
+            child = getFirstElement(prototype, childXPath)
+            self.childPaths[name] = None if child is None else getIndexPath(child, prototype)
+
+    def makeCopy(self):
+        """ Return a copy of the prototype and {name: child element of the copy, or None}. """
+        elementCopy = deepcopy(self.prototype)
+        children = {name: None if indexPath is None else getElementAtIndexPath(elementCopy, indexPath)
+                    for (name, indexPath) in self.childPaths.items()}
+        return elementCopy, children
+
+    def makeCopies(self, items, fillCopy):
+        """ Return one copy per item, each filled in by calling fillCopy(children, item). """
+        copies = []
+        for item in items:
+            (elementCopy, children) = self.makeCopy()
+            fillCopy(children, item)
+            copies.append(elementCopy)
+        return copies
+
+    def insertCopies(self, parent, index, items, fillCopy):
+        """ Insert one filled-in copy per item as children of parent, starting at child index; returns the copies. """
+        copies = self.makeCopies(items, fillCopy)
+        insertElements(parent, index, copies)
+        return copies
+
+
 
@@ -0,0 +1,197 @@
+#
+#  Functions for uploading files to a Zenodo deposition: concurrent uploads over a pooled HTTP session,
+#  retries with exponential backoff, MD5 verification against Zenodo's checksums, and a resume file that
+#  records every file already uploaded.
+#
+import hashlib
+import json
+import os
+import os.path
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+ZENODO_API_URL = 'https://zenodo.org/api'
+ZENODO_SANDBOX_API_URL = 'https://sandbox.zenodo.org/api'
+
+# HTTP status codes worth retrying: rate limiting and temporary server trouble.
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Read size used when hashing local files; large reads keep the disk streaming and let hashlib release the GIL.
+HASH_BUFFER_SIZE = 8 * 1024 * 1024
+
+
+class UploadError(Exception):
+    """ Raised when a file could not be uploaded, after all retries. """
+
+
+def get_session(pool_size):
+    """ Return a requests session that keeps up to pool_size connections open for reuse. """
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+class HashingReader:
+    """ Wraps a binary file opened for upload, computing its MD5 checksum as the HTTP client reads it,
+        so that a file is read from disk only once to be both uploaded and verified.
+    """
+
+    def __init__(self, fp):
+        self._fp = fp
+        self._md5 = hashlib.md5()
+        self._length = os.fstat(fp.fileno()).st_size
+
+    def __len__(self):
+        # Lets requests send a Content-Length header instead of a chunked body.
+        return self._length
+
+    def read(self, size=-1):
+        data = self._fp.read(size)
+        self._md5.update(data)
+        return data
+
+    def get_checksum(self):
+        """ Return the checksum of the bytes read so far, in Zenodo's 'md5:<hex digest>' format. """
+        return 'md5:' + self._md5.hexdigest()
+
+
+def get_md5_checksum(file_path, buffer_size=HASH_BUFFER_SIZE):
+    """ Return a local file's checksum in Zenodo's 'md5:<hex digest>' format. """
+    md5 = hashlib.md5()
+    with open(file_path, 'rb', buffering=0) as f:
+        buffer = bytearray(buffer_size)
+        view = memoryview(buffer)
+        while True:
+            size = f.readinto(buffer)
+            if not size:
+                break
+            md5.update(view[:size])
+    return 'md5:' + md5.hexdigest()
+
+
+class ResumeFile:
+    """ JSON file recording the deposition being uploaded to, and the size, modification time and checksum
+        of each file that finished uploading.  The file is rewritten after every completed upload, so an
+        interrupted upload can be resumed without sending finished files again.
+    """
+
+    def __init__(self, path, data):
+        self.path = path
+        self.data = data
+        self.data.setdefault('files', {})
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as openfile:
+            return cls(path, json.load(openfile))
+
+    def save(self):
+        with self._lock:
+            temporary_path = self.path + '.tmp'
+            with open(temporary_path, 'w') as f:
+                json.dump(self.data, f, indent=4)
+            os.replace(temporary_path, self.path)
+
+    def is_uploaded(self, file_name, file_path):
+        """ Return True if this file was uploaded before and has not changed since. """
+        entry = self.data['files'].get(file_name)
+        if not entry:
+            return False
+        file_status = os.stat(file_path)
+        return entry['size'] == file_status.st_size and entry['mtime'] == file_status.st_mtime_ns
+
+    def mark_uploaded(self, file_name, file_path, checksum):
+        file_status = os.stat(file_path)
+        with self._lock:
+            self.data['files'][file_name] = {'size': file_status.st_size, 'mtime': file_status.st_mtime_ns,
+                                             'checksum': checksum}
+        self.save()
+
+
+def upload_file(session, bucket_url, file_name, file_path, params, retries=5, backoff=1.0):
+    """ PUT one file into a deposition bucket and return Zenodo's JSON description of the uploaded file.
+        The file's MD5 checksum is computed while it is sent, and the file is uploaded again if Zenodo reports
+        a different checksum.  Checksum mismatches, connection failures and retryable status codes are retried,
+        waiting backoff * 2**attempt seconds.
+    """
+    for attempt in range(retries + 1):
+        try:
+            with open(file_path, "rb") as fp:
+                reader = HashingReader(fp)
+                r = session.put("%s/%s" % (bucket_url, file_name), data=reader, params=params)
+            if r.status_code in (200, 201):
+                result = r.json()
+                if result.get('checksum') == reader.get_checksum():
+                    return result
+                error = UploadError(f'{file_name}: checksum mismatch: local {reader.get_checksum()}, '
+                                    f'Zenodo {result.get("checksum")}')
+            else:
+                error = UploadError(f'{file_name}: HTTP {r.status_code}: {r.text}')
+                if r.status_code not in RETRY_STATUS_CODES:
+                    raise error
+        except (requests.ConnectionError, requests.Timeout) as connection_error:
+            error = UploadError(f'{file_name}: {connection_error}')
+        if attempt < retries:
+            time.sleep(backoff * 2 ** attempt)
+    raise error
+
+
+def upload_files(session, bucket_url, file_info, params, resume, num_workers=4, retries=5, backoff=1.0):
+    """ Upload (file_name, file_path) pairs on num_workers threads, skipping files the resume file lists as done.
+        Yields (file_name, result, error) as uploads finish, in file_info order: result is Zenodo's description of
+        the uploaded file, or None for a skipped file; error is None unless the upload failed.
+    """
+    def upload(file_name, file_path):
+        if resume.is_uploaded(file_name, file_path):
+            return file_name, None, None
+        try:
+            result = upload_file(session, bucket_url, file_name, file_path, params, retries, backoff)
+        except UploadError as error:
+            return file_name, None, str(error)
+        resume.mark_uploaded(file_name, file_path, result.get('checksum'))
+        return file_name, result, None
+
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        pending = deque()
+        for (file_name, file_path) in file_info:
+            pending.append(executor.submit(upload, file_name, file_path))
+            if len(pending) >= 2 * num_workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def get_deposition_checksums(session, deposition_url, params):
+    """ Return {file_name: 'md5:<hex digest>'} for the files in a Zenodo deposition.
+        deposition_url is the deposition's API URL, e.g. https://zenodo.org/api/deposit/depositions/<id> .
+    """
+    r = session.get(deposition_url + '/files', params=params)
+    r.raise_for_status()
+    checksums = {}
+    for remote_file in r.json():
+        # The deposition file listing gives a bare hex digest, unlike the bucket API's 'md5:' prefixed one.
+        checksum = remote_file['checksum']
+        checksums[remote_file['filename']] = checksum if checksum.startswith('md5:') else 'md5:' + checksum
+    return checksums
+
+
+def verify_files(file_info, remote_checksums, num_workers=4):
+    """ Hash (file_name, file_path) pairs on num_workers threads and compare them with remote_checksums.
+        Yields (file_name, local_checksum, remote_checksum) in file_info order; remote_checksum is None
+        for a file missing from the deposition.
+    """
+    def verify(file_name, file_path):
+        return file_name, get_md5_checksum(file_path), remote_checksums.get(file_name)
+
+    file_names = [file_name for (file_name, file_path) in file_info]
+    file_paths = [file_path for (file_name, file_path) in file_info]
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        yield from executor.map(verify, file_names, file_paths)
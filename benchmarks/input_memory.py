@@ -0,0 +1,99 @@
+#
+# Benchmark: memory and time used to read and decode large DSET JSON input files.
+#
+# A record with a huge abstract and keyword list is written to a temporary file, at each requested size, and decoded
+# by each reader.  tracemalloc reports the peak memory allocated while reading and decoding, and the memory the
+# decoded record keeps; their difference is the cost of the reader's copies of the input.
+#
+#   readlines     readlines() and "".join(...), as dset2iso.py used to read records
+#   read          a single text-mode read()
+#   bytes         api.inputjson.getJSONFileData with the json module: one binary read(), decoded to text
+#   bytes+orjson  api.inputjson.getJSONFileData with orjson, if installed: files of MMAP_THRESHOLD bytes or more
+#                 are memory-mapped and decoded in place
+#
+# To run this benchmark: type "python -m benchmarks.input_memory" in the top-level folder.
+#
+
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+import api.inputjson as dset_input
+
+
+def makeLargeRecord(megabytes):
+    """ Return the DSET test record, grown to about the given size, when indented, by its abstract and keywords. """
+    with open('./defaultInputRecords/test_dset_full.txt') as recordFile:
+        record = json.load(recordFile)
+    paragraph = ('Observations of atmospheric composition collected over the course of the field campaign, '
+                 'including trace gases, aerosols and meteorological state variables. ')
+    size = int(megabytes * 2**20)
+    record['abstract'] = paragraph * (size // 2 // len(paragraph))
+    record['keywords'] = ['EARTH SCIENCE > ATMOSPHERE > KEYWORD %d' % index
+                          for index in range(size // 2 // 48)]
+    return record
+
+
+def readLines(filePath):
+    with open(filePath, 'r') as recordFile:
+        return json.loads(''.join(recordFile.readlines()))
+
+
+def readText(filePath):
+    with open(filePath, 'r') as recordFile:
+        return json.loads(recordFile.read())
+
+
+def readBytesWithJSON(filePath):
+    orjson = dset_input.orjson
+    dset_input.orjson = None
+    try:
+        return dset_input.getJSONFileData(filePath)
+    finally:
+        dset_input.orjson = orjson
+
+
+READERS = {'readlines': readLines, 'read': readText, 'bytes': readBytesWithJSON,
+           'bytes+orjson': dset_input.getJSONFileData}
+
+
+def measureReader(reader, filePath):
+    """ Return (peak MB, retained MB, seconds) for decoding a file. """
+    tracemalloc.start()
+    start = time.perf_counter()
+    record = reader(filePath)
+    seconds = time.perf_counter() - start
+    (retained, peak) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del record
+    return peak / 2**20, retained / 2**20, seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark memory used to read and decode large DSET records.')
+    parser.add_argument('--sizes', nargs='+', type=float, default=[1, 8, 32], help='record sizes in MB')
+    parser.add_argument('--readers', nargs='+', choices=list(READERS), default=list(READERS), help='readers to run')
+    args = parser.parse_args()
+
+    readers = [name for name in args.readers if name != 'bytes+orjson' or dset_input.orjson is not None]
+    if len(readers) < len(args.readers):
+        print('orjson is not installed; skipping bytes+orjson')
+
+    print(f'{"reader":14} {"file MB":>8} {"peak MB":>8} {"kept MB":>8} {"copies MB":>10} {"ms":>8}')
+    with tempfile.TemporaryDirectory() as tempDir:
+        for megabytes in args.sizes:
+            filePath = os.path.join(tempDir, 'record.txt')
+            with open(filePath, 'w') as recordFile:
+                json.dump(makeLargeRecord(megabytes), recordFile, indent=4)
+            fileMegabytes = os.path.getsize(filePath) / 2**20
+            for name in readers:
+                (peak, retained, seconds) = measureReader(READERS[name], filePath)
+                print(f'{name:14} {fileMegabytes:8.1f} {peak:8.1f} {retained:8.1f} {peak - retained:10.1f}'
+                      f' {1e3 * seconds:8.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+#
+# Benchmark: inserting repeatable ISO elements (keywords, related links, contacts, ...) for long lists of items.
+#
+# Each builder fills in a fresh template copy with count items, and the time per item is reported.  With --baseline,
+# the same builders also run with the insertion pattern xml.RepeatableBlock replaced: XPath lookups in every copy
+# and one insert per copy, which lxml makes O(n^2) since it walks the parent's children to find each insert index.
+#
+# To run this benchmark: type "python -m benchmarks.repeatable_blocks" in the top-level folder.
+#
+
+import argparse
+import time
+from copy import deepcopy
+
+import api.util.iso19139 as iso
+import api.util.xml as xml
+import api.translate.dset as dset_translate
+import api.translate.datacite as datacite_translate
+
+
+DSET_TEMPLATE = './templates_ISO19139/dset_full.xml'
+DATACITE_TEMPLATE = './templates_ISO19139/datacite.xml'
+
+
+def makeContact(index):
+    return {'name': f'Author {index}', 'position': 'Scientist', 'organization': 'NCAR',
+            'email': f'author{index}@example.org'}
+
+
+def getDSETTree():
+    return dset_translate.getTemplateAnchors(DSET_TEMPLATE)
+
+
+def getDataCiteTree():
+    return xml.getTemplateTree(DATACITE_TEMPLATE), None
+
+
+# Builder name -> (function returning (root, anchors), function inserting a list of items, function making item i).
+BUILDERS = {
+    'keywords': (getDSETTree,
+                 lambda root, anchors, items: iso.addKeywords(root, anchors['keyword'], items),
+                 lambda index: f'EARTH SCIENCE > ATMOSPHERE > TERM {index}'),
+    'relatedLinks': (getDSETTree,
+                     lambda root, anchors, items: iso.addRelatedLinks(root, anchors['relatedLink'], items),
+                     lambda index: {'linkage': f'https://example.org/{index}', 'name': f'Link {index}',
+                                    'description': 'Related link'}),
+    'spatialResolutions': (getDSETTree,
+                           lambda root, anchors, items:
+                               iso.addSpatialResolutionDistances(root, anchors['spatialResolution'], items),
+                           lambda index: {'distance': index, 'units': 'm'}),
+    'contacts': (getDSETTree,
+                 lambda root, anchors, items: iso.appendContacts(anchors['citedContact'], items, 'author'),
+                 makeContact),
+    'responsibleParties': (getDataCiteTree,
+                           lambda root, anchors, items: datacite_translate.createResponsibleParties(
+                               root, datacite_translate.parentXPaths['citedContact'], items),
+                           lambda index: dict(makeContact(index), orcid_url=f'https://orcid.org/{index}')),
+}
+
+
+class OneByOneBlock(xml.RepeatableBlock):
+    """ The insertion pattern RepeatableBlock replaced: children found by XPath in each copy, one insert per copy. """
+
+    def __init__(self, prototype, childXPaths=None):
+        super().__init__(prototype, childXPaths)
+        self.childXPaths = childXPaths or {}
+
+    def makeCopy(self):
+        elementCopy = deepcopy(self.prototype)
+        return elementCopy, {name: xml.getFirstElement(elementCopy, childXPath)
+                             for (name, childXPath) in self.childXPaths.items()}
+
+    def insertCopies(self, parent, index, items, fillCopy):
+        copies = []
+        for (offset, item) in enumerate(items):
+            (elementCopy, children) = self.makeCopy()
+            fillCopy(children, item)
+            parent.insert(index + offset, elementCopy)
+            copies.append(elementCopy)
+        return copies
+
+
+def timeBuilder(builderName, count, repeat):
+    """ Return the fastest of repeat runs of a builder inserting count items, in seconds. """
+    (getTree, insertItems, makeItem) = BUILDERS[builderName]
+    items = [makeItem(index) for index in range(count)]
+    times = []
+    for run in range(repeat):
+        (root, anchors) = getTree()
+        runItems = deepcopy(items)
+        start = time.perf_counter()
+        insertItems(root, anchors, runItems)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark insertion of repeatable ISO elements.')
+    parser.add_argument('--builders', nargs='+', choices=list(BUILDERS), default=list(BUILDERS),
+                        help='builders to benchmark')
+    parser.add_argument('--counts', nargs='+', type=int, default=[100, 1000, 10000],
+                        help='numbers of items to insert')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per builder and count; the fastest is reported')
+    parser.add_argument('--baseline', action='store_true',
+                        help='also time XPath lookups and one insert per copy, for comparison')
+    args = parser.parse_args()
+
+    print(f'{"builder":20} {"items":>7} {"total ms":>10} {"us/item":>9}' +
+          (f' {"baseline ms":>12} {"us/item":>9} {"speedup":>8}' if args.baseline else ''))
+    for builderName in args.builders:
+        for count in args.counts:
+            seconds = timeBuilder(builderName, count, args.repeat)
+            line = f'{builderName:20} {count:7d} {1e3 * seconds:10.1f} {1e6 * seconds / count:9.2f}'
+            if args.baseline:
+                repeatableBlock = xml.RepeatableBlock
+                xml.RepeatableBlock = OneByOneBlock
+                try:
+                    baselineSeconds = timeBuilder(builderName, count, args.repeat)
+                finally:
+                    xml.RepeatableBlock = repeatableBlock
+                line += (f' {1e3 * baselineSeconds:12.1f} {1e6 * baselineSeconds / count:9.2f}'
+                         f' {baselineSeconds / seconds:8.2f}')
+            print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+#
+# Benchmark: sustained load on the HTTP translation service (api/service.py).
+#
+# Concurrent clients each keep one connection open and POST the same record back to back for a fixed duration.
+# The benchmark reports completed requests/sec, p50/p90/p99/max latency, and the count of each response status;
+# 503 responses are the service refusing work beyond its pending limit.  Without --url, a service is started in a
+# subprocess with --workers worker processes, and stopped when the run ends.
+#
+# To run this benchmark: type "python -m benchmarks.service_load" in the top-level folder.
+#
+#   python -m benchmarks.service_load --workers 4 --concurrency 16 --duration 20
+#   python -m benchmarks.service_load --url http://127.0.0.1:8080/datacite \
+#                                     --record ./defaultInputRecords/test_datacite_full.json
+#
+
+import argparse
+import asyncio
+import subprocess
+import sys
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+from benchmarks.translation import getPercentile
+
+
+DEFAULT_RECORD = './defaultInputRecords/test_dset_full.txt'
+
+
+def startService(numWorkers):
+    """ Start api.service on a free port; return the subprocess and the service's base URL. """
+    service = subprocess.Popen([sys.executable, '-m', 'api.service', '--port', '0', '--workers', str(numWorkers)],
+                               stdout=subprocess.PIPE, text=True)
+    line = service.stdout.readline()
+    if not line.startswith('Serving'):
+        service.kill()
+        raise RuntimeError('The service did not start: %r' % line)
+    return service, line.split()[-1]
+
+
+async def readResponse(reader):
+    """ Read one HTTP response; return its status code and body. """
+    statusLine = await reader.readline()
+    if not statusLine:
+        raise ConnectionError('Connection closed by the service')
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        (name, separator, value) = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    return int(statusLine.split()[1]), await reader.readexactly(length)
+
+
+async def runClient(url, body, endTime, latencies, statuses):
+    """ POST body to url over one keep-alive connection until endTime, recording each request's latency. """
+    target = urlsplit(url)
+    path = target.path + ('?' + target.query if target.query else '')
+    request = ('POST %s HTTP/1.1\r\nHost: %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n'
+               % (path, target.netloc, len(body))).encode('latin-1') + body
+    (reader, writer) = await asyncio.open_connection(target.hostname, target.port)
+    try:
+        while time.perf_counter() < endTime:
+            start = time.perf_counter()
+            writer.write(request)
+            (status, responseBody) = await readResponse(reader)
+            latencies.append(time.perf_counter() - start)
+            statuses[status] += 1
+    finally:
+        writer.close()
+
+
+async def runLoad(url, body, concurrency, duration):
+    """ Run concurrency clients for duration seconds; return latencies of all requests, status counts and the
+        elapsed time. """
+    latencies = []
+    statuses = Counter()
+    start = time.perf_counter()
+    await asyncio.gather(*[runClient(url, body, start + duration, latencies, statuses) for client in range(concurrency)])
+    return latencies, statuses, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure sustained throughput and latency of the translation service.')
+    parser.add_argument('--url', help='translation endpoint of a running service, e.g. http://127.0.0.1:8080/dset.  '
+                                      'Default: start a service and use its /dset endpoint')
+    parser.add_argument('--record', default=DEFAULT_RECORD, help='JSON record POSTed with every request.  '
+                                                                 'Default: ' + DEFAULT_RECORD)
+    parser.add_argument('--workers', type=int, default=2, help='worker processes of a started service.  Default: 2')
+    parser.add_argument('--concurrency', type=int, default=8, help='concurrent client connections.  Default: 8')
+    parser.add_argument('--duration', type=float, default=10, help='seconds of measured load.  Default: 10')
+    parser.add_argument('--warmup', type=float, default=1, help='seconds of load before measuring.  Default: 1')
+    args = parser.parse_args()
+
+    with open(args.record, 'rb') as recordFile:
+        body = recordFile.read()
+
+    service = None
+    url = args.url
+    if url is None:
+        (service, baseURL) = startService(args.workers)
+        url = baseURL + '/dset'
+    try:
+        if args.warmup > 0:
+            asyncio.run(runLoad(url, body, args.concurrency, args.warmup))
+        (latencies, statuses, elapsed) = asyncio.run(runLoad(url, body, args.concurrency, args.duration))
+    finally:
+        if service:
+            service.terminate()
+            service.wait()
+
+    latencies.sort()
+    print(f'{url}: {args.concurrency} clients, {elapsed:.1f} s' +
+          (f', {args.workers} workers' if service else ''))
+    print(f'{"requests":>9} {"req/s":>8} {"p50 ms":>8} {"p90 ms":>8} {"p99 ms":>8} {"max ms":>8}  statuses')
+    print(f'{len(latencies):9d} {len(latencies) / elapsed:8.1f}' +
+          ''.join(f' {1e3 * getPercentile(latencies, percent):8.2f}' for percent in (50, 90, 99, 100)) +
+          '  ' + ', '.join(f'{status}: {count}' for (status, count) in sorted(statuses.items())))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,249 @@
+#
+# Benchmark: DSET and DataCite to ISO 19139 translation, timed stage by stage.
+#
+# Synthetic records, from a minimal record up to one with hundreds of authors, keywords and related links, are
+# translated repeatedly.  For each translator and record size the benchmark reports records/sec, p50/p99 latency,
+# the latency of each pipeline stage, and the peak resident memory of the process.  Results can be saved as JSON
+# and compared with results saved on another commit.
+#
+# To run this benchmark: type "python -m benchmarks.translation" in the top-level folder.
+#
+#   python -m benchmarks.translation --output before.json
+#   (change code)
+#   python -m benchmarks.translation --compare before.json
+#
+
+import argparse
+import copy
+import json
+import math
+import platform
+import resource
+import subprocess
+import time
+from collections import defaultdict
+
+from lxml import etree
+
+import api.util.xml as xml
+import api.translate.dset as dset_translate
+import api.translate.datacite as datacite_translate
+
+
+DSET_TEMPLATE = './templates_ISO19139/dset_full.xml'
+DSET_RECORD = './defaultInputRecords/test_dset_full.txt'
+DATACITE_TEMPLATE = './templates_ISO19139/datacite.xml'
+DATACITE_RECORD = './defaultInputRecords/test_datacite_full.json'
+
+# Number of authors, keywords and related links in each synthetic record.
+# 'minimal' keeps only required fields, and 'typical' is the test record unchanged.
+RECORD_SIZES = {
+    'minimal': None,
+    'typical': None,
+    'large': (50, 100, 50),
+    'huge': (500, 1000, 300),
+}
+
+DSET_REQUIRED_FIELDS = ['metadata_id', 'asset_type', 'landing_page', 'title', 'publication_date', 'author',
+                        'abstract', 'progress', 'resource_version']
+DATACITE_REQUIRED_FIELDS = ['doi', 'types', 'titles', 'descriptions', 'publicationYear', 'creators']
+
+
+#
+# Synthetic records
+#
+def repeatItems(items, count, makeItem):
+    """ Return count items made from the given example items in turn; makeItem(item, index) returns a new item. """
+    return [makeItem(items[index % len(items)], index) for index in range(count)]
+
+
+def makeDSETRecord(baseRecord, size):
+    if size == 'minimal':
+        return {field: copy.deepcopy(baseRecord[field]) for field in DSET_REQUIRED_FIELDS}
+    record = copy.deepcopy(baseRecord)
+    if RECORD_SIZES[size]:
+        (numAuthors, numKeywords, numLinks) = RECORD_SIZES[size]
+        record['author'] = repeatItems(record['author'], numAuthors,
+                                       lambda author, index: dict(author, name=f'Author {index}'))
+        record['keywords'] = repeatItems(record['keywords'], numKeywords,
+                                         lambda keyword, index: f'{keyword} > TERM {index}')
+        record['related_link'] = repeatItems(record['related_link'], numLinks,
+                                             lambda link, index: dict(link, linkage=f'{link["linkage"]}&n={index}'))
+    return record
+
+
+def makeDataCiteRecord(baseRecord, size):
+    if size == 'minimal':
+        record = {field: copy.deepcopy(baseRecord[field]) for field in DATACITE_REQUIRED_FIELDS}
+        record['creators'] = record['creators'][:1]
+        return record
+    record = copy.deepcopy(baseRecord)
+    if RECORD_SIZES[size]:
+        (numAuthors, numKeywords, numLinks) = RECORD_SIZES[size]
+        record['creators'] = repeatItems(record['creators'], numAuthors,
+                                         lambda creator, index: dict(creator, name=f'Author, {index}'))
+        record['subjects'] = repeatItems(record['subjects'], numKeywords,
+                                         lambda subject, index: {'subject': f'{subject["subject"]} {index}'})
+        record['relatedIdentifiers'] = [{'relatedIdentifier': f'https://example.org/related/{index}',
+                                         'relatedIdentifierType': 'URL'} for index in range(numLinks)]
+    return record
+
+
+#
+# Pipeline stages, in the order transformDSETToISO and transformDataCiteToISO run them.
+# Each stage takes the previous stage's result: template parse returns a tree, serialization returns a string or bytes.
+#
+def getDSETStages(record, templatePath):
+    # DSET stages pass on (root, anchors, plan): the template copy with its static parts left as slots, its anchor
+    # elements, and the plan that serializes it, as in batch translation.
+    return [('template', lambda unused: xml.getTemplateSlots(templatePath, dset_translate.anchorXPaths)),
+            ('required', lambda tree: (dset_translate.transformRequiredFields(tree[0], record, tree[1]),) + tree[1:]),
+            ('recommended',
+             lambda tree: (dset_translate.transformRecommendedFields(tree[0], record, tree[1]),) + tree[1:]),
+            ('optional', lambda tree: (dset_translate.transformOptionalFields(tree[0], record, tree[1]),) + tree[1:]),
+            ('serialize', lambda tree: tree[2].toBytes(tree[0]))]
+
+
+def getDataCiteStages(record, templatePath):
+    roleMapping = datacite_translate.roleMappingDataCiteToISO
+    return [('template', lambda unused: xml.getTemplateTree(templatePath)),
+            ('populate', lambda root: datacite_translate.populateDataCiteTree(root, record, roleMapping)),
+            ('serialize', xml.toString)]
+
+
+TRANSLATORS = {
+    'dset': (DSET_RECORD, DSET_TEMPLATE, makeDSETRecord, getDSETStages),
+    'datacite': (DATACITE_RECORD, DATACITE_TEMPLATE, makeDataCiteRecord, getDataCiteStages),
+}
+
+
+#
+# Measurement
+#
+def getPercentile(sortedValues, percent):
+    """ Return the nearest-rank percentile of a sorted list. """
+    return sortedValues[max(0, math.ceil(percent / 100 * len(sortedValues)) - 1)]
+
+
+def getPeakRSSMegabytes():
+    """ Peak resident memory of this process so far; Linux reports kilobytes, macOS bytes. """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if platform.system() == 'Darwin' else 1024)
+
+
+def summarize(seconds):
+    """ Return mean, p50 and p99 of a list of durations, in milliseconds. """
+    milliseconds = sorted(1000 * value for value in seconds)
+    return {'mean': sum(milliseconds) / len(milliseconds),
+            'p50': getPercentile(milliseconds, 50),
+            'p99': getPercentile(milliseconds, 99)}
+
+
+def benchmarkTranslator(translatorName, size, repeat):
+    """ Translate one synthetic record repeat times, timing each stage, and return a result dictionary. """
+    (recordPath, templatePath, makeRecord, getStages) = TRANSLATORS[translatorName]
+    with open(recordPath) as recordFile:
+        record = makeRecord(json.load(recordFile), size)
+
+    # The first translation parses and caches the template, as in a long-running batch; it is not timed.
+    outputBytes = 0
+    stageSeconds = defaultdict(list)
+    totalSeconds = []
+    for iteration in range(repeat + 1):
+        result = None
+        stages = getStages(copy.deepcopy(record), templatePath)
+        recordStart = time.perf_counter()
+        for (stageName, stage) in stages:
+            stageStart = time.perf_counter()
+            result = stage(result)
+            if iteration:
+                stageSeconds[stageName].append(time.perf_counter() - stageStart)
+        if iteration:
+            totalSeconds.append(time.perf_counter() - recordStart)
+        outputBytes = len(result if isinstance(result, bytes) else result.encode('utf-8'))
+
+    return {'translator': translatorName,
+            'size': size,
+            'records': repeat,
+            'outputBytes': outputBytes,
+            'recordsPerSecond': repeat / sum(totalSeconds),
+            'latencyMilliseconds': summarize(totalSeconds),
+            'stageMilliseconds': {stageName: summarize(seconds) for (stageName, seconds) in stageSeconds.items()},
+            'peakRSSMegabytes': getPeakRSSMegabytes()}
+
+
+def getCommit():
+    """ Return the current git commit, or None outside a git checkout. """
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+#
+# Reporting
+#
+def printResult(result):
+    latency = result['latencyMilliseconds']
+    print(f'{result["translator"]:9} {result["size"]:8} {result["outputBytes"]:10d} {result["recordsPerSecond"]:10.1f}'
+          f' {latency["p50"]:9.3f} {latency["p99"]:9.3f} {result["peakRSSMegabytes"]:9.1f}')
+    stages = '  '.join(f'{stageName} {stageTimes["p50"]:.3f}'
+                       for (stageName, stageTimes) in result['stageMilliseconds'].items())
+    print(f'{"":19} stage p50 ms: {stages}')
+
+
+def printComparison(previous, results):
+    """ Print the change in throughput and p50 latency against results saved earlier. """
+    previousResults = {(result['translator'], result['size']): result for result in previous['results']}
+    print(f'\nCompared with {previous.get("commit") or "saved results"}:')
+    for result in results:
+        old = previousResults.get((result['translator'], result['size']))
+        if old is None:
+            continue
+        speedup = result['recordsPerSecond'] / old['recordsPerSecond']
+        print(f'{result["translator"]:9} {result["size"]:8} records/sec {old["recordsPerSecond"]:10.1f}'
+              f' -> {result["recordsPerSecond"]:10.1f} ({speedup:5.2f} x)'
+              f'   p50 ms {old["latencyMilliseconds"]["p50"]:.3f} -> {result["latencyMilliseconds"]["p50"]:.3f}')
+        for (stageName, stageTimes) in result['stageMilliseconds'].items():
+            oldStageTimes = old['stageMilliseconds'].get(stageName)
+            if oldStageTimes:
+                print(f'{"":19} {stageName:12} p50 ms {oldStageTimes["p50"]:.3f} -> {stageTimes["p50"]:.3f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark DSET and DataCite to ISO translation, stage by stage.')
+    parser.add_argument('--translators', nargs='+', choices=list(TRANSLATORS), default=list(TRANSLATORS),
+                        help='translators to benchmark')
+    parser.add_argument('--sizes', nargs='+', choices=list(RECORD_SIZES), default=list(RECORD_SIZES),
+                        help='synthetic record sizes to benchmark')
+    parser.add_argument('--repeat', type=int, default=100, help='number of records translated per size')
+    parser.add_argument('--output', help='save results to this JSON file')
+    parser.add_argument('--compare', help='JSON results file saved earlier, to compare against')
+    args = parser.parse_args()
+
+    # Peak RSS only grows, so sizes run smallest first and each row shows the peak up to that size.
+    sizes = [size for size in RECORD_SIZES if size in args.sizes]
+    print(f'{"translator":9} {"size":8} {"out bytes":>10} {"records/s":>10} {"p50 ms":>9} {"p99 ms":>9}'
+          f' {"peak MB":>9}')
+    results = []
+    for size in sizes:
+        for translatorName in args.translators:
+            results.append(benchmarkTranslator(translatorName, size, args.repeat))
+            printResult(results[-1])
+
+    report = {'commit': getCommit(),
+              'python': platform.python_version(),
+              'lxml': '.'.join(str(part) for part in etree.LXML_VERSION),
+              'repeat': args.repeat,
+              'results': results}
+    if args.output:
+        with open(args.output, 'w') as outputFile:
+            json.dump(report, outputFile, indent=2)
+    if args.compare:
+        with open(args.compare) as compareFile:
+            printComparison(json.load(compareFile), results)
+
+
+if __name__ == '__main__':
+    main()
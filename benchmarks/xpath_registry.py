@@ -0,0 +1,69 @@
+#
+# Micro-benchmark: per-record XPath cost with string XPaths versus the compiled XPath registry.
+#
+# To run this benchmark: type "python -m benchmarks.xpath_registry" in the top-level folder.
+#
+
+import argparse
+import json
+import timeit
+
+import api.util.xml as xml
+import api.translate.dset as dset_translate
+
+
+DEFAULT_TEMPLATE = './templates_ISO19139/dset_full.xml'
+DEFAULT_RECORD = './defaultInputRecords/test_dset_full.txt'
+
+
+def getRecordXPaths(record, templatePath):
+    """ Translate one record and return every XPath string searched during the translation, in call order. """
+    searchedPaths = []
+    originalGetElements = xml.getElements
+
+    def recordingGetElements(baseElement, elementPath):
+        searchedPaths.append(elementPath)
+        return originalGetElements(baseElement, elementPath)
+
+    xml.getElements = recordingGetElements
+    try:
+        dset_translate.transformDSETToISO(record, templatePath)
+    finally:
+        xml.getElements = originalGetElements
+    return searchedPaths
+
+
+def evaluateStrings(root, xpaths):
+    for xpath in xpaths:
+        root.xpath(xpath, namespaces=xml.ISO_NAMESPACES)
+
+
+def evaluateCompiled(root, compiledPaths):
+    for compiledPath in compiledPaths:
+        compiledPath(root)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare per-record XPath cost, string versus compiled XPaths.')
+    parser.add_argument('--template', default=DEFAULT_TEMPLATE, help='ISO template file')
+    parser.add_argument('--record', default=DEFAULT_RECORD, help='DSET JSON record file')
+    parser.add_argument('--repeat', type=int, default=200, help='number of simulated records')
+    args = parser.parse_args()
+
+    with open(args.record) as recordFile:
+        record = json.load(recordFile)
+    xpaths = getRecordXPaths(record, args.template)
+    compiledPaths = [xml.compileXPath(xpath) for xpath in xpaths]
+    root = xml.getTemplateTree(args.template)
+
+    stringSeconds = timeit.timeit(lambda: evaluateStrings(root, xpaths), number=args.repeat)
+    compiledSeconds = timeit.timeit(lambda: evaluateCompiled(root, compiledPaths), number=args.repeat)
+
+    print(f'XPath searches per record:   {len(xpaths)} ({len(set(xpaths))} distinct)')
+    print(f'String XPaths, per record:   {1e6 * stringSeconds / args.repeat:10.1f} us')
+    print(f'Compiled XPaths, per record: {1e6 * compiledSeconds / args.repeat:10.1f} us')
+    print(f'Speedup:                     {stringSeconds / compiledSeconds:10.2f} x')
+
+
+if __name__ == '__main__':
+    main()
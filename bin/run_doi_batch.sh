@@ -13,10 +13,11 @@ DOI_SUFFIXES="10.26024/sprq-2d04"
 echo "DOI_SUFFIXES= " $DOI_SUFFIXES
 
 
+# Translate all DOIs in a single run; records are downloaded concurrently and written to OUTPUT_DIR.
+OUTPUT_DIR=${OUTPUT_DIR:-.}
+DOI_FILE=`mktemp`
 for f in $DOI_SUFFIXES; do
-   #echo "Processing 10.5065/${f}..."
-   #python datacite2iso.py  --doi 10.5065/${f} > test_${f}.xml
-   echo "Processing ${f}..."
-   suffix=`echo ${f} | cut -d / -f 2`
-   python datacite2iso.py  --doi ${f} > test_${suffix}.xml
+   echo ${f} >> $DOI_FILE
 done
+python datacite2iso.py --doiFile $DOI_FILE --outputDir $OUTPUT_DIR
+rm -f $DOI_FILE
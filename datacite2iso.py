@@ -6,8 +6,8 @@ import argparse
 import sys
 import os.path
 
-import api.inputjson as input_json
-import api.translate.datacite as translate
+# The translation, harvesting and cache modules, and requests with them, are imported once the command line has
+# been parsed, so --help, --version and usage errors return at once.
 
 __version_info__ = ('2026', '04', '10')
 __version__ = '-'.join(__version_info__)
@@ -17,18 +17,35 @@ PROGRAM_DESCRIPTION = '''
 A program for translating DataCite JSON metadata into ISO 19139 metadata.
 
 DataCite metadata is obtained from the DataCite website, so an internet connection is required.
+Responses are kept in a local cache, so DOIs downloaded recently are not downloaded again.
 
-Example usage:
+Example usages:
 
        python datacite2iso.py --doi 10.5065/D6WD3XH5   > test_datacite.xml
 
-Required arguments:
+       python datacite2iso.py --doiFile my_dois.txt --outputDir ./defaultOutputRecords
+
+       python datacite2iso.py --prefix 10.5065 --outputDir ./defaultOutputRecords --workers 16
+
+Record source arguments (exactly one is required):
   
-       --doi <DOI>             DOI to translate
+       --doi <DOI>             DOI to translate; the ISO record is printed to STDOUT
+       --doiFile <filename>    Text file listing DOIs to translate, one per line
+       --prefix <prefix>       Translate every DOI registered under a DOI prefix, e.g. 10.5065
 
 Optional arguments:
 
        --template <filename>   Custom ISO template to use from the 'templates' folder.  Default: datacite.xml 
+       --outputDir <path>      Folder for ISO records; required with --doiFile or --prefix
+       --workers <N>           Number of concurrent DataCite downloads for --doiFile.  Default: 8
+       --apiURL <url>          DataCite REST API base URL, e.g. for a local test server.  Default: https://api.datacite.org
+
+       --cacheFile <path>      DataCite response cache.  Default: ~/.cache/data-tools/datacite_responses.sqlite
+       --cacheTTL <seconds>    Cached responses younger than this are used without contacting DataCite;
+                               older responses are revalidated.  Default: 86400 (one day)
+       --cacheMaxMB <MB>       Evict least recently used responses when the cache exceeds this size.  Default: 512
+       --offline               Use only cached responses; never contact DataCite
+       --noCache               Do not read or write the response cache
 
        --version               Print this program version and exit 
        --help                  Print this program description and exit 
@@ -43,36 +60,135 @@ class PrintHelpOnErrorParser(argparse.ArgumentParser):
         sys.exit(2)
 
 
-#
-#  Parse the command line options.
-#
-programHelp = PROGRAM_DESCRIPTION + __version__
-parser = PrintHelpOnErrorParser(description=programHelp, formatter_class=argparse.RawTextHelpFormatter)
-parser.add_argument("--template", nargs=1, help="custom ISO template to use from the 'templates' folder.  Default: datacite.xml")
-parser.add_argument('--version', action='version', version="%(prog)s (" + __version__ + ")")
-
-requiredArgs = parser.add_argument_group('required arguments')
-requiredArgs.add_argument("--doi", nargs=1, required=True, help="Digital Object Identifier (DOI)")
-
-args = parser.parse_args()
-
-# Check for ISO 19139 template existence.
 DEFAULT_OUTPUT_TEMPLATE = 'datacite.xml'
 
-templateFilePath = input_json.getTemplateFilePath(args.template, DEFAULT_OUTPUT_TEMPLATE)
-if not os.path.isfile(templateFilePath):
-    message = 'Template file does not exist: %s\n' % templateFilePath
-    parser.error(message)
-
-# Query the specified DOI's metadata JSON record.
-doi = args.doi[0]
-record = input_json.getDataCiteRecords(doi)
 
-#
-#  Perform the translation.
-#
-if len(record) > 0:
-    output = translate.translateDataCiteRecord(record, templateFilePath)
-    print(output, file=sys.stdout)
-else:
-    print(("DOI " + doi + " was not found.\n"), file=sys.stderr)
+def parseArguments():
+    """ Parse and validate the command line options. """
+    programHelp = PROGRAM_DESCRIPTION + __version__
+    parser = PrintHelpOnErrorParser(description=programHelp, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--template", nargs=1, help="custom ISO template to use from the 'templates' folder.  Default: datacite.xml")
+    parser.add_argument('--version', action='version', version="%(prog)s (" + __version__ + ")")
+
+    parser.add_argument("--outputDir", nargs=1, help="folder for ISO records; required with --doiFile or --prefix")
+    parser.add_argument("--workers", nargs=1, type=int, default=[8], help="number of concurrent DataCite downloads. Default: 8")
+    parser.add_argument("--apiURL", nargs=1, help="DataCite REST API base URL.  Default: https://api.datacite.org")
+    parser.add_argument("--cacheFile", nargs=1, help="DataCite response cache file")
+    parser.add_argument("--cacheTTL", nargs=1, type=float, help="seconds before a cached response is revalidated. Default: 86400")
+    parser.add_argument("--cacheMaxMB", nargs=1, type=float, help="maximum size of cached responses in MB. Default: 512")
+    parser.add_argument("--offline", action='store_true', help="use only cached responses; never contact DataCite")
+    parser.add_argument("--noCache", action='store_true', help="do not read or write the response cache")
+
+    requiredArgs = parser.add_argument_group('record source arguments (exactly one is required)')
+    sourceArgs = requiredArgs.add_mutually_exclusive_group(required=True)
+    sourceArgs.add_argument("--doi", nargs=1, help="Digital Object Identifier (DOI)")
+    sourceArgs.add_argument("--doiFile", nargs=1, help="text file listing DOIs, one per line")
+    sourceArgs.add_argument("--prefix", nargs=1, help="DOI prefix; translate every DOI registered under this prefix")
+
+    args = parser.parse_args()
+
+    if args.offline and args.noCache:
+        parser.error('--offline cannot be combined with --noCache')
+
+    if args.doi is None:
+        if args.outputDir is None:
+            parser.error('--outputDir is required with --doiFile or --prefix')
+        if not os.path.isdir(args.outputDir[0]):
+            parser.error('Output directory does not exist: %s\n' % args.outputDir[0])
+        if args.doiFile and not os.path.isfile(args.doiFile[0]):
+            parser.error('DOI file does not exist: %s\n' % args.doiFile[0])
+        if args.workers[0] < 1:
+            parser.error('--workers must be at least 1')
+
+    # Check for ISO 19139 template existence.
+    import api.inputjson as input_json
+    templateFilePath = input_json.getTemplateFilePath(args.template, DEFAULT_OUTPUT_TEMPLATE)
+    if not os.path.isfile(templateFilePath):
+        message = 'Template file does not exist: %s\n' % templateFilePath
+        parser.error(message)
+
+    # Check that the template holds every element the translation fills in or removes.
+    import api.translate.datacite as translate
+    import api.util.xml as xml
+    try:
+        translate.getTemplateAnchors(templateFilePath)
+    except xml.TemplateError as error:
+        parser.error(str(error))
+
+    return parser, args, templateFilePath
+
+
+def translateHarvestedRecords(results, templateFilePath, outputDir):
+    """ Translate (doi, record, errorMessage) results as they arrive, and save each ISO record to the output folder. """
+    import api.harvest as harvest
+    import api.translate.datacite as translate
+    from api.batch import BatchSummary
+
+    summary = BatchSummary()
+    for (doi, record, errorMessage) in results:
+        if record is None and not errorMessage:
+            errorMessage = 'DOI was not found'
+        if not errorMessage:
+            try:
+                output = translate.translateDataCiteRecord(record, templateFilePath)
+                outputFile = os.path.join(outputDir, harvest.getOutputFileName(doi))
+                with open(outputFile, 'w') as file:
+                    print(output, file=file)
+                print(doi + " -> " + outputFile, file=sys.stdout)
+            except Exception as error:
+                errorMessage = '%s: %s' % (type(error).__name__, error)
+        summary.add(doi, errorMessage)
+    return summary
+
+
+def main():
+    parser, args, templateFilePath = parseArguments()
+
+    import api.harvest as harvest
+    import api.httpcache as httpcache
+
+    apiURL = args.apiURL[0] if args.apiURL else harvest.DATACITE_API_URL
+    cache = None
+    if not args.noCache:
+        cacheFile = args.cacheFile[0] if args.cacheFile else httpcache.DEFAULT_CACHE_FILE
+        cacheTTL = args.cacheTTL[0] if args.cacheTTL else httpcache.DEFAULT_TTL_SECONDS
+        cacheMaxBytes = int(args.cacheMaxMB[0] * 2**20) if args.cacheMaxMB else httpcache.DEFAULT_MAX_BYTES
+        cache = httpcache.ResponseCache(cacheFile, cacheTTL, cacheMaxBytes, args.offline)
+
+    if args.doi:
+        import api.translate.datacite as translate
+
+        # Query the specified DOI's metadata JSON record.
+        doi = args.doi[0]
+        try:
+            record = harvest.fetchDataCiteRecord(harvest.getSession(1), doi, apiURL, cache=cache)
+        except httpcache.NotCachedError as error:
+            parser.error(str(error))
+
+        #
+        #  Perform the translation.
+        #
+        if record:
+            output = translate.translateDataCiteRecord(record, templateFilePath)
+            print(output, file=sys.stdout)
+        else:
+            print(("DOI " + doi + " was not found.\n"), file=sys.stderr)
+
+    else:
+        # Download records over a pool of keep-alive connections, translating each record as soon as it arrives.
+        numWorkers = args.workers[0]
+        session = harvest.getSession(numWorkers)
+        if args.prefix:
+            results = harvest.getPrefixResults(session, args.prefix[0], apiURL, cache=cache)
+        else:
+            dois = harvest.getDOIFileList(args.doiFile[0])
+            results = harvest.getDOIRecords(session, dois, apiURL, numWorkers=numWorkers, cache=cache)
+
+        summary = translateHarvestedRecords(results, templateFilePath, args.outputDir[0])
+        summary.report(sys.stderr)
+        if summary.errors:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
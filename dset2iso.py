@@ -11,6 +11,8 @@ import os.path
 __version_info__ = ('2021', '01', '14')
 __version__ = '-'.join(__version_info__)
 
+ISO_TEMPLATE_PATH = './templates_ISO19139/dset_full.xml'
+
 PROGRAM_DESCRIPTION = '''
 
 A program for translating JSON metadata into ISO 19139 metadata.
@@ -28,6 +30,31 @@ Here are some working examples showing the two main uses of this program:
        python dset2iso.py --inputDir ./defaultInputRecords --outputDir ./defaultOutputRecords
 
 
+  * Perform batch DSET metadata record processing using 8 worker processes:
+
+       python dset2iso.py --inputDir ./defaultInputRecords --outputDir ./defaultOutputRecords --workers 8
+
+
+  * Output files are written through a temporary file renamed into place, so an interrupted run never leaves a
+    truncated record.  On slow or network filesystems, write files on background threads while translating:
+
+       python dset2iso.py --inputDir ./defaultInputRecords --outputDir ./defaultOutputRecords --writerThreads 2
+
+
+  * Batch processing skips records translated by an earlier run whose input file, template and program version
+    are unchanged; outputs of deleted input files are removed.  Use --force to translate every record again.
+
+  * Translate a JSON Lines stream of DSET records (one record per line) into a tar archive of ISO records:
+
+       python dset2iso.py --jsonLines records.jsonl --outputFormat tar --outputFile records.tar
+
+
+  * Report call counts and time spent per translation stage and XML helper, summed over all workers, at the end
+    of a run; use '--profile prometheus' for Prometheus text format:
+
+       python dset2iso.py --inputDir ./defaultInputRecords --outputDir ./defaultOutputRecords --profile text
+
+
 Program Version: '''
 
 
@@ -38,94 +65,230 @@ class PrintHelpOnErrorParser(argparse.ArgumentParser):
         sys.exit(2)
 
 
-def checkDirectoryExistence(directoryPath, directoryDescription):
+def checkDirectoryExistence(parser, directoryPath, directoryDescription):
     """ generate an error if directory does not exist. """
     if not os.path.isdir(directoryPath):
         message = directoryDescription + ' does not exist: %s\n' % directoryPath
         parser.error(message)
 
 
-def checkFileExistence(filePath, description):
+def checkFileExistence(parser, filePath, description):
     """ generate an error if file does not exist. """
     if not os.path.isfile(filePath):
         message = description + ' does not exist: %s\n' % filePath
         parser.error(message)
 
 
-#
-#  Parse and validate command line options.
-#
-programHelp = PROGRAM_DESCRIPTION + __version__
-parser = PrintHelpOnErrorParser(description=programHelp, formatter_class=argparse.RawTextHelpFormatter)
-
-parser.add_argument('--template', nargs=1, help="path to ISO XML template file, default is "
-                                                "'./templates_ISO19139/dset_full.xml'")
-parser.add_argument('--inputDir', nargs=1, help="base directory for input records")
-parser.add_argument('--outputDir', nargs=1, help="base directory for output records")
-parser.add_argument('--version', action='version', version="%(prog)s (" + __version__ + ")")
-args = parser.parse_args()
-
-# Require that --input-dir and --output-dir both be used if either is used.
-if len([x for x in (args.inputDir, args.outputDir) if x is not None]) == 1:
-    parser.error('--inputDir and --outputDir must be given together')
-
-# Check that input and output directories exist.
-readSTDIN = (args.inputDir == None)
-if not readSTDIN:
-    checkDirectoryExistence(args.inputDir[0], 'Input directory')
-    checkDirectoryExistence(args.outputDir[0], 'Output directory')
+def checkTemplate(parser, templatePath):
+    """ generate an error if the ISO template lacks elements the translation fills in or removes. """
+    import api.translate.dset as dset_translate
+    import api.util.xml as xml
+    try:
+        dset_translate.getTemplateAnchors(templatePath)
+    except xml.TemplateError as error:
+        parser.error(str(error))
+
+
+def parseArguments():
+    """ Parse and validate command line options. """
+    programHelp = PROGRAM_DESCRIPTION + __version__
+    parser = PrintHelpOnErrorParser(description=programHelp, formatter_class=argparse.RawTextHelpFormatter)
+
+    parser.add_argument('--template', nargs=1, help="path to ISO XML template file, default is "
+                                                    "'./templates_ISO19139/dset_full.xml'")
+    parser.add_argument('--inputDir', nargs=1, help="base directory for input records")
+    parser.add_argument('--outputDir', nargs=1, help="base directory for output records")
+    parser.add_argument('--force', action='store_true', help="translate all batch records, even if unchanged since "
+                                                            "the last run")
+    parser.add_argument('--jsonLines', nargs=1, help="JSON Lines file with one DSET record per line; "
+                                                     "use '-' to read from STDIN")
+    parser.add_argument('--outputFile', nargs=1, help="output file for --jsonLines records, default is STDOUT")
+    parser.add_argument('--outputFormat', nargs=1, choices=['jsonl', 'tar', 'zip'], default=['jsonl'],
+                        help="output format for --jsonLines records, default is 'jsonl'")
+    parser.add_argument('--workers', nargs=1, type=int, default=[1], help="number of worker processes for batch "
+                                                                          "translation, default is 1")
+    parser.add_argument('--writerThreads', nargs=1, type=int, default=[0],
+                        help="threads per process writing batch output files, so translation overlaps file I/O; "
+                             "default is 0, writing each file after it is translated")
+    parser.add_argument('--profile', nargs=1, choices=['text', 'prometheus'],
+                        help="report time and calls per translation stage and XML helper at the end of the run")
+    parser.add_argument('--profileFile', nargs=1, help="file for the --profile report, default is STDERR")
+    parser.add_argument('--version', action='version', version="%(prog)s (" + __version__ + ")")
+    args = parser.parse_args()
+
+    # Require that --input-dir and --output-dir both be used if either is used.
+    if len([x for x in (args.inputDir, args.outputDir) if x is not None]) == 1:
+        parser.error('--inputDir and --outputDir must be given together')
+
+    # JSON Lines input is a separate mode from directory input.
+    readJSONLines = (args.jsonLines is not None)
+    if readJSONLines and args.inputDir is not None:
+        parser.error('--jsonLines cannot be combined with --inputDir and --outputDir')
+    if args.outputFile is not None and not readJSONLines:
+        parser.error('--outputFile can only be used with --jsonLines')
+    if readJSONLines and args.jsonLines[0] != '-':
+        checkFileExistence(parser, args.jsonLines[0], 'JSON Lines input file')
+
+    # Check that input and output directories exist.
+    if args.inputDir is not None:
+        checkDirectoryExistence(parser, args.inputDir[0], 'Input directory')
+        checkDirectoryExistence(parser, args.outputDir[0], 'Output directory')
+
+    if args.workers[0] < 1:
+        parser.error('--workers must be at least 1')
+    if args.writerThreads[0] < 0:
+        parser.error('--writerThreads cannot be negative')
+    if args.profileFile is not None and args.profile is None:
+        parser.error('--profileFile can only be used with --profile')
+
+    templatePath = ISO_TEMPLATE_PATH
+    if args.template and args.template[0]:
+        ## Insert new concepts into an existing ISO XML file
+        templatePath = args.template[0]
+    checkFileExistence(parser, templatePath, 'ISO template')
+    checkTemplate(parser, templatePath)
+
+    return args, templatePath
+
+
+def writeProfileReport(args):
+    """ Write the --profile report, if profiling was requested. """
+    if not args.profile:
+        return
+    import api.util.profile as dset_profile
+    report = dset_profile.profile.format(args.profile[0])
+    if args.profileFile:
+        with open(args.profileFile[0], 'w') as reportFile:
+            reportFile.write(report)
+    else:
+        sys.stderr.write(report)
 
-import api.inputjson as dset_input
-import api.translate.dset as dset_translate
-import api.output as dset_output
 
-import pprint
-
-ISO_TEMPLATE_PATH = './templates_ISO19139/dset_full.xml'
-
-
-
-###
-### START OF MAIN PROGRAM
-###
-
-if args.template and args.template[0]:
-    ## Insert new concepts into an existing ISO XML file
-    ISO_TEMPLATE_PATH = args.template[0]
-
-checkFileExistence(ISO_TEMPLATE_PATH, 'ISO template')
+#
+#  Translation modes.  Each mode imports only the modules it uses, so a single record, --help or --version
+#  does not pay for loading the batch, output and manifest code.
+#
+def translateSTDIN(args, templatePath):
+    """ Translate one DSET record from STDIN, and print the ISO record to STDOUT. """
+    import api.inputjson as dset_input
+    import api.translate.dset as dset_translate
 
-if readSTDIN:
-    inputText = sys.stdin.readlines()
-    inputText = "".join(inputText)
+    # The record is decoded straight from the bytes read, without first being decoded to text.
+    inputBytes = sys.stdin.buffer.read()
 
-    jsonData = dset_input.getJSONData(inputText)
-    # pprint.pprint(jsonData)
+    jsonData = dset_input.getJSONData(inputBytes)
 
-    isoText = dset_translate.transformDSETToISO(jsonData, ISO_TEMPLATE_PATH)
+    isoText = dset_translate.transformDSETToISO(jsonData, templatePath)
 
     # Python 3 needs conversion from byte array to string
     isoText = str(isoText)
     print(isoText, file=sys.stdout)
+    writeProfileReport(args)
+
+
+def translateJSONLines(args, templatePath, profiling):
+    """ Translate a JSON Lines stream of DSET records into a stream or archive of ISO records. """
+    import api.inputjson as dset_input
+    import api.output as dset_output
+    import api.batch as dset_batch
+
+    # Lines are read, and passed to the workers, as bytes; the JSON decoder reads UTF-8 bytes directly.
+    if args.jsonLines[0] == '-':
+        inputStream = sys.stdin.buffer
+    else:
+        inputStream = open(args.jsonLines[0], 'rb')
+    if args.outputFile:
+        outputStream = open(args.outputFile[0], 'wb')
+    else:
+        outputStream = sys.stdout.buffer
+
+    # Records are read, translated and written one chunk at a time; the summary goes to STDERR,
+    # since STDOUT may be carrying the translated records.
+    summary = dset_batch.BatchSummary()
+    writer = dset_output.getStreamWriter(args.outputFormat[0], outputStream)
+    numberedLines = dset_input.getJSONLines(inputStream)
+    results = dset_batch.translateStream(numberedLines, templatePath, args.workers[0], profiling=profiling)
+    for (lineNumber, recordID, isoText, errorMessage) in results:
+        summary.add('line ' + str(lineNumber), errorMessage)
+        if not errorMessage:
+            writer.write(recordID, isoText)
+    writer.close()
+    outputStream.close()
+
+    summary.report(sys.stderr)
+    writeProfileReport(args)
+    return summary
+
+
+def translateDirectory(args, templatePath, profiling):
+    """ Translate the DSET record files of an input folder that changed since the last run into an output folder. """
+    import api.inputjson as dset_input
+    import api.batch as dset_batch
+    import api.manifest as dset_manifest
 
-else:
     inputDir = args.inputDir[0]
     outputDir = args.outputDir[0]
     print(inputDir, file=sys.stdout)
     jsonFiles = dset_input.getJSONFileNames(inputDir)
     print("Found " + str(len(jsonFiles)) + " input files.", file=sys.stdout)
-    for inputFile in jsonFiles:
-        with open(inputFile, 'r') as myfile:
-            inputText = myfile.readlines()
-            inputText = "".join(inputText)
-        jsonData = dset_input.getJSONData(inputText)
 
-        print(("  Translating file: " + inputFile), file=sys.stdout)
-        isoText = dset_translate.transformDSETToISO(jsonData, ISO_TEMPLATE_PATH)
+    # Only translate records whose input, template or program version changed since the last run; with --force,
+    # translate every record, but still remove the outputs of deleted input files.
+    summary = dset_batch.BatchSummary()
+    manifest = dset_manifest.loadManifest(outputDir)
+    templateHash = dset_manifest.getFileHash(templatePath)
+    changedFiles, unchangedFiles, removedKeys = dset_manifest.planIncrementalRun(manifest, jsonFiles, inputDir, outputDir,
+                                                                                 templateHash, __version__, args.force)
+    dset_manifest.removeOutputs(manifest, removedKeys, outputDir)
+    summary.skipped = len(unchangedFiles)
+    summary.removed = len(removedKeys)
+
+    # Translation errors are reported in the summary; they do not stop the remaining records from being translated.
+    fileStates = dict(changedFiles)
+    try:
+        results = dset_batch.translateFiles(list(fileStates), inputDir, outputDir, templatePath, args.workers[0],
+                                            profiling=profiling, writerThreads=args.writerThreads[0])
+        for (inputFile, outputFile, errorMessage) in results:
+            summary.add(inputFile, errorMessage)
+            manifestKey = dset_manifest.getManifestKey(inputFile, inputDir)
+            if errorMessage:
+                manifest.pop(manifestKey, None)
+                print(("  Failed to translate file: " + inputFile), file=sys.stdout)
+            else:
+                manifest[manifestKey] = dset_manifest.makeEntry(fileStates[inputFile], templateHash, __version__,
+                                                                outputFile, outputDir)
+                print((inputFile + " -> " + outputFile), file=sys.stdout)
+    finally:
+        dset_manifest.saveManifest(outputDir, manifest)
+
+    summary.report(sys.stdout)
+    writeProfileReport(args)
+    return summary
+
+
+###
+### START OF MAIN PROGRAM
+###
+
+def main():
+    args, templatePath = parseArguments()
+
+    # Profiling is off unless requested, so normal runs call the translation functions directly.
+    profiling = args.profile is not None
+    if profiling:
+        import api.util.profile as dset_profile
+        dset_profile.enable()
+
+    if args.jsonLines is not None:
+        summary = translateJSONLines(args, templatePath, profiling)
+    elif args.inputDir is not None:
+        summary = translateDirectory(args, templatePath, profiling)
+    else:
+        translateSTDIN(args, templatePath)
+        return
+    if summary.errors:
+        sys.exit(1)
 
-        outputFile = dset_output.prepareOutputFile(inputFile, inputDir, outputDir)
-        print((inputFile + " -> " + outputFile), file=sys.stdout)
 
-        file = open(outputFile, 'w')
-        file.write(isoText)
-        file.close()
+if __name__ == '__main__':
+    main()
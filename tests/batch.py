@@ -0,0 +1,136 @@
+#
+#  To run these unit tests: type "./run_tests.sh" at a command prompt.
+#
+
+import unittest
+import io
+import json
+import os
+import subprocess
+import sys
+import tarfile
+import tempfile
+
+import api.batch as batch
+
+
+#
+# Unit test Setup/Helper functions
+#
+
+TEMPLATE_PATH = './templates_ISO19139/dset_full.xml'
+
+FAILED_INDICES = (2, 7)
+
+
+def makeRecordFiles(inputDir, count):
+    ''' Write count DSET record files, record_<index>.txt, with invalid JSON at FAILED_INDICES; return their paths. '''
+    with open('./defaultInputRecords/test_dset_full.txt') as recordFile:
+        record = json.load(recordFile)
+    record['metadata_date'] = '2020-01-01T00:00:00'
+    inputFiles = []
+    for index in range(count):
+        inputFiles.append(os.path.join(inputDir, 'record_%02d.txt' % index))
+        with open(inputFiles[-1], 'w') as inputFile:
+            if index in FAILED_INDICES:
+                inputFile.write('{"title": ')
+            else:
+                json.dump(dict(record, metadata_id='record_%02d' % index), inputFile)
+    return inputFiles
+
+
+#
+# Unit tests
+#
+class Batch_Test(unittest.TestCase):
+
+   def testTranslateFiles_KeepsInputOrderWithWorkers(self):
+      ''' Results of a batch run on worker processes should come back in input order, with the same outputs and
+          failures as a run in this process, and failed records should not stop the rest of the run.
+      '''
+      with tempfile.TemporaryDirectory() as tempDir:
+         inputDir = os.path.join(tempDir, 'input')
+         os.makedirs(inputDir)
+         inputFiles = makeRecordFiles(inputDir, 12)
+
+         runs = []
+         for numWorkers in (1, 3):
+            outputDir = os.path.join(tempDir, 'output_%d' % numWorkers)
+            results = list(batch.translateFiles(inputFiles, inputDir, outputDir, TEMPLATE_PATH, numWorkers))
+            self.assertEqual([inputFile for (inputFile, outputFile, errorMessage) in results], inputFiles)
+            contents = []
+            for (inputFile, outputFile, errorMessage) in results:
+               if outputFile:
+                  with open(outputFile, 'rb') as isoFile:
+                     contents.append((os.path.relpath(outputFile, outputDir), isoFile.read()))
+               else:
+                  contents.append((None, errorMessage.split(':')[0]))
+            runs.append(contents)
+
+         self.assertEqual(runs[1], runs[0])
+         self.assertEqual([index for (index, (outputFile, content)) in enumerate(runs[0]) if outputFile is None],
+                          list(FAILED_INDICES))
+         self.assertEqual(runs[0][2], (None, 'JSONDecodeError'))
+
+   def testTranslateStream_KeepsLineOrderWithWorkers(self):
+      ''' JSON Lines records translated on worker processes, a few chunks at a time, should come back in line order,
+          with the same ISO records and failures as records translated in this process.
+      '''
+      with open('./defaultInputRecords/test_dset_full.txt') as recordFile:
+         record = json.load(recordFile)
+      record['metadata_date'] = '2020-01-01T00:00:00'
+      numberedLines = [(lineNumber, json.dumps(dict(record, metadata_id='record_%d' % lineNumber)))
+                       for lineNumber in range(1, 21)]
+      numberedLines[6] = (7, '{"title": ')
+
+      runs = []
+      for numWorkers in (1, 3):
+         runs.append(list(batch.translateStream(iter(numberedLines), TEMPLATE_PATH, numWorkers, chunkSize=2)))
+      self.assertEqual(runs[1], runs[0])
+      self.assertEqual([lineNumber for (lineNumber, recordID, isoText, errorMessage) in runs[0]], list(range(1, 21)))
+      self.assertEqual([recordID for (lineNumber, recordID, isoText, errorMessage) in runs[0][5:8]],
+                       ['record_6', None, 'record_8'])
+      self.assertTrue(runs[0][6][3].startswith('JSONDecodeError'))
+
+   def testDSET2ISO_ArchivesOnlyRecordsWithUsableIDs(self):
+      ''' In a --jsonLines run writing an archive, a numeric metadata_id should name its record, and a null one
+          should be listed as a failure, rather than stop the run.
+      '''
+      with open('./defaultInputRecords/test_dset_full.txt') as recordFile:
+         record = json.load(recordFile)
+      with tempfile.TemporaryDirectory() as tempDir:
+         inputFile = os.path.join(tempDir, 'records.jsonl')
+         outputFile = os.path.join(tempDir, 'records.tar')
+         with open(inputFile, 'w') as jsonLines:
+            for recordID in ('first', 12, None):
+               jsonLines.write(json.dumps(dict(record, metadata_id=recordID)) + '\n')
+         result = subprocess.run([sys.executable, 'dset2iso.py', '--jsonLines', inputFile, '--outputFormat', 'tar',
+                                  '--outputFile', outputFile], stderr=subprocess.PIPE)
+         errors = result.stderr.decode('utf-8')
+         self.assertEqual(result.returncode, 1, errors)
+         self.assertIn('  FAILED line 3: ValueError: metadata_id is missing or not a string: None', errors)
+         with tarfile.open(outputFile) as archive:
+            self.assertEqual(archive.getnames(), ['first.xml', '12.xml'])
+
+   def testBatchSummary_ReportsFailures(self):
+      ''' The summary should count translated, skipped and removed records, and list each failure with its error.
+      '''
+      summary = batch.BatchSummary()
+      for (inputFile, outputFile, errorMessage) in [('a.txt', 'a.xml', None), ('b.txt', None, 'ValueError: bad'),
+                                                     ('c.txt', 'c.xml', None)]:
+         summary.add(inputFile, errorMessage)
+      summary.skipped = 4
+      summary.removed = 1
+      stream = io.StringIO()
+      summary.report(stream)
+
+      lines = stream.getvalue().splitlines()
+      self.assertEqual((summary.translated, summary.errors), (2, [('b.txt', 'ValueError: bad')]))
+      self.assertTrue(lines[0].startswith('Translated 2 of 3 records in '))
+      self.assertTrue(lines[0].endswith('; 1 failures.'))
+      self.assertEqual(lines[1:], ['Skipped 4 unchanged records; removed 1 outputs of deleted input files.',
+                                   '  FAILED b.txt: ValueError: bad'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,171 @@
+#
+#  To run these unit tests: type "./run_tests.sh" at a command prompt.
+#
+
+import unittest
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from lxml import etree as ElementTree
+
+import api.csw as csw
+from tests.support.servers import CSWServer, getTestISORecord
+
+
+#
+# Unit test Setup/Helper functions
+#
+
+def getTestRecords(count):
+    ''' Return (identifier, ISO XML bytes) records, copies of the DSET test record differing in fileIdentifier. '''
+    recordXML = getTestISORecord()
+    root = ElementTree.fromstring(recordXML)
+    identifier = root.findtext('.//{http://www.isotc211.org/2005/gco}CharacterString')
+    return [('record-%03d' % index, recordXML.replace(identifier.encode('utf-8'), b'record-%03d' % index, 1))
+            for index in range(count)]
+
+
+#
+# Unit tests
+#
+class CSW_Test(unittest.TestCase):
+
+   def setUp(self):
+      self.server = CSWServer().start()
+      self.url = csw.getPublicationURL(self.server.url)
+      self.session = csw.getSession(3)
+
+   def tearDown(self):
+      self.session.close()
+      self.server.stop()
+
+   def testMakeTransactions_AreWellFormed(self):
+      ''' Insert transactions should embed records without their XML declarations, and delete transactions should
+          match identifiers exactly, even identifiers with wildcard or markup characters.
+      '''
+      records = getTestRecords(2)
+      transaction = ElementTree.fromstring(csw.makeInsertTransaction([recordXML for (recordID, recordXML) in records]))
+      inserted = transaction.find('csw:Insert', namespaces=csw.NAMESPACES)
+      self.assertEqual(len(inserted), 2)
+      self.assertEqual([record.findtext('.//{http://www.isotc211.org/2005/gco}CharacterString') for record in inserted],
+                       ['record-000', 'record-001'])
+
+      transaction = ElementTree.fromstring(csw.makeDeleteTransaction(['10.5065/A_1%', 'a<b&c']))
+      self.assertEqual(transaction.xpath('csw:Delete//ogc:PropertyIsEqualTo/ogc:Literal/text()',
+                                         namespaces=csw.NAMESPACES), ['10.5065/A_1%', 'a<b&c'])
+
+   def testInsertAndDeleteRecords_SendsBatchesAndRetries(self):
+      ''' Records should be sent batchSize at a time and temporary errors should be retried.  Deleting records that
+          no longer exist, also in a rerun of the same deletion, should count them as deleted.
+      '''
+      records = getTestRecords(30)
+      self.server.failures = {csw.CSW_PUBLICATION_PATH: 2}
+      results = list(csw.insertRecords(self.session, self.url, records, batchSize=7, numWorkers=3, backoff=0.01))
+
+      self.assertEqual([len(identifiers) for (identifiers, totals, error) in results], [7, 7, 7, 7, 2])
+      self.assertEqual([error for (identifiers, totals, error) in results], [None] * 5)
+      self.assertEqual(sum(totals['totalInserted'] for (identifiers, totals, error) in results), 30)
+      self.assertEqual(sorted(self.server.records), [recordID for (recordID, recordXML) in records])
+      self.assertEqual(self.server.transactionCount, 5)
+      self.assertEqual(self.server.requestCount, 7)
+
+      identifiers = ['record-%03d' % index for index in range(0, 30, 3)] + ['missing']
+      for deletedCounts in ([4, 4, 2], [0, 0, 0]):
+         results = list(csw.deleteRecords(self.session, self.url, identifiers, batchSize=4, numWorkers=2))
+         self.assertEqual([error for (identifiers, totals, error) in results], [None] * 3)
+         self.assertEqual(results[2][0], ['record-024', 'record-027', 'missing'])
+         self.assertEqual([totals['totalDeleted'] for (identifiers, totals, error) in results], deletedCounts)
+         self.assertEqual(len(self.server.records), 20)
+
+   def testInsertRecords_ResendsOnlyRecordsNotInserted(self):
+      ''' The records of a batch the service inserted only in part should be reported as inserted, from the
+          response's InsertResult, and the rest sent again in smaller batches, so that only the records the service
+          refuses are reported as failed, and no record is sent after it was inserted.
+      '''
+      records = getTestRecords(14)
+      self.server.rejectedIdentifiers = {'record-003', 'record-010', 'record-011'}
+      results = list(csw.insertRecords(self.session, self.url, records, batchSize=7, numWorkers=2))
+
+      failed = [identifiers for (identifiers, totals, error) in results if error]
+      self.assertEqual(failed, [['record-003'], ['record-010'], ['record-011']])
+      self.assertEqual(results[0][1]['totalInserted'], 6)
+      inserted = [identifier for (identifiers, totals, error) in results if not error for identifier in identifiers]
+      self.assertEqual(sorted(inserted), sorted(self.server.records))
+      self.assertEqual(len(inserted), 11)
+      self.assertEqual(sum(totals['totalInserted'] for (identifiers, totals, error) in results), 11)
+      # Batch 1: 7 records, then record-003 alone.  Batch 2: 7 records, then halves of the 2 refused records.
+      self.assertEqual(self.server.transactionCount, 2 + 3)
+
+   def testSendTransaction_RetriesInsertsOnlyIfUnapplied(self):
+      ''' A Delete should be retried after any temporary failure, but an Insert only after a 429 or 503, which
+          the service answers without applying it; a request that times out should fail rather than wait.
+      '''
+      deleteTransaction = csw.makeDeleteTransaction(['record-000'])
+      insertTransaction = csw.makeInsertTransaction([recordXML for (recordID, recordXML) in getTestRecords(1)])
+      self.server.errorStatus = 500
+      for (transaction, idempotent, requestCount) in [(deleteTransaction, True, 2), (insertTransaction, False, 1)]:
+         self.server.requestCount = 0
+         self.server.failures = {csw.CSW_PUBLICATION_PATH: 1}
+         try:
+            csw.sendTransaction(self.session, self.url, transaction, backoff=0.01, idempotent=idempotent)
+         except csw.TransactionError as error:
+            self.assertIn('HTTP 500', str(error))
+         self.assertEqual(self.server.requestCount, requestCount, 'idempotent=%s' % idempotent)
+      self.assertEqual(list(self.server.records), [])
+
+      self.server.latency = 0.5
+      self.server.requestCount = 0
+      with self.assertRaises(csw.TransactionError):
+         csw.sendTransaction(self.session, self.url, insertTransaction, backoff=0.01, idempotent=False, timeout=0.1)
+      time.sleep(0.6)
+      self.assertEqual(self.server.requestCount, 1)
+
+   def testSendTransaction_RaisesForExceptionReport(self):
+      ''' A request the service rejects should raise TransactionError without being retried.
+      '''
+      with self.assertRaises(csw.TransactionError) as context:
+         csw.sendTransaction(self.session, self.url, b'<csw:Transaction', backoff=0.01)
+      self.assertIn('HTTP 400', str(context.exception))
+      self.assertEqual(self.server.requestCount, 1)
+      with self.assertRaises(csw.TransactionError):
+         csw.parseTransactionResponse(b'<ows:ExceptionReport xmlns:ows="http://www.opengis.net/ows"/>')
+
+   def testPushCSWRecords_WritesPushedIDs(self):
+      ''' pushCSWRecords.py should insert every record of a folder, and record the pushed IDs for deletion.
+      '''
+      with tempfile.TemporaryDirectory() as tempDir:
+         for (recordID, recordXML) in getTestRecords(5):
+            with open(os.path.join(tempDir, recordID + '.xml'), 'wb') as isoFile:
+               isoFile.write(recordXML)
+         idFile = os.path.join(tempDir, 'pushedRecordIDs.txt')
+         subprocess.run([sys.executable, '-m', 'utils.pushCSWRecords', '--inputDir', tempDir, '--idFile', idFile,
+                         '--baseURL', self.server.url, '--batchSize', '2'], check=True, capture_output=True)
+         with open(idFile) as idText:
+            self.assertEqual(idText.read().split(), ['record-%03d' % index for index in range(5)])
+      self.assertEqual(len(self.server.records), 5)
+      self.assertEqual(self.server.transactionCount, 3)
+
+   def testPushCSWRecords_WritesOnlyInsertedIDs(self):
+      ''' When the service refuses some records of a batch, pushCSWRecords.py should record the IDs of the records
+          it inserted, list the files of the refused records for a rerun, and exit with an error.
+      '''
+      self.server.rejectedIdentifiers = {'record-002'}
+      with tempfile.TemporaryDirectory() as tempDir:
+         for (recordID, recordXML) in getTestRecords(5):
+            with open(os.path.join(tempDir, recordID + '.xml'), 'wb') as isoFile:
+               isoFile.write(recordXML)
+         idFile = os.path.join(tempDir, 'pushedRecordIDs.txt')
+         result = subprocess.run([sys.executable, '-m', 'utils.pushCSWRecords', '--inputDir', tempDir, '--idFile',
+                                  idFile, '--baseURL', self.server.url, '--batchSize', '5'], capture_output=True)
+         self.assertEqual(result.returncode, 1)
+         self.assertEqual(result.stdout.decode('utf-8').split(), [os.path.join(tempDir, 'record-002.xml')])
+         with open(idFile) as idText:
+            self.assertEqual(sorted(idText.read().split()), ['record-000', 'record-001', 'record-003', 'record-004'])
+      self.assertEqual(sorted(self.server.records), ['record-000', 'record-001', 'record-003', 'record-004'])
+
+
+if __name__ == '__main__':
+    unittest.main()
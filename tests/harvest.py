@@ -0,0 +1,142 @@
+#
+#  To run these unit tests: type "./run_tests.sh" at a command prompt.
+#
+
+import unittest
+import os
+import subprocess
+import sys
+import tempfile
+
+import api.harvest as harvest
+import api.httpcache as httpcache
+import api.translate.datacite as datacite
+from tests.support.servers import DataCiteServer, getTestDataCiteRecords
+
+
+#
+# Unit test Setup/Helper functions
+#
+
+class FirstPageOnlyServer(DataCiteServer):
+   ''' Lists records 10 to a page, and refuses every listing page after the first. '''
+
+   def getListingPage(self, query):
+      if query.get('page[cursor]', ['1'])[0] != '1':
+         return 400, {'errors': [{'status': '400', 'title': 'Invalid cursor'}]}, {}
+      return super().getListingPage(dict(query, **{'page[size]': ['10']}))
+
+
+#
+# Unit tests
+#
+class Harvest_Test(unittest.TestCase):
+
+   def setUp(self):
+      self.server = DataCiteServer(getTestDataCiteRecords(25)).start()
+      self.baseURL = self.server.url
+      self.session = harvest.getSession(4)
+
+   def tearDown(self):
+      self.session.close()
+      self.server.stop()
+
+   def testGetPrefixRecords_FollowsCursorPages(self):
+      ''' Every record under the prefix should be returned, in listing order, across several pages.
+      '''
+      records = list(harvest.getPrefixRecords(self.session, '10.5065', self.baseURL, pageSize=10))
+      self.assertEqual([r['doi'] for r in records], [r['doi'] for r in self.server.records])
+
+      # Harvested records should be translatable as soon as they arrive.
+      output = datacite.translateDataCiteRecord(records[0], './templates_ISO19139/datacite.xml')
+      self.assertIn('10.5065/test-0000', output)
+
+   def testDataCite2ISO_ReportsFailedListingPage(self):
+      ''' When a listing page of a prefix cannot be fetched, the records already listed should still be translated,
+          and the failed page reported in the summary, with an error exit status rather than a traceback.
+      '''
+      with FirstPageOnlyServer(getTestDataCiteRecords(25)) as server, tempfile.TemporaryDirectory() as outputDir:
+         result = subprocess.run([sys.executable, 'datacite2iso.py', '--prefix', '10.5065', '--outputDir', outputDir,
+                                  '--apiURL', server.url, '--noCache'], stdout=subprocess.DEVNULL,
+                                 stderr=subprocess.PIPE)
+         summary = result.stderr.decode('utf-8')
+         self.assertEqual(result.returncode, 1, summary)
+         self.assertNotIn('Traceback', summary)
+         self.assertTrue(summary.startswith('Translated 10 of 11 records'), summary)
+         self.assertIn('  FAILED prefix 10.5065 listing: HTTPError: 400', summary)
+         self.assertIn('(after 10 records)', summary)
+         self.assertEqual(len(os.listdir(outputDir)), 10)
+
+   def testGetDOIRecords_ReportsMissingDOIs(self):
+      ''' Concurrent fetches should return results in DOI list order, with None for DOIs that do not exist.
+      '''
+      dois = ['10.5065/test-%04d' % index for index in range(20)] + ['10.5065/missing']
+      results = list(harvest.getDOIRecords(self.session, dois, self.baseURL, numWorkers=4))
+
+      self.assertEqual([doi for (doi, record, error) in results], dois)
+      self.assertTrue(all(record['doi'] == doi for (doi, record, error) in results[:-1]))
+      self.assertEqual(results[-1], ('10.5065/missing', None, None))
+
+   def testResponseCache_AvoidsRepeatDownloads(self):
+      ''' Fresh cached responses should need no requests, stale ones should be revalidated, and offline mode
+          should never contact the server.
+      '''
+      dois = ['10.5065/test-%04d' % index for index in range(5)]
+      with tempfile.TemporaryDirectory() as tempDir:
+         cacheFile = os.path.join(tempDir, 'responses.sqlite')
+         cache = httpcache.ResponseCache(cacheFile, ttlSeconds=3600)
+         list(harvest.getDOIRecords(self.session, dois, self.baseURL, numWorkers=2, cache=cache))
+         self.assertEqual(self.server.requestCount, 5)
+
+         # Re-running with fresh cache entries should not hit the network at all.
+         results = list(harvest.getDOIRecords(self.session, dois, self.baseURL, numWorkers=2, cache=cache))
+         self.assertEqual(self.server.requestCount, 5)
+         self.assertEqual([record['doi'] for (doi, record, error) in results], dois)
+
+         # Expired entries are revalidated with their ETag rather than downloaded again.
+         cache.ttlSeconds = 0
+         record = harvest.fetchDataCiteRecord(self.session, dois[0], self.baseURL, cache)
+         self.assertEqual(record['doi'], dois[0])
+         self.assertEqual(self.server.requestCount, 6)
+
+         cache.offline = True
+         with self.assertRaises(httpcache.NotCachedError):
+            harvest.fetchDataCiteRecord(self.session, '10.5065/test-0020', self.baseURL, cache)
+         self.assertEqual(self.server.requestCount, 6)
+         cache.close()
+
+   def testResponseCache_RevalidatesListedRecords(self):
+      ''' Records cached from a prefix listing should keep a Last-Modified validator, so that once they expire they
+          are revalidated with a 304 answer rather than downloaded again.
+      '''
+      with tempfile.TemporaryDirectory() as tempDir:
+         cache = httpcache.ResponseCache(os.path.join(tempDir, 'responses.sqlite'), ttlSeconds=0)
+         list(harvest.getPrefixRecords(self.session, '10.5065', self.baseURL, pageSize=10, cache=cache))
+         entry = cache.get('10.5065/test-0003')
+         self.assertEqual(entry.getValidationHeaders(), {'If-Modified-Since': 'Wed, 01 Jan 2020 00:00:00 GMT'})
+
+         record = harvest.fetchDataCiteRecord(self.session, '10.5065/test-0003', self.baseURL, cache)
+         self.assertEqual(record['doi'], '10.5065/test-0003')
+         # A 200 answer would have replaced the entry with one holding the server's ETag.
+         self.assertIsNone(cache.get('10.5065/test-0003').etag)
+         self.assertGreater(cache.get('10.5065/test-0003').fetchedAt, entry.fetchedAt)
+         cache.close()
+
+   def testResponseCache_EvictsToSizeLimit(self):
+      ''' Writes beyond the size limit should evict the least recently used entries, and the running total of stored
+          bytes should match the table, also when entries are replaced and the cache is reopened.
+      '''
+      with tempfile.TemporaryDirectory() as tempDir:
+         cacheFile = os.path.join(tempDir, 'responses.sqlite')
+         cache = httpcache.ResponseCache(cacheFile, maxBytes=1000)
+         for index in range(30):
+            cache.put('10.5065/test-%04d' % index, b'x' * 100)
+         cache.putMany([('10.5065/test-0029', b'x' * 50, None, None), ('10.5065/test-0030', b'x' * 100, None, None)])
+
+         storedBytes = cache._connection.execute('SELECT SUM(size) FROM responses').fetchone()[0]
+         self.assertEqual(cache._totalBytes, storedBytes)
+         self.assertEqual(storedBytes, 950)
+         self.assertIsNone(cache.get('10.5065/test-0020'))
+         self.assertEqual(cache.get('10.5065/test-0021').body, b'x' * 100)
+         cache.close()
+         self.assertEqual(httpcache.ResponseCache(cacheFile, maxBytes=1000)._totalBytes, 950)
@@ -0,0 +1,75 @@
+#
+#  To run these unit tests: type "./run_tests.sh" at a command prompt.
+#
+
+import unittest
+import io
+import json
+import os
+import tempfile
+
+import api.inputjson as dset_input
+
+
+#
+# Unit test Setup/Helper functions
+#
+
+RECORD_FILE = './defaultInputRecords/test_dset_full.txt'
+
+
+def loadRecordFile(filePath, useOrjson=True, mmapThreshold=dset_input.MMAP_THRESHOLD):
+    ''' Return getJSONFileData() of a file, with or without orjson, and with the given memory-mapping threshold. '''
+    (orjson, threshold) = (dset_input.orjson, dset_input.MMAP_THRESHOLD)
+    dset_input.orjson = orjson if useOrjson else None
+    dset_input.MMAP_THRESHOLD = mmapThreshold
+    try:
+        return dset_input.getJSONFileData(filePath)
+    finally:
+        (dset_input.orjson, dset_input.MMAP_THRESHOLD) = (orjson, threshold)
+
+
+#
+# Unit tests
+#
+class InputJSON_Test(unittest.TestCase):
+
+   def testGetJSONFileData_MatchesJSONModule(self):
+      ''' Files read as bytes, or memory-mapped, and decoded with orjson or the json module, should decode to the
+          records the json module reads from text.
+      '''
+      with open(RECORD_FILE) as recordFile:
+         expected = json.load(recordFile)
+      self.assertEqual(loadRecordFile(RECORD_FILE, useOrjson=False), expected)
+      self.assertEqual(loadRecordFile(RECORD_FILE), expected)
+      self.assertEqual(loadRecordFile(RECORD_FILE, mmapThreshold=1), expected)
+
+      with tempfile.TemporaryDirectory() as tempDir:
+         filePath = os.path.join(tempDir, 'record.txt')
+         with open(filePath, 'wb') as recordFile:
+            recordFile.write(b'{"value": NaN, "count": 123456789012345678901234567890, "title": "Caf\xc3\xa9"}')
+         for useOrjson in (True, False):
+            record = loadRecordFile(filePath, useOrjson, mmapThreshold=1)
+            self.assertEqual((record['count'], record['title']), (123456789012345678901234567890, 'Café'))
+            self.assertNotEqual(record['value'], record['value'])
+
+         with open(filePath, 'wb') as recordFile:
+            recordFile.write(b'{"title": ')
+         for useOrjson in (True, False):
+            with self.assertRaises(json.JSONDecodeError):
+               loadRecordFile(filePath, useOrjson, mmapThreshold=1)
+
+   def testGetJSONLines_DecodesBinaryLines(self):
+      ''' Lines of a binary JSON Lines stream should be yielded as bytes, skipping blank lines, and decode to the
+          same records as lines of a text stream.
+      '''
+      text = '{"metadata_id": "a"}\n\n{"metadata_id": "é"}\n'
+      binaryLines = list(dset_input.getJSONLines(io.BytesIO(text.encode('utf-8'))))
+      textLines = list(dset_input.getJSONLines(io.StringIO(text)))
+      self.assertEqual([lineNumber for (lineNumber, line) in binaryLines], [1, 3])
+      self.assertEqual([dset_input.getJSONData(line) for (lineNumber, line) in binaryLines],
+                       [dset_input.getJSONData(line) for (lineNumber, line) in textLines])
+
+
+if __name__ == '__main__':
+    unittest.main()
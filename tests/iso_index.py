@@ -0,0 +1,79 @@
+#
+#  To run these unit tests: type "./run_tests.sh" at a command prompt.
+#
+
+import unittest
+import copy
+import json
+import os
+import tempfile
+
+import api.translate.dset as dset
+import xpath
+from utils.iso_index import MetadataIndex
+
+
+#
+# Unit test Setup/Helper functions
+#
+
+def writeTestRecords(directory, count):
+    ''' Write ISO records, translated from the DSET test record, that differ only in publisher organization. '''
+    with open('defaultInputRecords/test_dset_full.txt') as recordFile:
+        record = json.load(recordFile)
+    for index in range(count):
+        recordCopy = copy.deepcopy(record)
+        recordCopy['publisher']['organization'] = 'Publisher %d' % index
+        with open(os.path.join(directory, 'record_%02d.xml' % index), 'w') as isoFile:
+            isoFile.write(dset.transformDSETToISO(recordCopy, './templates_ISO19139/dset_full.xml'))
+
+
+#
+# Unit tests
+#
+class MetadataIndex_Test(unittest.TestCase):
+
+   def setUp(self):
+      self.tempDir = tempfile.TemporaryDirectory()
+      self.inputDir = os.path.join(self.tempDir.name, 'records')
+      os.mkdir(self.inputDir)
+      writeTestRecords(self.inputDir, 5)
+      with open(os.path.join(self.inputDir, 'broken.xml'), 'w') as brokenFile:
+         brokenFile.write('<gmd:MD_Metadata>')
+      self.index = MetadataIndex(os.path.join(self.tempDir.name, 'index.sqlite'))
+
+   def tearDown(self):
+      self.index.close()
+      self.tempDir.cleanup()
+
+   def getFiles(self):
+      return sorted(os.path.join(self.inputDir, name) for name in os.listdir(self.inputDir))
+
+   def testUpdateIndex_ParsesOnlyChangedFiles(self):
+      ''' Indexed fields should match freshly extracted ones, and only new or modified files should be parsed again.
+      '''
+      self.assertEqual(xpath.update_index(self.index, self.inputDir, self.getFiles()), (6, 0))
+      self.assertEqual(xpath.update_index(self.index, self.inputDir, self.getFiles()), (0, 0))
+
+      scanned = list(xpath.scan_files(self.getFiles()))
+      indexed = list(xpath.get_indexed_records(self.index, self.inputDir))
+      self.assertEqual([fields for (file, fields, error) in indexed], [fields for (file, fields, error) in scanned])
+      self.assertIsNone(indexed[0][1])
+      self.assertIn('XMLSyntaxError', indexed[0][2])
+
+      # Rewrite one record with different content, and delete another.
+      os.remove(os.path.join(self.inputDir, 'record_04.xml'))
+      with open(os.path.join(self.inputDir, 'record_00.xml'), 'r+') as isoFile:
+         isoText = isoFile.read().replace('Publisher 0', 'Publisher Zero')
+         isoFile.seek(0)
+         isoFile.write(isoText)
+         isoFile.truncate()
+      self.assertEqual(xpath.update_index(self.index, self.inputDir, self.getFiles()), (1, 1))
+
+      publishers = [xpath.get_publisher_rows(file, fields)[0] for (file, fields, error) in
+                    xpath.get_indexed_records(self.index, self.inputDir)]
+      self.assertEqual(publishers, [[], ['Publisher Zero'], ['Publisher 1'], ['Publisher 2'], ['Publisher 3']])
+
+
+if __name__ == '__main__':
+    unittest.main()
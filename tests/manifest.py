@@ -0,0 +1,125 @@
+#
+#  To run these unit tests: type "./run_tests.sh" at a command prompt.
+#
+
+import unittest
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import api.manifest as manifest
+
+
+#
+# Unit test Setup/Helper functions
+#
+
+def writeRecordFiles(inputDir, names):
+    ''' Write a DSET record file for each name, with the name as its metadata_id. '''
+    with open('./defaultInputRecords/test_dset_full.txt') as recordFile:
+        record = json.load(recordFile)
+    record['metadata_date'] = '2020-01-01T00:00:00'
+    for name in names:
+        with open(os.path.join(inputDir, name + '.txt'), 'w') as inputFile:
+            json.dump(dict(record, metadata_id=name), inputFile)
+
+
+def runBatch(inputDir, outputDir, *options):
+    ''' Run a dset2iso.py batch translation; return the summary lines it printed. '''
+    result = subprocess.run([sys.executable, 'dset2iso.py', '--inputDir', inputDir, '--outputDir', outputDir]
+                            + list(options), stdout=subprocess.PIPE, check=True)
+    return [line for line in result.stdout.decode('utf-8').splitlines() if line.startswith(('Translated', 'Skipped'))]
+
+
+#
+# Unit tests
+#
+class Manifest_Test(unittest.TestCase):
+
+   def setUp(self):
+      self.tempDir = tempfile.TemporaryDirectory()
+      self.inputDir = os.path.join(self.tempDir.name, 'input')
+      self.outputDir = os.path.join(self.tempDir.name, 'output')
+      os.makedirs(self.inputDir)
+      os.makedirs(self.outputDir)
+
+   def tearDown(self):
+      self.tempDir.cleanup()
+
+   def plan(self, entries, templateHash='template', toolVersion='1', force=False):
+      ''' Return planIncrementalRun() for the input folder, with changed files and removed keys by name. '''
+      inputFiles = sorted(os.path.join(self.inputDir, name) for name in os.listdir(self.inputDir))
+      (changed, unchanged, removed) = manifest.planIncrementalRun(entries, inputFiles, self.inputDir, self.outputDir,
+                                                                  templateHash, toolVersion, force)
+      return sorted(os.path.basename(inputFile) for (inputFile, fileState) in changed), sorted(removed)
+
+   def makeManifest(self, templateHash='template', toolVersion='1'):
+      ''' Return a manifest recording a translation of every input file, and create the output files. '''
+      entries = {}
+      for name in os.listdir(self.inputDir):
+         outputFile = os.path.join(self.outputDir, name.replace('.txt', '.xml'))
+         with open(outputFile, 'w') as isoFile:
+            isoFile.write('<record/>')
+         fileState = manifest.getFileState(os.path.join(self.inputDir, name))
+         entries[name] = manifest.makeEntry(fileState, templateHash, toolVersion, outputFile, self.outputDir)
+      return entries
+
+   def testPlanIncrementalRun_SkipsOnlyUnchangedRecords(self):
+      ''' Records should be translated again when their contents, the template or the tool version change, or their
+          output is missing; removed inputs should be reported, also with force, which translates every record.
+      '''
+      writeRecordFiles(self.inputDir, ['a', 'b', 'c', 'd'])
+      entries = self.makeManifest()
+      self.assertEqual(self.plan(entries), ([], []))
+
+      writeRecordFiles(self.inputDir, ['a'])
+      os.utime(os.path.join(self.inputDir, 'b.txt'), ns=(0, 0))
+      with open(os.path.join(self.inputDir, 'c.txt'), 'a') as inputFile:
+         inputFile.write(' ')
+      os.remove(os.path.join(self.outputDir, 'd.xml'))
+      self.assertEqual(self.plan(entries), (['c.txt', 'd.txt'], []))
+      self.assertEqual(entries['b.txt']['mtime'], 0)
+
+      os.remove(os.path.join(self.inputDir, 'a.txt'))
+      self.assertEqual(self.plan(entries), (['c.txt', 'd.txt'], ['a.txt']))
+      self.assertEqual(self.plan(entries, templateHash='edited'), (['b.txt', 'c.txt', 'd.txt'], ['a.txt']))
+      self.assertEqual(self.plan(entries, toolVersion='2'), (['b.txt', 'c.txt', 'd.txt'], ['a.txt']))
+      self.assertEqual(self.plan(entries, force=True), (['b.txt', 'c.txt', 'd.txt'], ['a.txt']))
+
+   def testGetFileState_StatusPrecedesHash(self):
+      ''' A file edited after it was planned and hashed, while its record is translated, should not match its new
+          entry's size and modification time, so the next run hashes it again rather than skipping it.
+      '''
+      writeRecordFiles(self.inputDir, ['a'])
+      inputFile = os.path.join(self.inputDir, 'a.txt')
+      (changed, unchanged, removed) = manifest.planIncrementalRun({}, [inputFile], self.inputDir, self.outputDir,
+                                                                  'template', '1')
+      with open(inputFile, 'a') as editedFile:
+         editedFile.write(' ')
+      outputFile = os.path.join(self.outputDir, 'a.xml')
+      with open(outputFile, 'w') as isoFile:
+         isoFile.write('<record/>')
+      entries = {'a.txt': manifest.makeEntry(changed[0][1], 'template', '1', outputFile, self.outputDir)}
+      self.assertEqual(self.plan(entries), (['a.txt'], []))
+
+   def testDSET2ISO_ForceStillRemovesDeletedOutputs(self):
+      ''' A second batch run should skip every record, and a --force run should translate every record again while
+          removing the outputs of deleted input files and keeping the manifest of the rest.
+      '''
+      writeRecordFiles(self.inputDir, ['a', 'b', 'c'])
+      self.assertTrue(runBatch(self.inputDir, self.outputDir)[0].startswith('Translated 3 of 3 records'))
+      self.assertEqual(runBatch(self.inputDir, self.outputDir)[1],
+                       'Skipped 3 unchanged records; removed 0 outputs of deleted input files.')
+
+      os.remove(os.path.join(self.inputDir, 'b.txt'))
+      summary = runBatch(self.inputDir, self.outputDir, '--force')
+      self.assertTrue(summary[0].startswith('Translated 2 of 2 records'))
+      self.assertEqual(summary[1], 'Skipped 0 unchanged records; removed 1 outputs of deleted input files.')
+      self.assertEqual(sorted(os.listdir(self.outputDir)), ['.dset2iso_manifest.json', 'a.xml', 'c.xml'])
+      self.assertEqual(sorted(manifest.loadManifest(self.outputDir)), ['a.txt', 'c.txt'])
+
+
+if __name__ == '__main__':
+    unittest.main()
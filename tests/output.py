@@ -0,0 +1,167 @@
+#
+#  To run these unit tests: type "./run_tests.sh" at a command prompt.
+#
+
+import unittest
+import io
+import json
+import os
+import tarfile
+import tempfile
+import zipfile
+from unittest import mock
+
+import api.batch as batch
+import api.output as output
+
+
+#
+# Unit test Setup/Helper functions
+#
+
+class UnseekableStream(io.RawIOBase):
+    ''' A write-only binary stream that cannot seek, like STDOUT connected to a pipe. '''
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.buffer.extend(data)
+        return len(data)
+
+
+#
+# Unit tests
+#
+class Output_Test(unittest.TestCase):
+
+   def testJSONLinesWriter_WritesOneRecordPerLine(self):
+      ''' Each ISO record should be written as a single JSON line, even if the XML text contains newlines.
+      '''
+      stream = io.BytesIO()
+      writer = output.getStreamWriter('jsonl', stream)
+      writer.write('record_1', '<a>\n</a>\n')
+      writer.write('record_2', '<b/>\n')
+      writer.close()
+
+      lines = stream.getvalue().decode('utf-8').splitlines()
+      self.assertEqual(len(lines), 2)
+      self.assertEqual(json.loads(lines[0]), {'metadata_id': 'record_1', 'iso': '<a>\n</a>\n'})
+
+   def testTarWriter_WritesToUnseekableStream(self):
+      ''' Tar output should work on a pipe, with archive member names derived from the record identifiers.
+      '''
+      stream = UnseekableStream()
+      writer = output.getStreamWriter('tar', stream)
+      writer.write('edu.ucar::ds/1', '<a/>\n')
+      writer.close()
+
+      archive = tarfile.open(fileobj=io.BytesIO(bytes(stream.buffer)))
+      self.assertEqual(archive.getnames(), ['edu.ucar__ds_1.xml'])
+      self.assertEqual(archive.extractfile('edu.ucar__ds_1.xml').read(), b'<a/>\n')
+
+   def testArchiveWriters_SuffixRepeatedMemberNames(self):
+      ''' Repeated record identifiers, and identifiers made safe to the same name, should be written as separate
+          archive members, with a numeric suffix after the first.
+      '''
+      for outputFormat in ('tar', 'zip'):
+         stream = io.BytesIO()
+         writer = output.getStreamWriter(outputFormat, stream)
+         for (recordID, isoText) in [('a/b', '<a/>'), ('a_b', '<b/>'), ('a/b', '<c/>'), ('a_b_2', '<d/>')]:
+            writer.write(recordID, isoText)
+         writer.close()
+
+         stream.seek(0)
+         if outputFormat == 'tar':
+            archive = tarfile.open(fileobj=stream)
+            members = {name: archive.extractfile(name).read() for name in archive.getnames()}
+         else:
+            archive = zipfile.ZipFile(stream)
+            members = {name: archive.read(name) for name in archive.namelist()}
+         self.assertEqual(members, {'a_b.xml': b'<a/>', 'a_b_2.xml': b'<b/>', 'a_b_3.xml': b'<c/>',
+                                    'a_b_2_2.xml': b'<d/>'})
+
+   def testWriteFiles_WritesAtomicallyInOrder(self):
+      ''' Written files should replace existing files without leaving temporary files, each folder should be created
+          once, and failed translations and writes should be reported in input order, on threads or without.
+      '''
+      for numThreads in (0, 3):
+         with tempfile.TemporaryDirectory() as tempDir:
+            blockedFolder = os.path.join(tempDir, 'blocked')
+            with open(blockedFolder, 'w') as blockingFile:
+               blockingFile.write('a file where a folder should be')
+            translations = [(str(index), os.path.join(tempDir, 'out', str(index % 3), '%d.xml' % index),
+                             b'<record>%d</record>' % index, None) for index in range(20)]
+            translations[5] = ('5', None, None, 'ValueError: bad record')
+            translations[8] = ('8', os.path.join(blockedFolder, '8.xml'), b'<record/>', None)
+            os.makedirs(os.path.join(tempDir, 'out', '0'))
+            with open(translations[0][1], 'wb') as previousFile:
+               previousFile.write(b'<previous/>')
+
+            output.createdFolders.clear()
+            with mock.patch('os.makedirs', wraps=os.makedirs) as makedirs:
+               results = list(output.writeFiles(iter(translations), numThreads))
+            self.assertEqual(makedirs.call_count, 4)
+
+            self.assertEqual([inputFile for (inputFile, outputFile, errorMessage) in results],
+                             [str(index) for index in range(20)])
+            self.assertEqual(results[5], ('5', None, 'ValueError: bad record'))
+            self.assertEqual(results[8][:2], ('8', None))
+            self.assertTrue(results[8][2].startswith(('FileExistsError', 'NotADirectoryError')))
+            for (inputFile, outputFile, isoBytes, errorMessage) in translations:
+               if inputFile not in ('5', '8'):
+                  with open(outputFile, 'rb') as isoFile:
+                     self.assertEqual(isoFile.read(), isoBytes)
+            fileNames = [name for (folder, folders, names) in os.walk(tempDir) for name in names]
+            self.assertEqual([name for name in fileNames if name.endswith('.tmp')], [])
+
+   def testWriteFileAtomically_KeepsPreviousFileOnFailure(self):
+      ''' A write that fails part way should leave the previous file in place, and no temporary file.
+      '''
+      with tempfile.TemporaryDirectory() as tempDir:
+         outputFile = os.path.join(tempDir, 'record.xml')
+         output.writeFileAtomically(outputFile, b'<previous/>')
+         with self.assertRaises(TypeError):
+            output.writeFileAtomically(outputFile, '<not bytes/>')
+         with open(outputFile, 'rb') as isoFile:
+            self.assertEqual(isoFile.read(), b'<previous/>')
+         self.assertEqual(os.listdir(tempDir), ['record.xml'])
+
+   def testTranslateFiles_WritesOnWriterThreads(self):
+      ''' Batch translation with writer threads, in this process or in worker processes, should write the same
+          files as batch translation without them.
+      '''
+      with tempfile.TemporaryDirectory() as tempDir:
+         inputDir = os.path.join(tempDir, 'input')
+         os.makedirs(os.path.join(inputDir, 'sub'))
+         with open('./defaultInputRecords/test_dset_full.txt') as recordFile:
+            record = json.load(recordFile)
+         record['metadata_date'] = '2020-01-01T00:00:00'
+         inputFiles = []
+         for index in range(6):
+            inputFiles.append(os.path.join(inputDir, 'sub' if index % 2 else '', 'record_%d.txt' % index))
+            with open(inputFiles[-1], 'w') as inputFile:
+               json.dump(dict(record, metadata_id='record_%d' % index), inputFile)
+         with open(inputFiles[3], 'w') as inputFile:
+            inputFile.write('{"title": ')
+
+         outputs = []
+         for (numWorkers, writerThreads) in ((1, 0), (1, 2), (2, 2)):
+            outputDir = os.path.join(tempDir, 'output_%d_%d' % (numWorkers, writerThreads))
+            results = list(batch.translateFiles(inputFiles, inputDir, outputDir, './templates_ISO19139/dset_full.xml',
+                                                numWorkers, writerThreads=writerThreads))
+            self.assertEqual([errorMessage is None for (inputFile, outputFile, errorMessage) in results],
+                             [True, True, True, False, True, True])
+            contents = {}
+            for (inputFile, outputFile, errorMessage) in results:
+               if outputFile:
+                  with open(outputFile, 'rb') as isoFile:
+                     contents[os.path.relpath(outputFile, outputDir)] = isoFile.read()
+            outputs.append(contents)
+         self.assertEqual(sorted(outputs[0]), ['record_0.xml', 'record_2.xml', 'record_4.xml',
+                                               'sub/record_1.xml', 'sub/record_5.xml'])
+         self.assertEqual(outputs[1], outputs[0])
+         self.assertEqual(outputs[2], outputs[0])
@@ -0,0 +1,81 @@
+#
+#  To run these unit tests: type "./run_tests.sh" at a command prompt.
+#
+
+import unittest
+import json
+import os
+import shutil
+import tempfile
+
+import api.batch as dset_batch
+import api.translate.dset as dset
+import api.util.profile as dset_profile
+import api.util.xml as xml
+
+
+TEMPLATE_PATH = './templates_ISO19139/dset_full.xml'
+
+
+#
+# Unit tests
+#
+class Profile_Test(unittest.TestCase):
+
+   def setUp(self):
+      dset_profile.profile.reset()
+
+   def tearDown(self):
+      dset_profile.disable()
+      dset_profile.profile.reset()
+
+   def testEnable_CountsCallsAndRestoresFunctions(self):
+      ''' Profiled functions should be counted only while profiling is enabled.
+      '''
+      originalGetElements = xml.getElements
+      with open('defaultInputRecords/test_dset_full.txt') as recordFile:
+         recordText = recordFile.read()
+      dset.getTemplateAnchors(TEMPLATE_PATH)
+
+      dset_profile.enable()
+      self.assertIsNot(xml.getElements, originalGetElements)
+      for count in range(2):
+         dset.transformDSETToISO(json.loads(recordText), TEMPLATE_PATH)
+      dset_profile.disable()
+      self.assertIs(xml.getElements, originalGetElements)
+
+      counters = dset_profile.profile.getCounters()
+      self.assertEqual(counters['dset.transformRequiredFields'][0], 2)
+      self.assertEqual(counters['xml.toString'][0], 2)
+      self.assertGreater(counters['xml.getElements'][0], 100)
+      self.assertIn('iso_translation_calls_total{function="xml.toString"} 2\n',
+                    dset_profile.profile.formatPrometheus())
+
+      # Calls made while profiling is disabled are not counted.
+      xml.getTemplateTree(TEMPLATE_PATH)
+      self.assertEqual(dset_profile.profile.getCounters(), counters)
+
+   def testTranslateFiles_MergesWorkerCounters(self):
+      ''' Counters collected in worker processes should be added to the parent process's profile.
+      '''
+      with tempfile.TemporaryDirectory() as tempDir:
+         inputDir = os.path.join(tempDir, 'input')
+         outputDir = os.path.join(tempDir, 'output')
+         os.mkdir(inputDir)
+         os.mkdir(outputDir)
+         inputFiles = []
+         for index in range(6):
+            inputFiles.append(os.path.join(inputDir, 'record_%d.txt' % index))
+            shutil.copy('defaultInputRecords/test_dset_full.txt', inputFiles[-1])
+
+         dset_profile.enable()
+         results = list(dset_batch.translateFiles(inputFiles, inputDir, outputDir, TEMPLATE_PATH, numWorkers=2,
+                                                  profiling=True))
+      self.assertEqual([errorMessage for (inputFile, outputFile, errorMessage) in results], [None] * 6)
+      counters = dset_profile.profile.getCounters()
+      self.assertEqual(counters['dset.transformDSETToISOBytes'][0], 6)
+      self.assertEqual(counters['xml.toUTF8'][0], 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+#
+#  To run these unit tests: type "./run_tests.sh" at a command prompt.
+#
+
+import unittest
+import os
+import subprocess
+import sys
+import tempfile
+
+import xpath
+from tests.iso_index import writeTestRecords
+from tests.support.servers import getTestISORecord
+
+
+#
+# Unit test Setup/Helper functions
+#
+
+def runReports(inputDir, outputDir, reportTypes, *options):
+    ''' Run xpath.py over a folder, writing reports to outputDir; return {report file name: contents}. '''
+    os.makedirs(outputDir)
+    subprocess.run([sys.executable, 'xpath.py', '--inputDir', inputDir, '--outputDir', outputDir, '--type']
+                   + list(reportTypes) + list(options), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                   check=True)
+    reports = {}
+    for name in os.listdir(outputDir):
+        with open(os.path.join(outputDir, name)) as reportFile:
+            reports[name] = reportFile.read()
+    return reports
+
+
+#
+# Unit tests
+#
+class Reports_Test(unittest.TestCase):
+
+   def setUp(self):
+      self.tempDir = tempfile.TemporaryDirectory()
+      self.inputDir = os.path.join(self.tempDir.name, 'records')
+      os.mkdir(self.inputDir)
+      writeTestRecords(self.inputDir, 4)
+      with open(os.path.join(self.inputDir, 'test_dset_full.xml'), 'wb') as isoFile:
+         isoFile.write(getTestISORecord())
+      with open(os.path.join(self.inputDir, 'broken.xml'), 'w') as brokenFile:
+         brokenFile.write('<gmd:MD_Metadata>')
+
+   def tearDown(self):
+      self.tempDir.cleanup()
+
+   def testXPath_SinglePassMatchesSeparateReports(self):
+      ''' Every report written by a single pass over the files should be identical to the report written by a run
+          for that report type alone, with or without --datasetsOnly.
+      '''
+      for options in ([], ['--datasetsOnly']):
+         outputDir = os.path.join(self.tempDir.name, 'all' + ''.join(options))
+         combined = runReports(self.inputDir, outputDir, ['all'], *options)
+         self.assertEqual(len(combined), len(xpath.REPORTS))
+         for reportType in xpath.REPORTS:
+            separate = runReports(self.inputDir, os.path.join(outputDir + '_single', reportType), [reportType],
+                                  *options)
+            self.assertEqual(len(separate), 1)
+            for (name, contents) in separate.items():
+               self.assertEqual(combined[name], contents, name)
+         self.assertIn('Publisher 3', combined['records_publisher.txt'])
+         self.assertIn('not_a_iso_record', combined['records_geoExtent.txt'])
+
+   def testXPath_JobsMatchSerialReports(self):
+      ''' Reports written while worker processes parse the files should be identical to the reports of a serial run.
+      '''
+      serial = runReports(self.inputDir, os.path.join(self.tempDir.name, 'serial'), ['all'])
+      parallel = runReports(self.inputDir, os.path.join(self.tempDir.name, 'jobs'), ['all'], '--jobs', '2')
+      self.assertEqual(len(serial), len(xpath.REPORTS))
+      self.assertEqual(parallel, serial)
+
+
+if __name__ == '__main__':
+    unittest.main()
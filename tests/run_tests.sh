@@ -1,19 +1,22 @@
 #/bin/bash
 
 #
-# Runs nosetests on all test files in the current directory if possible.
+# Runs nosetests on all test files in this directory if possible.
 # If nosetests is not available, it runs a subsitute set of commands in place of nosetests.
 #
+# Tests are run from the top-level folder, where the templates and default records they read are found, and each
+# test file is run as a module of the tests package, so that tests/xml.py does not hide the standard xml package.
+#
 
 
 function NosetestSubstitute {
     
-    testFiles='xml.py iso19139.py'
+    testFiles='xml.py iso19139.py output.py harvest.py zenodo_upload.py iso_index.py profile.py servers.py csw.py service.py startup.py inputjson.py batch.py manifest.py reports.py'
 
     for f in $testFiles; do
         echo 
-        echo Running "python $f":
-        python $f
+        echo Running "python -m unittest tests.${f%.py}":
+        python -m unittest tests.${f%.py}
         if [ $? != 0 ]; then
            echo ""
            echo "Errors found in $f; halting."
@@ -33,12 +36,14 @@ function NosetestSubstitute {
 
 #COVER_MIN_PERCENTAGE=100
 COVER_MIN_PERCENTAGE=0
-COVER_PACKAGES="api.util.xml,api.util.iso19139"
+COVER_PACKAGES="api.util.xml,api.util.iso19139,api.output,api.harvest,api.httpcache,api.zenodo_upload,api.util.profile,api.csw,api.service,api.inputjson,api.batch,api.manifest"
+
+cd "$(dirname "$0")/.."
 
 which nosetests
 
 if [ $? == 0 ]; then
-   nosetests --nocapture --with-coverage --cover-package=$COVER_PACKAGES --cover-min-percentage=$COVER_MIN_PERCENTAGE *.py
+   nosetests --nocapture --with-coverage --cover-package=$COVER_PACKAGES --cover-min-percentage=$COVER_MIN_PERCENTAGE tests/*.py
 else
    NosetestSubstitute
 fi 
@@ -0,0 +1,114 @@
+#
+#  To run these unit tests: type "./run_tests.sh" at a command prompt.
+#
+
+import unittest
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from lxml import etree as ElementTree
+
+import api.zenodo_upload as zenodo_upload
+from tests.support.servers import CSWServer, DataCiteServer, ZenodoServer, getTestDataCiteRecords, getTestISORecord, \
+                                  CSW_NAMESPACES
+
+
+#
+# Unit test Setup/Helper functions
+#
+
+def getInsertTransaction(recordIDs):
+    ''' Return a csw:Transaction inserting a copy of the DSET test record for each record ID. '''
+    transaction = ElementTree.Element('{%s}Transaction' % CSW_NAMESPACES['csw'], service='CSW', version='2.0.2')
+    insert = ElementTree.SubElement(transaction, '{%s}Insert' % CSW_NAMESPACES['csw'])
+    for recordID in recordIDs:
+        record = ElementTree.fromstring(getTestISORecord())
+        record.find('gmd:fileIdentifier/gco:CharacterString', namespaces=CSW_NAMESPACES).text = recordID
+        insert.append(record)
+    return ElementTree.tostring(transaction)
+
+
+#
+# Unit tests
+#
+class StandInServers_Test(unittest.TestCase):
+
+   def setUp(self):
+      self.session = zenodo_upload.get_session(4)
+
+   def tearDown(self):
+      self.session.close()
+
+   def testStandInServer_InjectsLatencyErrorsAndRateLimits(self):
+      ''' Listed failures should be answered first, requests beyond the rate limit should get 429, and every
+          response should be delayed by the configured latency.
+      '''
+      with DataCiteServer(getTestDataCiteRecords(3), latency=0.05, rateLimit=4) as server:
+         server.failures = {'/dois/10.5065/test-0001': 2}
+         start = time.perf_counter()
+         statuses = [self.session.get(server.url + '/dois/10.5065/test-0001').status_code for count in range(5)]
+         self.assertGreaterEqual(time.perf_counter() - start, 5 * 0.05)
+         self.assertEqual(statuses, [503, 503, 200, 200, 429])
+         self.assertEqual(server.requestCount, 5)
+
+      with DataCiteServer(getTestDataCiteRecords(1), errorRate=0.5, seed=1) as server:
+         statuses = [self.session.get(server.url + '/dois/10.5065/test-0000').status_code for count in range(40)]
+         self.assertEqual(set(statuses), {200, 503})
+         self.assertLess(abs(statuses.count(503) - 20), 10)
+
+   def testZenodoServer_CreatesUploadsAndPublishes(self):
+      ''' A deposition should be created with a bucket that accepts uploads, and published, given the access token.
+      '''
+      with ZenodoServer(accessToken='secret') as server, tempfile.TemporaryDirectory() as tempDir:
+         depositionsURL = server.apiURL + '/deposit/depositions'
+         self.assertEqual(self.session.post(depositionsURL, json={}).status_code, 401)
+         params = {'access_token': 'secret'}
+         response = self.session.post(depositionsURL, params=params, json={})
+         self.assertEqual(response.status_code, 201)
+         deposition = response.json()
+
+         filePath = os.path.join(tempDir, 'data.bin')
+         with open(filePath, 'wb') as dataFile:
+            dataFile.write(os.urandom(5000))
+         result = zenodo_upload.upload_file(self.session, deposition['links']['bucket'], 'data.bin', filePath, params)
+         self.assertEqual(result['checksum'], zenodo_upload.get_md5_checksum(filePath))
+
+         depositionURL = '%s/%d' % (depositionsURL, deposition['id'])
+         self.assertEqual(zenodo_upload.get_deposition_checksums(self.session, depositionURL, params),
+                          {'data.bin': result['checksum']})
+         response = self.session.post(depositionURL + '/actions/publish', params=params)
+         self.assertEqual(response.json()['doi'], '10.5281/zenodo.1')
+
+   def testCSWServer_DeletesPushedRecords(self):
+      ''' Inserted records should be kept by identifier, and deletePushedCSWRecords.py should delete records from
+          the server given by --baseURL.
+      '''
+      with CSWServer() as server, tempfile.TemporaryDirectory() as tempDir:
+         response = self.session.post(server.url + '/geonetwork/srv/eng/csw-publication',
+                                      data=getInsertTransaction(['record-1', 'record-2', 'record-3']))
+         totals = ElementTree.fromstring(response.content).find('csw:TransactionSummary', namespaces=CSW_NAMESPACES)
+         self.assertEqual(totals.findtext('csw:totalInserted', namespaces=CSW_NAMESPACES), '3')
+         self.assertEqual(sorted(server.records), ['record-1', 'record-2', 'record-3'])
+
+         idFile = os.path.join(tempDir, 'pushedRecordIDs.txt')
+         with open(idFile, 'w') as idText:
+            idText.write('record-1\nrecord-3\n')
+         subprocess.run([sys.executable, '-m', 'utils.deletePushedCSWRecords', '--idFile', idFile,
+                         '--baseURL', server.url], check=True, capture_output=True)
+         self.assertEqual(list(server.records), ['record-2'])
+         self.assertEqual(server.transactionCount, 2)
+
+   def testDataCite2ISO_UsesAPIURL(self):
+      ''' datacite2iso.py should harvest and translate every record under a prefix from the server given by --apiURL.
+      '''
+      with DataCiteServer(getTestDataCiteRecords(12)) as server, tempfile.TemporaryDirectory() as tempDir:
+         subprocess.run([sys.executable, 'datacite2iso.py', '--prefix', '10.5065', '--outputDir', tempDir,
+                         '--apiURL', server.url, '--noCache'], check=True, capture_output=True)
+         self.assertEqual(len(os.listdir(tempDir)), 12)
+
+
+if __name__ == '__main__':
+    unittest.main()
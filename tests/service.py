@@ -0,0 +1,172 @@
+#
+#  To run these unit tests: type "./run_tests.sh" at a command prompt.
+#
+
+import unittest
+import asyncio
+import json
+import os
+import re
+import signal
+import threading
+import time
+from unittest import mock
+
+import requests
+
+import api.inputjson as dset_input
+import api.translate.dset as dset_translate
+import api.translate.datacite as datacite_translate
+import api.service as service_module
+from api.service import TranslationService
+
+
+#
+# Unit test Setup/Helper functions
+#
+
+class ServiceThread:
+   ''' Runs a TranslationService on a free local port, in a thread with its own event loop. '''
+
+   def __init__(self, **options):
+      self.service = TranslationService(**options)
+      self.loop = asyncio.new_event_loop()
+      self.server = self.loop.run_until_complete(self.service.start(port=0))
+      self.url = 'http://127.0.0.1:%d' % self.server.sockets[0].getsockname()[1]
+      self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+
+   def __enter__(self):
+      self.thread.start()
+      return self
+
+   def __exit__(self, *exception):
+      asyncio.run_coroutine_threadsafe(self.service.stop(self.server), self.loop).result()
+      self.loop.call_soon_threadsafe(self.loop.stop)
+      self.thread.join()
+      self.loop.close()
+      self.service.close()
+
+
+def readRecordText(filePath):
+    with open(filePath, 'rb') as recordFile:
+        return recordFile.read()
+
+
+def maskDateStamp(recordXML):
+    ''' DataCite translations are stamped with the current time; mask it, so translations can be compared. '''
+    return re.sub(r'(<gmd:dateStamp>\s*<gco:DateTime>)[^<]*', r'\1', recordXML)
+
+
+#
+# Unit tests
+#
+class TranslationService_Test(unittest.TestCase):
+
+   def setUp(self):
+      self.session = requests.Session()
+      record = json.loads(readRecordText('./defaultInputRecords/test_dset_full.txt'))
+      record['metadata_date'] = '2020-01-01T00:00:00'
+      self.dsetText = json.dumps(record).encode('utf-8')
+      self.dataciteText = readRecordText('./defaultInputRecords/test_datacite_full.json')
+
+   def tearDown(self):
+      self.session.close()
+
+   def testService_TranslatesLikeTheLibrary(self):
+      ''' DSET and DataCite records POSTed to the service, translated in the service process or in worker processes,
+          should come back as the translation functions' output.
+      '''
+      expectedDSET = dset_translate.transformDSETToISOBytes(dset_input.getJSONData(self.dsetText),
+                                                             './templates_ISO19139/dset_full.xml')
+      expectedDataCite = datacite_translate.translateDataCiteRecord(dset_input.getJSONData(self.dataciteText),
+                                                                    './templates_ISO19139/datacite.xml')
+      for numWorkers in (0, 1):
+         with ServiceThread(numWorkers=numWorkers) as service:
+            for count in range(2):
+               response = self.session.post(service.url + '/dset', data=self.dsetText)
+               self.assertEqual(response.status_code, 200)
+               self.assertEqual(response.headers['Content-Type'], 'application/xml; charset=utf-8')
+               self.assertEqual(response.content, expectedDSET)
+            response = self.session.post(service.url + '/datacite?template=datacite.xml', data=self.dataciteText)
+            self.assertEqual(maskDateStamp(response.text), maskDateStamp(expectedDataCite))
+
+            health = self.session.get(service.url + '/health').json()
+            self.assertEqual(health['responses'], {'200': 3})
+            self.assertEqual(health['workers'], numWorkers)
+
+   def testService_AnswersBadRequestsWithErrors(self):
+      ''' Invalid JSON, unknown templates and endpoints, records that fail to translate, and requests beyond the
+          pending limit should each be answered with an error status, on a connection that stays usable.
+      '''
+      with ServiceThread(maxPending=2) as service:
+         statuses = [self.session.post(service.url + '/dset', data=b'{"title": ').status_code,
+                     self.session.post(service.url + '/dset?template=../README.md', data=self.dsetText).status_code,
+                     self.session.post(service.url + '/dset?template=missing.xml', data=self.dsetText).status_code,
+                     self.session.post(service.url + '/iso', data=self.dsetText).status_code,
+                     self.session.get(service.url + '/dset').status_code,
+                     self.session.post(service.url + '/datacite', data=b'["not", "a", "record"]').status_code]
+         self.assertEqual(statuses, [400, 400, 400, 404, 405, 422])
+
+         service.service.pending = 2
+         response = self.session.post(service.url + '/dset', data=self.dsetText)
+         self.assertEqual(response.status_code, 503)
+         self.assertEqual(response.headers['Retry-After'], '1')
+         service.service.pending = 0
+         self.assertEqual(self.session.post(service.url + '/dset', data=self.dsetText).status_code, 200)
+
+         health = json.loads(self.session.get(service.url + '/health').content)
+         self.assertEqual(health['responses'], {'200': 1, '400': 3, '404': 1, '405': 1, '422': 1, '503': 1})
+
+   def testService_TranslatesOffTheEventLoopWithoutWorkers(self):
+      ''' Without worker processes, a translation in progress should not keep the service from answering other
+          requests.
+      '''
+      started = threading.Event()
+      release = threading.Event()
+      translateRecord = service_module.translateRecord
+
+      def slowTranslateRecord(*arguments):
+         started.set()
+         release.wait(10)
+         return translateRecord(*arguments)
+
+      with mock.patch.object(service_module, 'translateRecord', slowTranslateRecord), \
+           ServiceThread(numWorkers=0) as service:
+         responses = []
+         request = threading.Thread(target=lambda: responses.append(requests.post(service.url + '/dset',
+                                                                                  data=self.dsetText)))
+         request.start()
+         self.assertTrue(started.wait(10))
+         try:
+            health = requests.get(service.url + '/health', timeout=5).json()
+         finally:
+            release.set()
+            request.join()
+         self.assertEqual(health['pending'], 1)
+         self.assertEqual(responses[0].status_code, 200)
+
+   def testService_ReplacesBrokenWorkerPool(self):
+      ''' When a worker process dies, the request it was running fails, and later requests should be translated
+          by a new pool of workers rather than all fail.
+      '''
+      with ServiceThread(numWorkers=1) as service:
+         self.assertEqual(self.session.post(service.url + '/dset', data=self.dsetText).status_code, 200)
+         executor = service.service.executor
+         for process in list(executor._processes.values()):
+            os.kill(process.pid, signal.SIGKILL)
+            process.join()
+         deadline = time.monotonic() + 10
+         while not executor._broken and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+         response = self.session.post(service.url + '/dset', data=self.dsetText)
+         self.assertEqual(response.status_code, 500)
+         self.assertIn(b'BrokenProcessPool', response.content)
+         statuses = [self.session.post(service.url + '/dset', data=self.dsetText).status_code for index in range(3)]
+         self.assertEqual(statuses, [200] * 3)
+         self.assertIsNot(service.service.executor, executor)
+         self.assertEqual(self.session.get(service.url + '/health').json()['poolRestarts'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
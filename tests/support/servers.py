@@ -0,0 +1,440 @@
+#
+#  Local stand-ins for the web services the command line programs talk to: the DataCite REST API (/dois), the
+#  Zenodo deposition and bucket API, and a CSW-T (catalogue transaction) endpoint like GeoNetwork's
+#  csw-publication service.
+#
+#  Each server keeps its state in memory and answers from a background thread on a local port.  Any server can be
+#  slowed down (latency), made unreliable (errorRate, failures) or rate limited (rateLimit), so that clients can be
+#  tested, and their throughput, retries and concurrency benchmarked, without a network connection.
+#
+#  In unit tests:
+#
+#      with DataCiteServer(records) as server:
+#          records = harvest.getPrefixRecords(session, '10.5065', server.url)
+#
+#  From the command line, for load tests of the programs themselves:
+#
+#      python -m tests.support.servers datacite --records 10000 --latency 0.05 --port 8001
+#      python datacite2iso.py --prefix 10.5065 --outputDir /tmp/iso --apiURL http://127.0.0.1:8001
+#
+import argparse
+import copy
+import email.utils
+import fnmatch
+import functools
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+from collections import deque, namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, unquote
+
+from lxml import etree
+
+import api.harvest as harvest
+
+
+DATACITE_TEST_RECORD = './defaultInputRecords/test_datacite_full.json'
+DSET_TEST_RECORD = './defaultInputRecords/test_dset_full.txt'
+DSET_TEMPLATE = './templates_ISO19139/dset_full.xml'
+
+CSW_NAMESPACES = {'csw': 'http://www.opengis.net/cat/csw/2.0.2',
+                  'ogc': 'http://www.opengis.net/ogc',
+                  'gmd': 'http://www.isotc211.org/2005/gmd',
+                  'gco': 'http://www.isotc211.org/2005/gco'}
+
+# One HTTP request, as passed to StandInServer.respond(); query maps names to lists of values, as from parse_qs.
+Request = namedtuple('Request', ['method', 'path', 'query', 'headers', 'body'])
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """ Reads each request, and sends the response chosen by the server's getFault() or respond(). """
+
+    # Connections are kept alive, as with the real services, so pooled client sessions behave as they would there.
+    protocol_version = 'HTTP/1.1'
+
+    def handleRequest(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        url = urlparse(self.path)
+        request = Request(self.command, unquote(url.path), parse_qs(url.query), self.headers, body)
+        (status, responseBody, headers) = self.server.getFault(request) or self.server.respond(request)
+        self.sendResponse(status, responseBody, headers)
+
+    do_GET = do_POST = do_PUT = do_DELETE = handleRequest
+
+    def sendResponse(self, status, body, headers):
+        """ Send a response; dictionaries and lists are sent as JSON, strings as UTF-8 text. """
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body)
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.send_response(status)
+        headers = dict(headers)
+        headers.setdefault('Content-Type', self.server.contentType)
+        for (name, value) in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body or b'')))
+        self.end_headers()
+        try:
+            if body:
+                self.wfile.write(body)
+        except ConnectionError:
+            # The client stopped waiting, e.g. a request that timed out.
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandInServer(ThreadingHTTPServer):
+    """ Base class of the stand-in servers.  Subclasses answer requests in respond().
+
+        latency      seconds to wait before answering each request
+        errorRate    fraction of requests, chosen at random, answered with errorStatus
+        errorStatus  HTTP status of injected errors; default 503 Service Unavailable
+        rateLimit    requests allowed per second; further requests get 429 Too Many Requests, with Retry-After
+        seed         seed for choosing the requests that fail, for repeatable runs
+
+        Besides random errors, failures maps request paths to the number of errorStatus responses still to send
+        for that path.  requestCount counts every request, including those answered with an error.
+    """
+    daemon_threads = True
+    contentType = 'application/json'
+
+    def __init__(self, latency=0.0, errorRate=0.0, errorStatus=503, rateLimit=None, seed=None,
+                 host='127.0.0.1', port=0):
+        super().__init__((host, port), StandInHandler)
+        self.latency = latency
+        self.errorRate = errorRate
+        self.errorStatus = errorStatus
+        self.rateLimit = rateLimit
+        self.random = random.Random(seed)
+        self.failures = {}
+        self.requestCount = 0
+        self.requestTimes = deque()     # times of the requests accepted within the last second, with rateLimit
+        self.lock = threading.Lock()
+        self.thread = None
+
+    @property
+    def url(self):
+        return 'http://%s:%d' % self.server_address[:2]
+
+    def start(self):
+        """ Start serving from a background thread; returns the server. """
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *excInfo):
+        self.stop()
+
+    def getFault(self, request):
+        """ Wait for the configured latency, then return an injected (status, body, headers) response for the
+            request, or None to let respond() answer it. """
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            self.requestCount += 1
+            if self.rateLimit:
+                now = time.monotonic()
+                while self.requestTimes and self.requestTimes[0] <= now - 1:
+                    self.requestTimes.popleft()
+                if len(self.requestTimes) >= self.rateLimit:
+                    return 429, {'status': 429, 'message': 'Too Many Requests'}, {'Retry-After': '1'}
+                self.requestTimes.append(now)
+            failuresLeft = self.failures.get(request.path, 0)
+            if failuresLeft:
+                self.failures[request.path] = failuresLeft - 1
+            elif not (self.errorRate and self.random.random() < self.errorRate):
+                return None
+        return self.errorStatus, {'status': self.errorStatus, 'message': 'Injected error'}, {}
+
+    def respond(self, request):
+        """ Return (status, body, headers) answering a request. """
+        raise NotImplementedError
+
+
+#
+#  DataCite REST API
+#
+def getTestDataCiteRecords(count, prefix='10.5065'):
+    """ Return DataCite records, differing only in DOI, made from the test record in the default input folder. """
+    with open(DATACITE_TEST_RECORD) as recordFile:
+        record = json.load(recordFile)
+    records = []
+    for index in range(count):
+        recordCopy = copy.deepcopy(record)
+        recordCopy['doi'] = '%s/test-%04d' % (prefix, index)
+        recordCopy.setdefault('updated', '2020-01-01T00:00:00.000Z')
+        records.append(recordCopy)
+    return records
+
+
+class DataCiteServer(StandInServer):
+    """ Serves GET /dois?prefix=...&page[cursor]=...&page[size]=... listings with cursor pagination, and
+        GET /dois/<doi> records with ETags, and with Last-Modified for records with an 'updated' time, from a list of
+        DataCite record attributes.  Conditional requests for unchanged records are answered with 304.
+        Records are indexed by DOI and by prefix when the server is created. """
+    contentType = 'application/vnd.api+json'
+
+    def __init__(self, records=(), **options):
+        super().__init__(**options)
+        self.records = list(records)
+        self.recordsByDOI = {}
+        self.recordsByPrefix = {}
+        for record in self.records:
+            self.recordsByDOI.setdefault(record['doi'], record)
+            self.recordsByPrefix.setdefault(record['doi'].split('/')[0], []).append(record)
+
+    def respond(self, request):
+        if request.path == '/dois':
+            return self.getListingPage(request.query)
+        doi = request.path[len('/dois/'):]
+        record = self.recordsByDOI.get(doi)
+        etag = '"%s-v1"' % doi
+        if not request.path.startswith('/dois/') or record is None:
+            return 404, {'errors': [{'status': '404', 'title': 'The resource could not be found.'}]}, {}
+        headers = {'ETag': etag}
+        lastModified = harvest.getLastModified(record)
+        if lastModified:
+            headers['Last-Modified'] = lastModified
+        if request.headers.get('If-None-Match') == etag or isNotModifiedSince(request, record):
+            return 304, None, {}
+        return 200, {'data': {'id': doi, 'attributes': record}}, headers
+
+    def getListingPage(self, query):
+        prefix = query['prefix'][0]
+        cursor = int(query.get('page[cursor]', ['1'])[0])
+        pageSize = int(query.get('page[size]', ['25'])[0])
+        matching = self.recordsByPrefix.get(prefix, [])
+        page = {'data': [{'id': record['doi'], 'attributes': record}
+                         for record in matching[cursor - 1:cursor - 1 + pageSize]],
+                'links': {}}
+        if cursor - 1 + pageSize < len(matching):
+            page['links']['next'] = ('%s/dois?prefix=%s&page[cursor]=%d&page[size]=%d'
+                                     % (self.url, prefix, cursor + pageSize, pageSize))
+        return 200, page, {}
+
+
+def isNotModifiedSince(request, record):
+    """ Return True if a request's If-Modified-Since date is no earlier than the record's 'updated' time. """
+    lastModified = harvest.getLastModified(record)
+    modifiedSince = request.headers.get('If-Modified-Since')
+    if not (lastModified and modifiedSince):
+        return False
+    try:
+        return email.utils.parsedate_to_datetime(modifiedSince) >= email.utils.parsedate_to_datetime(lastModified)
+    except (TypeError, ValueError):
+        return False
+
+
+#
+#  Zenodo deposition API
+#
+class ZenodoServer(StandInServer):
+    """ Serves the Zenodo deposition API used by zenodo_create.py, under /api or at the top level:
+
+            POST /deposit/depositions                       create a deposition, with a bucket for its files
+            PUT  /deposit/depositions/<id>                  set the deposition's metadata
+            GET  /deposit/depositions/<id>/files            list uploaded files with their MD5 checksums
+            POST /deposit/depositions/<id>/actions/publish  publish the deposition
+            PUT  /files/<bucket>/<file name>                upload a file
+
+        Files are kept by name, in one namespace shared by all buckets.  File names listed in corruptions are
+        stored truncated that many times, as if damaged in transfer.  If accessToken is given, requests without
+        that access_token parameter are refused.
+    """
+
+    def __init__(self, accessToken=None, **options):
+        super().__init__(**options)
+        self.accessToken = accessToken
+        self.depositions = {}
+        self.files = {}
+        self.corruptions = {}
+
+    @property
+    def apiURL(self):
+        return self.url + '/api'
+
+    def respond(self, request):
+        if self.accessToken and request.query.get('access_token') != [self.accessToken]:
+            return 401, {'status': 401, 'message': 'The server could not verify that you are authorized.'}, {}
+        path = request.path[len('/api'):] if request.path.startswith('/api/') else request.path
+        parts = path.strip('/').split('/')
+        if parts[0] == 'files' and len(parts) == 3 and request.method == 'PUT':
+            return self.putFile(parts[2], request.body)
+        if parts[:2] != ['deposit', 'depositions']:
+            return 404, {'status': 404, 'message': 'Not found'}, {}
+        if len(parts) == 2 and request.method == 'POST':
+            return self.createDeposition()
+        deposition = self.depositions.get(parts[2]) if len(parts) > 2 else None
+        if parts[3:] == ['files'] and request.method == 'GET':
+            return 200, [{'filename': fileName, 'filesize': len(data), 'checksum': hashlib.md5(data).hexdigest()}
+                         for (fileName, data) in sorted(self.files.items())], {}
+        if deposition is None:
+            return 404, {'status': 404, 'message': 'PID does not exist.'}, {}
+        if len(parts) == 3 and request.method == 'PUT':
+            deposition['metadata'] = json.loads(request.body)['metadata']
+            return 200, deposition, {}
+        if parts[3:] == ['actions', 'publish'] and request.method == 'POST':
+            deposition['submitted'] = True
+            deposition['doi'] = '10.5281/zenodo.%s' % deposition['id']
+            return 202, deposition, {}
+        return 405, {'status': 405, 'message': 'Method not allowed'}, {}
+
+    def createDeposition(self):
+        with self.lock:
+            depositionID = len(self.depositions) + 1
+            deposition = {'id': depositionID, 'metadata': {}, 'submitted': False,
+                          'links': {'bucket': '%s/files/%s' % (self.apiURL, uuid.uuid4()),
+                                    'self': '%s/deposit/depositions/%d' % (self.apiURL, depositionID)}}
+            self.depositions[str(depositionID)] = deposition
+        return 201, deposition, {}
+
+    def putFile(self, fileName, data):
+        with self.lock:
+            if self.corruptions.get(fileName):
+                self.corruptions[fileName] -= 1
+                data = data[:-1]
+            self.files[fileName] = data
+        return 201, {'key': fileName, 'size': len(data), 'checksum': 'md5:' + hashlib.md5(data).hexdigest()}, {}
+
+
+#
+#  CSW-T transaction endpoint
+#
+@functools.lru_cache(maxsize=1)
+def getTestISORecord():
+    """ Return the ISO translation of the DSET test record, as UTF-8 XML bytes.  Translated outputs are not kept in
+        the repository, so the record is translated here, once per process. """
+    import api.inputjson as dset_input
+    import api.translate.dset as dset_translate
+    isoText = dset_translate.transformDSETToISO(dset_input.getJSONFileData(DSET_TEST_RECORD), DSET_TEMPLATE)
+    return isoText.encode('utf-8')
+
+
+class CSWServer(StandInServer):
+    """ Answers CSW 2.0.2 Transaction requests POSTed to any path, like GeoNetwork's csw-publication service.
+        Inserted ISO records are kept by file identifier in records.  Delete operations remove the records whose
+        identifier matches the ogc:Literal of a PropertyIsEqualTo or PropertyIsLike filter.  Each response is a
+        csw:TransactionResponse with the totals of inserted, updated and deleted records, and an InsertResult
+        listing the identifiers of inserted records.  Records whose identifiers are in rejectedIdentifiers are
+        left out of an Insert, as a service skips records it cannot store.
+    """
+    contentType = 'application/xml'
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.records = {}
+        self.transactionCount = 0
+        self.rejectedIdentifiers = set()
+
+    def respond(self, request):
+        try:
+            transaction = etree.fromstring(request.body)
+        except etree.XMLSyntaxError as error:
+            return 400, getExceptionReport('Malformed XML: %s' % error), {}
+        if transaction.tag != '{%s}Transaction' % CSW_NAMESPACES['csw']:
+            return 400, getExceptionReport('Not a csw:Transaction request'), {}
+
+        totals = {'totalInserted': 0, 'totalUpdated': 0, 'totalDeleted': 0}
+        insertedIdentifiers = []
+        with self.lock:
+            self.transactionCount += 1
+            for operation in transaction:
+                if operation.tag == '{%s}Insert' % CSW_NAMESPACES['csw']:
+                    for record in operation:
+                        identifier = getRecordIdentifier(record)
+                        if identifier in self.rejectedIdentifiers:
+                            continue
+                        self.records[identifier] = etree.tostring(record)
+                        insertedIdentifiers.append(identifier)
+                        totals['totalInserted'] += 1
+                elif operation.tag == '{%s}Delete' % CSW_NAMESPACES['csw']:
+                    for identifier in getMatchingIdentifiers(operation, list(self.records)):
+                        del self.records[identifier]
+                        totals['totalDeleted'] += 1
+        return 200, getTransactionResponse(totals, insertedIdentifiers), {}
+
+
+def getRecordIdentifier(record):
+    return record.findtext('gmd:fileIdentifier/gco:CharacterString', namespaces=CSW_NAMESPACES)
+
+
+def getMatchingIdentifiers(deleteOperation, identifiers):
+    """ Return the identifiers matched by the filter of a csw:Delete operation. """
+    literal = deleteOperation.findtext('.//ogc:Literal', namespaces=CSW_NAMESPACES)
+    likeFilter = deleteOperation.find('.//ogc:PropertyIsLike', namespaces=CSW_NAMESPACES)
+    if likeFilter is None:
+        return [identifier for identifier in identifiers if identifier == literal]
+    pattern = literal.replace(likeFilter.get('wildCard', '%'), '*').replace(likeFilter.get('singleChar', '_'), '?')
+    return fnmatch.filter(identifiers, pattern)
+
+
+def getTransactionResponse(totals, insertedIdentifiers=()):
+    csw = '{%s}' % CSW_NAMESPACES['csw']
+    response = etree.Element(csw + 'TransactionResponse', nsmap={'csw': CSW_NAMESPACES['csw']}, version='2.0.2')
+    summary = etree.SubElement(response, csw + 'TransactionSummary')
+    for (name, total) in totals.items():
+        etree.SubElement(summary, csw + name).text = str(total)
+    if insertedIdentifiers:
+        insertResult = etree.SubElement(response, csw + 'InsertResult')
+        for identifier in insertedIdentifiers:
+            briefRecord = etree.SubElement(insertResult, csw + 'BriefRecord')
+            etree.SubElement(briefRecord, '{http://purl.org/dc/elements/1.1/}identifier').text = identifier
+    return etree.tostring(response, xml_declaration=True, encoding='UTF-8')
+
+
+def getExceptionReport(message):
+    return ('<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<ows:ExceptionReport xmlns:ows="http://www.opengis.net/ows" version="1.0.0">'
+            '<ows:Exception exceptionCode="InvalidParameterValue"><ows:ExceptionText>%s</ows:ExceptionText>'
+            '</ows:Exception></ows:ExceptionReport>' % message.replace('&', '&amp;').replace('<', '&lt;'))
+
+
+#
+#  Command line: serve a stand-in until interrupted.
+#
+def main():
+    parser = argparse.ArgumentParser(description='Serve a local stand-in for DataCite, Zenodo or a CSW-T endpoint.')
+    parser.add_argument('service', choices=['datacite', 'zenodo', 'csw'])
+    parser.add_argument('--port', type=int, default=0, help='local port; default: any free port')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds to wait before each response')
+    parser.add_argument('--errorRate', type=float, default=0.0, help='fraction of requests answered with an error')
+    parser.add_argument('--errorStatus', type=int, default=503, help='HTTP status of injected errors')
+    parser.add_argument('--rateLimit', type=int, help='requests per second allowed before answering 429')
+    parser.add_argument('--seed', type=int, help='random seed for injected errors')
+    parser.add_argument('--records', type=int, default=100, help='number of DataCite test records to serve')
+    parser.add_argument('--prefix', default='10.5065', help='DOI prefix of the DataCite test records')
+    args = parser.parse_args()
+
+    options = {'latency': args.latency, 'errorRate': args.errorRate, 'errorStatus': args.errorStatus,
+               'rateLimit': args.rateLimit, 'seed': args.seed, 'port': args.port}
+    if args.service == 'datacite':
+        server = DataCiteServer(getTestDataCiteRecords(args.records, args.prefix), **options)
+    elif args.service == 'zenodo':
+        server = ZenodoServer(**options)
+    else:
+        server = CSWServer(**options)
+    print('Serving a %s stand-in at %s' % (args.service, server.apiURL if args.service == 'zenodo' else server.url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -4,11 +4,16 @@
 
 import unittest
 import json
+import os
+import tempfile
 from lxml.etree import Element
 from lxml import etree as ElementTree
 
 
+import api.translate.datacite as datacite
+import api.translate.dset as dset
 import api.util.xml as xml
+from tests.support.servers import getTestISORecord
 
 #
 # Unit test Setup/Helper functions
@@ -52,4 +57,186 @@ class XML_Test(unittest.TestCase):
       foundElement = xml.getFirstElement(xml_tree, 'Child')
       self.assertEqual(foundElement.text, '1')
 
+   def testTemplateCache_ReturnsIndependentCopies(self):
+      ''' A cached template should be parsed once, and each caller should get a tree it can modify freely.
+      '''
+      with tempfile.TemporaryDirectory() as tempDir:
+         templatePath = os.path.join(tempDir, 'template.xml')
+         with open(templatePath, 'w') as templateFile:
+            templateFile.write('<Root><Child>template</Child></Root>')
+
+         cache = xml.TemplateCache(maxSize=1)
+         firstCopy = cache.getTree(templatePath)
+         xml.getFirstElement(firstCopy, 'Child').text = 'modified'
+         secondCopy = cache.getTree(templatePath)
+
+         self.assertEqual(xml.getFirstElement(secondCopy, 'Child').text, 'template')
+         self.assertEqual(cache.stats()['misses'], 1)
+         self.assertEqual(cache.stats()['hits'], 1)
+
+         cache.invalidate(templatePath)
+         cache.getTree(templatePath)
+         self.assertEqual(cache.stats()['misses'], 2)
+
+   def testGetElements_AcceptsCompiledXPath(self):
+      ''' XPath strings should be compiled once, and a compiled XPath should give the same result as its string.
+      '''
+      xml_tree = self.simpleTree
+      xml_tree = addXPathToXML(xml_tree, "Child", '1')
+
+      compiledPath = xml.compileXPath('Child')
+      self.assertIs(xml.compileXPath('Child'), compiledPath)
+      self.assertEqual(xml.getElements(xml_tree, compiledPath), xml.getElements(xml_tree, 'Child'))
+
+   def testGetTemplateAnchors_MatchesXPathSearch(self):
+      ''' Plan anchors of a fresh template copy should be the elements its XPaths find, including XPaths that
+          navigate back up the tree, and an edited template should get a new plan.
+      '''
+      with tempfile.TemporaryDirectory() as tempDir:
+         templatePath = os.path.join(tempDir, 'template.xml')
+         with open(templatePath, 'w') as templateFile:
+            templateFile.write('<Root><!-- comment --><A><Title>Keys</Title><Key/></A><B><Key/></B></Root>')
+         xpathTable = {'key': '/Root/A/Title[contains(., "Keys")]/../Key', 'b': '/Root/B', 'missing': '/Root/C'}
+
+         root, anchors = xml.getTemplateAnchors(templatePath, xpathTable)
+         self.assertEqual(anchors, xml.findAnchors(root, xpathTable))
+         self.assertEqual(anchors['key'].getparent().tag, 'A')
+         self.assertIsNone(anchors['missing'])
+         self.assertIs(xml.getFirstElement(root, anchors['b']), anchors['b'])
+
+         with open(templatePath, 'w') as templateFile:
+            templateFile.write('<Root><C/><B/></Root>')
+         os.utime(templatePath, ns=(0, 0))
+         root, anchors = xml.getTemplateAnchors(templatePath, xpathTable)
+         self.assertEqual(anchors, xml.findAnchors(root, xpathTable))
+         self.assertEqual(anchors['b'].tag, 'B')
+
+   def testGetTemplateAnchors_PlansFollowXPathTableContents(self):
+      ''' A plan should be reused only for an XPath table with the same contents, even when a freed table's memory,
+          and so its id, is reused by a new table with different XPaths.
+      '''
+      with tempfile.TemporaryDirectory() as tempDir:
+         templatePath = os.path.join(tempDir, 'template.xml')
+         with open(templatePath, 'w') as templateFile:
+            templateFile.write('<Root><A/><B/></Root>')
+         for (name, elementPath) in [('a', '/Root/A'), ('b', '/Root/B'), ('a', '/Root/B'), ('a', '/Root/A')]:
+            root, anchors = xml.getTemplateAnchors(templatePath, {name: elementPath})
+            self.assertEqual(list(anchors), [name])
+            self.assertEqual(anchors[name].tag, elementPath[-1])
+
+   def testTemplateError_NamesMissingAnchors(self):
+      ''' A template lacking anchors the translator needs should fail when it is loaded, with an error naming the
+          missing anchors, rather than deep inside a translation; without requireAll, missing anchors are None.
+      '''
+      with open('./templates_ISO19139/dset_full.xml', 'rb') as templateFile:
+         templateRoot = ElementTree.fromstring(templateFile.read())
+      for name in ('topicCategory', 'assetSize'):
+         element = xml.getFirstElement(templateRoot, dset.anchorXPaths[name])
+         element.getparent().remove(element)
+      with open('defaultInputRecords/test_dset_full.txt') as recordFile:
+         record = json.load(recordFile)
+
+      with tempfile.TemporaryDirectory() as tempDir:
+         templatePath = os.path.join(tempDir, 'template.xml')
+         ElementTree.ElementTree(templateRoot).write(templatePath)
+
+         with self.assertRaises(xml.TemplateError) as context:
+            dset.getTemplateAnchors(templatePath)
+         self.assertEqual(context.exception.missingXPaths, {name: dset.anchorXPaths[name]
+                                                            for name in ('topicCategory', 'assetSize')})
+         self.assertIn('topicCategory, assetSize', str(context.exception))
+         for translate in (dset.transformDSETToISO, dset.transformDSETToISOBytes):
+            self.assertRaises(xml.TemplateError, translate, record, templatePath)
+         self.assertRaises(xml.TemplateError, datacite.getTemplateAnchors, './templates_ISO19139/dset_min.xml')
+
+         root, anchors = xml.getTemplateAnchors(templatePath, dset.anchorXPaths)
+         self.assertIsNone(anchors['topicCategory'])
+         self.assertEqual(anchors['title'].getparent().tag, '{%s}title' % xml.ISO_NAMESPACES['gmd'])
+
+   def testDataCiteTemplateAnchors_RequireRightsOnlyForRecordsWithRights(self):
+      ''' A DataCite template without resourceConstraints should load, and translate records without a rightsList,
+          but a record with a rightsList should fail with an error naming the missing rights elements.
+      '''
+      with open('./templates_ISO19139/datacite.xml', 'rb') as templateFile:
+         templateRoot = ElementTree.fromstring(templateFile.read())
+      constraints = xml.getFirstElement(templateRoot, '//gmd:resourceConstraints')
+      constraints.getparent().remove(constraints)
+      with open('./defaultInputRecords/test_datacite_full.json') as recordFile:
+         record = json.load(recordFile)
+      self.assertTrue(record['rightsList'])
+
+      with tempfile.TemporaryDirectory() as tempDir:
+         templatePath = os.path.join(tempDir, 'template.xml')
+         ElementTree.ElementTree(templateRoot).write(templatePath)
+
+         root, anchors = datacite.getTemplateAnchors(templatePath)
+         self.assertIsNone(anchors['legalConstraints'])
+         isoText = datacite.translateDataCiteRecord(dict(record, rightsList=[]), templatePath)
+         self.assertIn(record['doi'], isoText)
+         self.assertNotIn('resourceConstraints', isoText)
+
+         with self.assertRaises(xml.TemplateError) as context:
+            datacite.translateDataCiteRecord(record, templatePath)
+         self.assertEqual(sorted(context.exception.missingXPaths), ['accessConstraints', 'legalConstraints'])
+
+   def testRepeatableBlock_InsertsFilledCopiesInOrder(self):
+      ''' Copies should be filled in through children located on the prototype, and inserted in item order at the
+          given index, leaving the prototype unchanged.
+      '''
+      root = ElementTree.fromstring('<Root><First/><Item><Name><Text>name</Text></Name></Item><Last/></Root>')
+      prototype, parent, index = xml.cutElement(root, 'Item', True)
+      block = xml.RepeatableBlock(prototype, {'text': './/Text', 'item': '.', 'missing': 'Other'})
+      self.assertEqual(block.childPaths, {'text': (0, 0), 'item': (), 'missing': None})
+
+      def fillItem(children, item):
+         children['text'].text = item
+         children['item'].attrib['id'] = item
+
+      copies = block.insertCopies(parent, index, ['a', 'b', 'c'], fillItem)
+      self.assertEqual([element.tag for element in root], ['First', 'Item', 'Item', 'Item', 'Last'])
+      self.assertEqual([element.get('id') for element in root[1:4]], ['a', 'b', 'c'])
+      self.assertEqual([element.findtext('Name/Text') for element in copies], ['a', 'b', 'c'])
+      self.assertEqual(prototype.findtext('Name/Text'), 'name')
+
+   def testTransformDSETToISOBytes_MatchesSerializedTree(self):
+      ''' Records translated into a template with pre-rendered static slots should serialize to the same bytes
+          as records translated into a full copy of the template.
+      '''
+      templatePath = './templates_ISO19139/dset_full.xml'
+      with open('defaultInputRecords/test_dset_full.txt') as recordFile:
+         record = json.load(recordFile)
+      record['metadata_date'] = '2020-01-01T00:00:00'
+      minimalRecord = {field: record[field] for field in ['metadata_id', 'asset_type', 'landing_page', 'title',
+                                                           'publication_date', 'author', 'abstract', 'progress',
+                                                           'resource_version', 'metadata_date']}
+      largeRecord = dict(record, keywords=record['keywords'] * 20, author=record['author'] * 10)
+
+      root, anchors, plan = xml.getTemplateSlots(templatePath, dset.anchorXPaths)
+      self.assertGreater(len(plan.fragments), 0)
+      self.assertLess(len(root.xpath('//*')), len(xml.getTemplateTree(templatePath).xpath('//*')))
+      for testRecord in [record, minimalRecord, largeRecord]:
+         isoText = dset.transformDSETToISO(json.loads(json.dumps(testRecord)), templatePath)
+         isoBytes = dset.transformDSETToISOBytes(json.loads(json.dumps(testRecord)), templatePath)
+         self.assertEqual(isoBytes, isoText.encode('utf-8'))
+
+   def testGetPrunedXMLTree_KeepsOnlyCapturePaths(self):
+      ''' A pruned parse should keep the captured subtrees and their ancestors, drop everything else, and give
+          the same XPath results as a full parse for elements inside the captured subtrees.
+      '''
+      identification = '/gmd:MD_Metadata/gmd:identificationInfo/gmd:MD_DataIdentification'
+      capturePaths = ['/gmd:MD_Metadata/gmd:contact', identification + '/gmd:extent']
+
+      with tempfile.TemporaryDirectory() as tempDir:
+         recordPath = os.path.join(tempDir, 'test_dset_full.xml')
+         with open(recordPath, 'wb') as isoFile:
+            isoFile.write(getTestISORecord())
+         fullTree = xml.getXMLTree(recordPath)
+         prunedTree = xml.getPrunedXMLTree(recordPath, capturePaths, minimumSize=0)
 
+      self.assertEqual([ElementTree.QName(child).localname for child in prunedTree],
+                       ['contact', 'identificationInfo'])
+      self.assertEqual([ElementTree.QName(child).localname for child in xml.getElements(prunedTree, identification)[0]],
+                       ['extent'])
+      for path in ['/gmd:MD_Metadata/gmd:contact', identification + '/gmd:extent//gco:Decimal']:
+         self.assertEqual([ElementTree.tostring(e) for e in xml.getElements(prunedTree, path)],
+                          [ElementTree.tostring(e) for e in xml.getElements(fullTree, path)])
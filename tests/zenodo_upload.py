@@ -0,0 +1,108 @@
+#
+#  To run these unit tests: type "./run_tests.sh" at a command prompt.
+#
+
+import unittest
+import hashlib
+import os
+import tempfile
+
+import api.zenodo_upload as zenodo_upload
+from tests.support.servers import ZenodoServer
+
+
+#
+# Unit tests
+#
+class ZenodoUpload_Test(unittest.TestCase):
+
+   def setUp(self):
+      self.server = ZenodoServer().start()
+      self.bucket_url = self.server.url + '/files/test-bucket'
+      self.session = zenodo_upload.get_session(4)
+
+      self.temp_dir = tempfile.TemporaryDirectory()
+      self.file_info = []
+      for index in range(10):
+         file_name = 'file_%02d.dat' % index
+         file_path = os.path.join(self.temp_dir.name, file_name)
+         with open(file_path, 'wb') as f:
+            f.write(os.urandom(1000 + index))
+         self.file_info.append((file_name, file_path))
+
+   def tearDown(self):
+      self.session.close()
+      self.server.stop()
+      self.temp_dir.cleanup()
+
+   def upload(self, resume):
+      return list(zenodo_upload.upload_files(self.session, self.bucket_url, self.file_info, {}, resume,
+                                             num_workers=4, retries=2, backoff=0.01))
+
+   def testUploadFiles_RetriesAndResumes(self):
+      ''' Temporary server errors should be retried, and a resumed upload should skip finished files.
+      '''
+      resume_path = os.path.join(self.temp_dir.name, 'resume.json')
+      resume = zenodo_upload.ResumeFile(resume_path, {'dataset_id': 1, 'bucket_url': self.bucket_url})
+      self.server.failures = {'/files/test-bucket/file_03.dat': 2, '/files/test-bucket/file_07.dat': 3}
+
+      results = self.upload(resume)
+      self.assertEqual([file_name for (file_name, result, error) in results],
+                       [file_name for (file_name, file_path) in self.file_info])
+
+      # file_07.dat fails more often than it is retried, so only it is missing.
+      failed = [file_name for (file_name, result, error) in results if error]
+      self.assertEqual(failed, ['file_07.dat'])
+      self.assertEqual(len(self.server.files), 9)
+      self.assertEqual(self.server.requestCount, 10 + 2 + 2)
+
+      # The resume file on disk records each finished file's checksum.
+      resume = zenodo_upload.ResumeFile.load(resume_path)
+      with open(self.file_info[0][1], 'rb') as f:
+         self.assertEqual(resume.data['files']['file_00.dat']['checksum'], 'md5:' + hashlib.md5(f.read()).hexdigest())
+
+      # Resuming should upload only the file that failed.
+      results = self.upload(resume)
+      self.assertEqual([file_name for (file_name, result, error) in results if result], ['file_07.dat'])
+      self.assertEqual(self.server.requestCount, 15)
+      self.assertEqual(len(self.server.files), 10)
+
+   def testUploadFile_ReuploadsOnChecksumMismatch(self):
+      ''' A file that Zenodo received damaged should be uploaded again until the checksums agree.
+      '''
+      (file_name, file_path) = self.file_info[0]
+      self.server.corruptions = {file_name: 1}
+      result = zenodo_upload.upload_file(self.session, self.bucket_url, file_name, file_path, {}, backoff=0.01)
+
+      self.assertEqual(self.server.requestCount, 2)
+      self.assertEqual(result['checksum'], zenodo_upload.get_md5_checksum(file_path))
+      with open(file_path, 'rb') as f:
+         self.assertEqual(self.server.files[file_name], f.read())
+
+      self.server.corruptions = {file_name: 5}
+      with self.assertRaises(zenodo_upload.UploadError):
+         zenodo_upload.upload_file(self.session, self.bucket_url, file_name, file_path, {}, retries=1, backoff=0.01)
+
+   def testVerifyFiles_ComparesWithDepositionListing(self):
+      ''' Verification should report matching, differing and missing files, in folder order.
+      '''
+      self.server.corruptions = {'file_02.dat': 1}
+      self.upload(zenodo_upload.ResumeFile(os.path.join(self.temp_dir.name, 'resume.json'), {}))
+      self.server.corruptions = {'file_05.dat': 1}
+      with self.assertRaises(zenodo_upload.UploadError):
+         zenodo_upload.upload_file(self.session, self.bucket_url, 'file_05.dat', self.file_info[5][1], {}, retries=0)
+      del self.server.files['file_09.dat']
+
+      deposition_url = self.server.url + '/deposit/depositions/1'
+      remote_checksums = zenodo_upload.get_deposition_checksums(self.session, deposition_url, {})
+      results = list(zenodo_upload.verify_files(self.file_info, remote_checksums, num_workers=3))
+
+      self.assertEqual([file_name for (file_name, local, remote) in results],
+                       [file_name for (file_name, file_path) in self.file_info])
+      bad = [(file_name, remote) for (file_name, local, remote) in results if local != remote]
+      self.assertEqual([file_name for (file_name, remote) in bad], ['file_05.dat', 'file_09.dat'])
+      self.assertIsNone(bad[1][1])
+
+
+if __name__ == '__main__':
+    unittest.main()
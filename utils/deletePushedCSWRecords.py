@@ -1,85 +1,62 @@
-# Python script:  
+# Python script:
 # Delete DataCite records pushed to GeoNetwork
-
-from lxml import etree as ElementTree       # ISO XML parser
-import requests                             # Allows simple POST requests
-from requests.auth import HTTPBasicAuth     # Allows POST basic authentication
-
-# We need XML namespace mappings in order to search the ISO element tree
-XML_NAMESPACE_MAP = {'ogc': 'http://www.opengis.net/ogc',
-	'csw': 'http://www.opengis.net/cat/csw/2.0.2',
-    'apiso': 'http://www.opengis.net/cat/csw/apiso/1.0'}
-
-
-# Return first item in a list if list is nonempty (returns None otherwise).
-def getFirst(someList): 
-    if someList:
-        return someList[0]
-
-
-# Search XML element tree and return the first matching element
-def getElement(baseElement, elementPath):
-	elements = baseElement.xpath(elementPath, namespaces=XML_NAMESPACE_MAP)
-	return getFirst(elements)
-
-
-def getDeleteRecord(recordID, templateFileISO):
-
-	# Load the XML template file as an element tree
-	tree = ElementTree.parse(templateFileISO)
-	root = tree.getroot()
-
-	# Put record ID in element
-	elemID = getElement(root, './/ogc:Literal')
-	elemID.text = recordID
-
-    # Return record as XML 
-	recordAsXML = ElementTree.tostring(root, pretty_print=True)
-	return recordAsXML
-
-
-###
-### START OF MAIN PROGRAM
-###
-
-recordIDFile = '../pushedRecordIDs.txt'
-deleteISOTemplate = './templates_ISO19139/deleteCSW.xml'
+#
+# Run from the top-level folder:
+#
+#     python -m utils.deletePushedCSWRecords --idFile ../pushedRecordIDs.txt
+#
+# Record IDs are deleted in batches, many Delete operations per CSW transaction, with several transactions in
+# flight at once.  A record that no longer exists, e.g. one deleted by an earlier run, counts as deleted.  The IDs of
+# batches that fail are printed to STDOUT, so they can be saved and deleted in a rerun.
+
+import argparse
+import os
+import sys
+
+import api.csw as csw
+
+parser = argparse.ArgumentParser(description='Delete records pushed to a GeoNetwork CSW service.')
+parser.add_argument('--idFile', default='../pushedRecordIDs.txt', help='file listing the IDs of records to delete')
+parser.add_argument('--baseURL', default=csw.GEONETWORK_BASE_URL,
+                    help='GeoNetwork base URL, e.g. http://localhost:8080 or a local test server.  Default: '
+                         + csw.GEONETWORK_BASE_URL)
+parser.add_argument('--user', default='admin', help='GeoNetwork user; the password is read from $CSW_PASSWORD')
+parser.add_argument('--batchSize', type=int, default=csw.DEFAULT_BATCH_SIZE,
+                    help='records deleted per CSW transaction.  Default: %d' % csw.DEFAULT_BATCH_SIZE)
+parser.add_argument('--workers', type=int, default=4, help='CSW transactions sent concurrently.  Default: 4')
+parser.add_argument('--retries', type=int, default=3,
+                    help='retries of a transaction after a connection failure or temporary server error.  Default: 3')
+args = parser.parse_args()
+
+password = os.environ.get('CSW_PASSWORD', 'admin')
 
 # Read pushed record IDs and put in a list
-with open(recordIDFile,"r") as infile:
-	listOfIDs = infile.read().splitlines()
+with open(args.idFile, "r") as infile:
+    listOfIDs = [recordID for recordID in infile.read().splitlines() if recordID]
 
 print("##", file=sys.stderr)
 print("## Deleting " + str(len(listOfIDs)) + " Records...", file=sys.stderr)
 print("##", file=sys.stderr)
 
-# Loop over IDs to delete
-for id in listOfIDs:
-
-	deleteRecord = getDeleteRecord(id, deleteISOTemplate)
-
-	XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
-	xmlOutput = XML_HEADER + deleteRecord
-
-	# Post the resulting XML to GeoNetwork CSW service.  
-	POST_RESULT = True
-	if POST_RESULT:
-		#GeoNetworkBaseURL = 'http://localhost:8080'
-		GeoNetworkBaseURL = 'https://geonetwork.prototype.ucar.edu'
-		url = GeoNetworkBaseURL + '/geonetwork/srv/eng/csw-publication?SERVICE=CSW&VERSION=2.0.2&REQUEST=DELETE'
-		header = {'Content-Type': 'text/xml'}
-
-		try:
-			response = requests.post(url, auth=HTTPBasicAuth('admin', 'admin'), headers=header, data=xmlOutput)
-			print(response.text, file=sys.stderr)
-		except requests.ConnectionError:
-			print('ConnectionError: failed to connect: ' + url, file=sys.stderr)
-
-		if response.status_code != 200:
-			raise OSError("Response " + str(response.status_code) + ": " + response.content)
-		print(response.status_code, file=sys.stderr)
-
-print('...Finished deleting records.', file=sys.stderr)
-
-
-
+session = csw.getSession(args.workers)
+numDeleted = 0
+numMissing = 0
+failedIDs = []
+for (batchIDs, totals, errorMessage) in csw.deleteRecords(session, csw.getPublicationURL(args.baseURL), listOfIDs,
+                                                          max(1, args.batchSize), auth=(args.user, password),
+                                                          numWorkers=max(1, args.workers), retries=args.retries):
+    if errorMessage:
+        print('Batch of %d records, from %s: %s' % (len(batchIDs), batchIDs[0], errorMessage), file=sys.stderr)
+        failedIDs += batchIDs
+    else:
+        numDeleted += len(batchIDs)
+        numMissing += len(batchIDs) - totals['totalDeleted']
+
+# IDs of failed batches go to STDOUT, ready to be deleted in a rerun.
+for recordID in failedIDs:
+    print(recordID)
+
+print('...Finished deleting records: %d deleted, of which %d no longer existed; %d in failed batches.'
+      % (numDeleted, numMissing, len(failedIDs)), file=sys.stderr)
+if failedIDs:
+    sys.exit(1)
@@ -0,0 +1,102 @@
+###
+#    MetadataIndex stores the fields that xpath.py extracts from ISO XML records in a SQLite database,
+#    so that reports over a large archive can be answered without parsing every record again.
+#
+#    * Records are keyed by absolute file path, and remember the file's modification time and size.
+#    * Updating the index only parses files that are new or whose modification time or size changed,
+#      and drops records for files that no longer exist.
+#    * List-valued fields (authors, formats, ORCID anchors) are stored as JSON text.
+###
+
+import json
+import os
+import os.path
+import sqlite3
+import time
+
+SCALAR_FIELDS = ['resource_type', 'publisher', 'has_geo_extent', 'has_time_extent']
+LIST_FIELDS = ['authors', 'formats', 'orcids']
+
+
+class MetadataIndex:
+
+    def __init__(self, index_file):
+        index_dir = os.path.dirname(index_file)
+        if index_dir:
+            os.makedirs(index_dir, exist_ok=True)
+        self._connection = sqlite3.connect(index_file)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute('CREATE TABLE IF NOT EXISTS records ('
+                                 ' path TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL, size INTEGER NOT NULL,'
+                                 ' parse_error TEXT, resource_type TEXT, publisher TEXT,'
+                                 ' has_geo_extent INTEGER, has_time_extent INTEGER,'
+                                 ' authors TEXT, formats TEXT, orcids TEXT, indexed_at REAL NOT NULL)')
+        self._connection.commit()
+
+    @staticmethod
+    def _get_range(directory):
+        """ Return (low, high) bounds selecting every indexed path inside a directory; '0' sorts just after '/'. """
+        directory = os.path.abspath(directory).rstrip('/')
+        return directory + '/', directory + '0'
+
+    def get_file_states(self, directory):
+        """ Return {path: (mtime_ns, size)} for every indexed file inside a directory. """
+        rows = self._connection.execute('SELECT path, mtime_ns, size FROM records WHERE path >= ? AND path < ?',
+                                        self._get_range(directory))
+        return {path: (mtime_ns, size) for (path, mtime_ns, size) in rows}
+
+    def plan_update(self, directory, files):
+        """ Compare files found in a directory with the index.
+            Returns (changed, removed): changed lists (path, mtime_ns, size) for new or modified files,
+            and removed lists indexed paths that are no longer among the files.
+        """
+        indexed_states = self.get_file_states(directory)
+        changed = []
+        for path in files:
+            path = os.path.abspath(path)
+            file_status = os.stat(path)
+            state = (file_status.st_mtime_ns, file_status.st_size)
+            if indexed_states.pop(path, None) != state:
+                changed.append((path, *state))
+        return changed, sorted(indexed_states)
+
+    def put_records(self, records):
+        """ Store a list of (path, mtime_ns, size, fields, parse_error) records in a single transaction.
+            fields is the dictionary returned by xpath.get_record_fields, or None for a file that did not parse.
+        """
+        now = time.time()
+        rows = []
+        for (path, mtime_ns, size, fields, parse_error) in records:
+            fields = fields or {}
+            rows.append((path, mtime_ns, size, parse_error,
+                         *[fields.get(name) for name in SCALAR_FIELDS],
+                         *[json.dumps(fields[name]) if name in fields else None for name in LIST_FIELDS], now))
+        self._connection.executemany('INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                     rows)
+        self._connection.commit()
+
+    def remove_records(self, paths):
+        self._connection.executemany('DELETE FROM records WHERE path = ?', [(path,) for path in paths])
+        self._connection.commit()
+
+    def get_records(self, directory):
+        """ Yield (path, fields, parse_error) for every indexed file inside a directory, in path order.
+            fields is None for a file that could not be parsed.
+        """
+        columns = ', '.join(['path', 'parse_error'] + SCALAR_FIELDS + LIST_FIELDS)
+        cursor = self._connection.execute(f'SELECT {columns} FROM records WHERE path >= ? AND path < ? ORDER BY path',
+                                          self._get_range(directory))
+        for (path, parse_error, *values) in cursor:
+            if parse_error is not None:
+                yield path, None, parse_error
+                continue
+            fields = dict(zip(SCALAR_FIELDS, values))
+            fields['has_geo_extent'] = bool(fields['has_geo_extent'])
+            fields['has_time_extent'] = bool(fields['has_time_extent'])
+            for (name, value) in zip(LIST_FIELDS, values[len(SCALAR_FIELDS):]):
+                fields[name] = json.loads(value)
+            yield path, fields, None
+
+    def close(self):
+        self._connection.close()
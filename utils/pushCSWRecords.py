@@ -0,0 +1,76 @@
+# Python script:
+# Push ISO 19139 records to GeoNetwork
+#
+# Run from the top-level folder:
+#
+#     python -m utils.pushCSWRecords --inputDir ./defaultOutputRecords --idFile ../pushedRecordIDs.txt
+#
+# Records are inserted in batches, many records per CSW transaction, with several transactions in flight at once.
+# The IDs of inserted records are appended to the ID file, which utils/deletePushedCSWRecords.py reads to delete
+# them again.  Records of a batch the service applied only in part are sent again in smaller batches, and the files
+# of records that still fail are printed to STDOUT, so they can be pushed in a rerun.
+
+import argparse
+import os
+import sys
+
+from lxml import etree
+
+import api.csw as csw
+
+ISO_NAMESPACES = {'gmd': 'http://www.isotc211.org/2005/gmd', 'gco': 'http://www.isotc211.org/2005/gco'}
+
+
+def getRecords(filePaths):
+    """ Yield (record ID, file path) and the record's XML bytes for each ISO file; the ID is its fileIdentifier. """
+    for filePath in filePaths:
+        with open(filePath, 'rb') as isoFile:
+            recordXML = isoFile.read()
+        recordID = etree.fromstring(recordXML).findtext('gmd:fileIdentifier/gco:CharacterString',
+                                                        namespaces=ISO_NAMESPACES)
+        yield (recordID, filePath), recordXML
+
+
+parser = argparse.ArgumentParser(description='Push ISO 19139 records to a GeoNetwork CSW service.')
+parser.add_argument('--inputDir', required=True, help='folder of ISO XML records to push')
+parser.add_argument('--idFile', default='../pushedRecordIDs.txt', help='file the IDs of pushed records are added to')
+parser.add_argument('--baseURL', default=csw.GEONETWORK_BASE_URL,
+                    help='GeoNetwork base URL, e.g. http://localhost:8080 or a local test server.  Default: '
+                         + csw.GEONETWORK_BASE_URL)
+parser.add_argument('--user', default='admin', help='GeoNetwork user; the password is read from $CSW_PASSWORD')
+parser.add_argument('--batchSize', type=int, default=csw.DEFAULT_BATCH_SIZE,
+                    help='records inserted per CSW transaction.  Default: %d' % csw.DEFAULT_BATCH_SIZE)
+parser.add_argument('--workers', type=int, default=4, help='CSW transactions sent concurrently.  Default: 4')
+parser.add_argument('--retries', type=int, default=3,
+                    help='retries of a transaction after a connection failure or temporary server error.  Default: 3')
+args = parser.parse_args()
+
+password = os.environ.get('CSW_PASSWORD', 'admin')
+filePaths = sorted(os.path.join(args.inputDir, name) for name in os.listdir(args.inputDir) if name.endswith('.xml'))
+
+print("## Pushing " + str(len(filePaths)) + " Records...", file=sys.stderr)
+
+session = csw.getSession(args.workers)
+numInserted = 0
+failedFiles = []
+with open(args.idFile, 'a') as idFile:
+    for (records, totals, errorMessage) in csw.insertRecords(session, csw.getPublicationURL(args.baseURL),
+                                                           getRecords(filePaths), max(1, args.batchSize),
+                                                           auth=(args.user, password),
+                                                           numWorkers=max(1, args.workers), retries=args.retries):
+        if errorMessage:
+            print('%d records, from %s: %s' % (len(records), records[0][1], errorMessage), file=sys.stderr)
+            failedFiles += [filePath for (recordID, filePath) in records]
+        else:
+            numInserted += totals['totalInserted']
+            idFile.write(''.join(recordID + '\n' for (recordID, filePath) in records))
+            idFile.flush()
+
+# Files of failed records go to STDOUT, so they can be pushed again.
+for filePath in failedFiles:
+    print(filePath)
+
+print('...Finished pushing records: %d inserted, %d failed.' % (numInserted, len(failedFiles)),
+      file=sys.stderr)
+if failedFiles:
+    sys.exit(1)
@@ -1,14 +1,16 @@
 import argparse
 import sys
-import csv
-from lxml import etree as ElementTree  # ISO XML parser
 
 from utils.harvest_mappings import getStandardResourceFormat
 from utils.name_parse import split_name_string
 
 import os.path
+from functools import partial
 from pathlib import Path
 
+# lxml, the CSV writer, the process pool and the SQLite index are imported by the code paths that use them,
+# so --help, --version and usage errors do not load them.
+
 __version_info__ = ('2026', '04', '10')
 __version__ = '-'.join(__version_info__)
 
@@ -18,23 +20,39 @@ PROGRAM_DESCRIPTION = '''
     
 Example usage:
 
-       python xpath.py --type publisher   
+       python xpath.py --type publisher --inputDir <path_to_dir>
+
+       # Parse each file once, writing every report to its own file in the current directory
+       python xpath.py --type all --inputDir <path_to_dir>
 
 Required arguments:
   
-       --type  <type>               Type of XML element to examine.  Must be one of:
+       --type  <type> [<type> ...]  Type(s) of XML element to examine.  Each must be one of:
                                     ['publisher', 'author', 'resourceFormat', 'standardResourceFormat', 
-                                     'geoExtent', 'timeExtent']
+                                     'geoExtent', 'timeExtent', 'orcid'], or 'all' for every type.
 
 Optional arguments:
 
        --inputDir  <path_to_dir>    Path to directory with ISO XML files; full directory hierarchy will be examined.
        --file      <path_to_file>   Path to ISO XML file to examine
        --datasetsOnly               Only examine ISO XML files with Resource Type: Dataset
+       --jobs      <number>         Number of worker processes used to parse and examine files; default is 1.
+                                    Output order does not depend on the number of jobs.
+       --index     <index_file>     Answer from a SQLite index of the fields each report needs, kept by file path
+                                    and modification time.  Only new or modified files in --inputDir are parsed,
+                                    and the index entries of deleted files are dropped.  Files are reported in
+                                    path order.
+       --noIndexUpdate              With --index, answer straight from the index, without checking for changed files.
+       --outputDir <path_to_dir>    Write each report to '<outputDir>/<name>_<type>.txt' instead of standard output,
+                                    where <name> is the input file or directory name.  The author report is always
+                                    written to '<name>.csv'.  Defaults to the current directory when several
+                                    report types are requested.
        
        --version                    Print this program version and exit 
        --help                       Print this program description and exit 
 
+A summary of the number of files scanned, and of any files that could not be parsed, is printed to stderr.
+
  '''
 
 x_paths = {"resourceType": ('/gmd:MD_Metadata/gmd:identificationInfo/gmd:MD_DataIdentification/gmd:descriptiveKeywords' +
@@ -67,7 +85,7 @@ ISO_NAMESPACES = {'gmd': 'http://www.isotc211.org/2005/gmd',
                   'gmx': 'http://www.isotc211.org/2005/gmx'}
 
 
-def check_directory_existence(directory_path, directory_description):
+def check_directory_existence(parser, directory_path, directory_description):
     """ generate an error if directory does not exist. """
     if not os.path.isdir(directory_path):
         message = directory_description + ' does not exist: %s\n' % directory_path
@@ -84,13 +102,26 @@ class PrintHelpOnErrorParser(argparse.ArgumentParser):
 #
 # Tree-wide operations
 #
-def get_xml_tree(source):
+def parse_xml_file(source, capture_paths=None):
+    """ Return (root, error_message); root is None and error_message is set if the source cannot be parsed.
+        With capture_paths, only those elements and their ancestors are read; see getPrunedXMLTree.
+    """
+    from lxml import etree as ElementTree  # ISO XML parser
+    from api.util.xml import getPrunedXMLTree
+
     try:
+        if capture_paths:
+            return getPrunedXMLTree(source, capture_paths), None
         etree = ElementTree.parse(source)
-        root = etree.getroot()
-    except Exception:
+        return etree.getroot(), None
+    except Exception as error:
+        return None, f'{type(error).__name__}: {error}'
+
+
+def get_xml_tree(source, capture_paths=None):
+    root, error_message = parse_xml_file(source, capture_paths)
+    if root is None:
         print(f"Unable to parse {source}")
-        root = None
     return root
 
 
@@ -125,64 +156,6 @@ def get_first_child_text_for_role(role_string, contact_x_path, child_x_path, rol
     return found_text_value
 
 
-def print_author(file, csv_writer, check_non_datasets=True):
-    cited_contact = x_paths['citedContact']
-    elements_to_search = [child_x_paths['individual_char'], child_x_paths['individual_anchor'],
-                          child_x_paths['organisation_char'], child_x_paths['organisation_anchor']]
-    tree = get_xml_tree(file)
-
-    # Return early if this file is not parsed, or it is not a dataset and checkNonDatasets is False.
-    not_parsed = tree is None
-    skip_non_dataset = (not check_non_datasets) and (not is_dataset_record(tree))
-    if not_parsed or skip_non_dataset:
-        return
-
-    author_elements = get_elements_matching_role('author', cited_contact, child_x_paths['roleCode'], tree)
-    for author_element in author_elements:
-        found_text = None
-        for element in elements_to_search:
-            name_element = author_element.xpath(element, namespaces=ISO_NAMESPACES)
-            if name_element and name_element[0].text:
-                found_text = name_element[0].text
-                word_length = len(found_text.split())
-                first_name, last_name = split_name_string(found_text)
-                if first_name and ((len(first_name) == 1) or ('.' in first_name)):
-                    middle_initial = True
-                else:
-                    middle_initial = False
-                # Flag certain cases for Impacts
-                flag = middle_initial and ('Anchor' not in element)
-                data = {'name': found_text, 'element': element, 'word length': word_length,
-                        'middle initial': middle_initial, 'flag': flag}
-                csv_writer.writerow(data)
-                break
-        if not found_text:
-            print(f"Warning: author string not found in contact element in {file}")
-
-
-def print_publisher(file, check_non_datasets=True):
-    cited_contact = x_paths['citedContact']
-    elements_to_search = [child_x_paths['individual_char'], child_x_paths['individual_anchor'],
-                          child_x_paths['organisation_char'], child_x_paths['organisation_anchor']]
-    publisher_text = []
-
-    tree = get_xml_tree(file)
-
-    # Return early if this file is not parsed, or it is not a dataset and checkNonDatasets is False.
-    not_parsed = tree is None
-    skip_non_dataset = (not check_non_datasets) and (not is_dataset_record(tree))
-    if not_parsed or skip_non_dataset:
-        return
-
-    for element in elements_to_search:
-        publisher_text = get_first_child_text_for_role('publisher', cited_contact, element, child_x_paths['roleCode'], tree)
-        if publisher_text:
-            print(str(publisher_text), file=sys.stdout)
-            break
-    if len(publisher_text) == 0:
-        print(f"Warning: publisher string not found for {file}")
-
-
 def get_child_text_list(parent_x_path, child_x_path, xml_tree):
     """ Loop over children of a parent XPath and return the text associated with all child elements.
         If no children are found or no child element has text, return the empty list.
@@ -200,26 +173,6 @@ def get_child_text_list(parent_x_path, child_x_path, xml_tree):
     return child_text_list
 
 
-def print_resource_formats(file_path, check_non_datasets, use_format_mapping):
-    tree = get_xml_tree(file_path)
-
-    # Return early if this file is not XML, or we are ignoring non-dataset records and this is a non-dataset record.
-    is_iso_file = tree is not None
-    skip_file = not is_iso_file or not (check_non_datasets or is_dataset_record(tree))
-    if not skip_file:
-        formats = get_child_text_list(x_paths["resourceFormat"], child_x_paths["formatName"], tree)
-        for fmt in formats:
-            if use_format_mapping:
-                standard_format_name = getStandardResourceFormat(fmt)
-                print(f"{standard_format_name} | {fmt}", file=sys.stdout)
-            else:
-                print(fmt, file=sys.stdout)
-        # Indicate that the file is missing format information
-        if not formats:
-            print(f"UNDEFINED FORMAT in {file_path}", file=sys.stdout)
-
-
-
 def get_datacite_resource_type(thesaurus_x_path, keyword_x_path, xml_tree):
     """ Get the first resource type keyword by searching thesaurus titles containing "Resource Type".
         Strip whitespace and return lowercase version of string.
@@ -247,101 +200,376 @@ def is_dataset_record(tree):
     return resource_type.lower() == 'dataset'
 
 
-def print_xpath_exists(file, xpath_list, check_non_datasets=True):
-    tree = get_xml_tree(file)
-    is_iso_record = tree is not None
-    is_dataset = is_iso_record and is_dataset_record(tree)
+#
+# Field extraction: each report needs only a few values from a record, so those values are extracted from the
+# parsed tree into a dictionary of fields.  Reports are produced from the fields, whether they were just extracted
+# or read back from a metadata index.
+#
+def get_authors(tree):
+    """ Return one author CSV row dictionary per author contact, or None for an author contact without a name.
+    """
+    elements_to_search = [child_x_paths['individual_char'], child_x_paths['individual_anchor'],
+                          child_x_paths['organisation_char'], child_x_paths['organisation_anchor']]
+    authors = []
+    author_elements = get_elements_matching_role('author', x_paths['citedContact'], child_x_paths['roleCode'], tree)
+    for author_element in author_elements:
+        found_text = None
+        for element in elements_to_search:
+            name_element = author_element.xpath(element, namespaces=ISO_NAMESPACES)
+            if name_element and name_element[0].text:
+                found_text = name_element[0].text
+                word_length = len(found_text.split())
+                first_name, last_name = split_name_string(found_text)
+                if first_name and ((len(first_name) == 1) or ('.' in first_name)):
+                    middle_initial = True
+                else:
+                    middle_initial = False
+                # Flag certain cases for Impacts
+                flag = middle_initial and ('Anchor' not in element)
+                authors.append({'name': found_text, 'element': element, 'word length': word_length,
+                                'middle initial': middle_initial, 'flag': flag})
+                break
+        if not found_text:
+            authors.append(None)
+    return authors
 
-    if not is_iso_record:
+
+def get_publisher(tree):
+    """ Return the first publisher name found in the record, or the empty string.
+    """
+    elements_to_search = [child_x_paths['individual_char'], child_x_paths['individual_anchor'],
+                          child_x_paths['organisation_char'], child_x_paths['organisation_anchor']]
+    for element in elements_to_search:
+        publisher_text = get_first_child_text_for_role('publisher', x_paths['citedContact'], element,
+                                                       child_x_paths['roleCode'], tree)
+        if publisher_text:
+            return str(publisher_text)
+    return ''
+
+
+def get_orcid_anchors(tree):
+    """ Return the name, ORCID URL and role of every cited contact whose individual name is an ORCID anchor.
+    """
+    anchors = []
+    for contact_element in tree.xpath(x_paths['citedContact'], namespaces=ISO_NAMESPACES):
+        for anchor in contact_element.xpath(child_x_paths['individual_anchor'], namespaces=ISO_NAMESPACES):
+            href = anchor.get('{http://www.w3.org/1999/xlink}href')
+            if href and 'orcid.org' in href:
+                role_code_elements = contact_element.xpath(child_x_paths['roleCode'], namespaces=ISO_NAMESPACES)
+                role = role_code_elements[0].get('codeListValue', '') if role_code_elements else ''
+                anchors.append({'name': anchor.text or '', 'orcid': href, 'role': role})
+    return anchors
+
+
+FIELD_EXTRACTORS = {
+    'resource_type': lambda tree: get_datacite_resource_type(x_paths["resourceType"], child_x_paths["keyword"], tree),
+    'authors': get_authors,
+    'publisher': get_publisher,
+    'formats': lambda tree: get_child_text_list(x_paths["resourceFormat"], child_x_paths["formatName"], tree),
+    'has_geo_extent': lambda tree: bool(tree.xpath(x_paths['geoExtent'], namespaces=ISO_NAMESPACES)),
+    'has_time_extent': lambda tree: bool(tree.xpath(x_paths['timeExtent'], namespaces=ISO_NAMESPACES)),
+    'orcids': get_orcid_anchors,
+}
+
+
+# The elements each field is extracted from.  Only these are read from a file, and reading stops once all of them
+# have been found; see getPrunedXMLTree.  Paths end at the repeatable element that contains the field.
+IDENTIFICATION_PATH = '/gmd:MD_Metadata/gmd:identificationInfo/gmd:MD_DataIdentification'
+FIELD_CAPTURE_PATHS = {
+    'resource_type': [IDENTIFICATION_PATH + '/gmd:descriptiveKeywords'],
+    'authors': [IDENTIFICATION_PATH + '/gmd:citation'],
+    'publisher': [IDENTIFICATION_PATH + '/gmd:citation'],
+    'formats': [IDENTIFICATION_PATH + '/gmd:resourceFormat'],
+    'has_geo_extent': [IDENTIFICATION_PATH + '/gmd:extent'],
+    'has_time_extent': [IDENTIFICATION_PATH + '/gmd:extent'],
+    'orcids': [IDENTIFICATION_PATH + '/gmd:citation'],
+}
+
+
+def get_record_fields(file, field_names=None):
+    """ Parse a file once and extract the named fields from it; all fields by default.
+        The resource type is always extracted, since every report can be limited to dataset records.
+        Returns (fields, parse_error): fields is None, and parse_error is set, if the file could not be parsed.
+    """
+    field_names = ['resource_type'] + [name for name in (field_names or FIELD_EXTRACTORS) if name != 'resource_type']
+    capture_paths = {path for name in field_names for path in FIELD_CAPTURE_PATHS[name]}
+    tree, parse_error = parse_xml_file(file, capture_paths)
+    if tree is None:
+        return None, parse_error
+    return {name: FIELD_EXTRACTORS[name](tree) for name in field_names}, None
+
+
+#
+# Reports: each maps a file name and its fields to (rows, warnings).
+#
+def is_skipped(fields, check_non_datasets):
+    """ Skip files that could not be parsed, and non-dataset records when check_non_datasets is False. """
+    return fields is None or not (check_non_datasets or fields['resource_type'] == 'dataset')
+
+
+def get_author_rows(file, fields, check_non_datasets=True):
+    """ Return (rows, warnings) for the author report: one CSV row dictionary per author of the record.
+    """
+    if is_skipped(fields, check_non_datasets):
+        return [], []
+    rows = [author for author in fields['authors'] if author is not None]
+    warnings = [f"Warning: author string not found in contact element in {file}"
+                for author in fields['authors'] if author is None]
+    return rows, warnings
+
+
+def get_publisher_rows(file, fields, check_non_datasets=True):
+    """ Return (rows, warnings) for the publisher report: the first publisher name found in the record.
+    """
+    if is_skipped(fields, check_non_datasets):
+        return [], []
+    if fields['publisher']:
+        return [fields['publisher']], []
+    return [], [f"Warning: publisher string not found for {file}"]
+
+
+def get_resource_format_rows(file, fields, check_non_datasets=True, use_format_mapping=False):
+    """ Return (rows, warnings) for the resource format reports: one row per format name in the record.
+    """
+    rows = []
+    if not is_skipped(fields, check_non_datasets):
+        for fmt in fields['formats']:
+            if use_format_mapping:
+                standard_format_name = getStandardResourceFormat(fmt)
+                rows.append(f"{standard_format_name} | {fmt}")
+            else:
+                rows.append(fmt)
+        # Indicate that the file is missing format information
+        if not fields['formats']:
+            rows.append(f"UNDEFINED FORMAT in {file}")
+    return rows, []
+
+
+def get_extent_rows(file, fields, check_non_datasets=True, field_name='has_geo_extent'):
+    """ Return (rows, warnings) for the extent reports: one row telling whether the record has the extent.
+    """
+    if fields is None:
         message = "not_a_iso_record"
-    elif not (is_dataset or check_non_datasets):
+    elif not (fields['resource_type'] == 'dataset' or check_non_datasets):
         message = "not_a_dataset_record"
-    elif is_dataset or check_non_datasets:
-        exists = True
-        for xpath in xpath_list:
-            xml_element = tree.xpath(xpath, namespaces=ISO_NAMESPACES)
-            if not xml_element:
-                exists = False
-        if exists:
-            message = "xpath_exists"
-        else:
-            message = "xpath_missing"
+    elif fields[field_name]:
+        message = "xpath_exists"
     else:
-        # If this statement is reached, there is a logic error.
-        assert False
+        message = "xpath_missing"
 
     # print out the XML file name as a something that could be stripped off later.
-    print(f'{message}  {file}', file=sys.stdout)
+    return [f'{message}  {file}'], []
 
 
-#
-#  Parse and validate command line options.
-#
-program_help = PROGRAM_DESCRIPTION + __version__
-parser = PrintHelpOnErrorParser(description=program_help, formatter_class=argparse.RawTextHelpFormatter)
+def get_orcid_rows(file, fields, check_non_datasets=True):
+    """ Return (rows, warnings) for the ORCID report: one row per contact identified by an ORCID anchor.
+    """
+    if is_skipped(fields, check_non_datasets):
+        return [], []
+    return [f"{anchor['orcid']} | {anchor['name']} | {anchor['role']} | {file}" for anchor in fields['orcids']], []
+
+
+REPORTS = {
+    'author': get_author_rows,
+    'publisher': get_publisher_rows,
+    'resourceFormat': partial(get_resource_format_rows, use_format_mapping=False),
+    'standardResourceFormat': partial(get_resource_format_rows, use_format_mapping=True),
+    'geoExtent': partial(get_extent_rows, field_name='has_geo_extent'),
+    'timeExtent': partial(get_extent_rows, field_name='has_time_extent'),
+    'orcid': get_orcid_rows,
+}
+
+# The field each report is produced from.
+REPORT_FIELDS = {
+    'author': 'authors',
+    'publisher': 'publisher',
+    'resourceFormat': 'formats',
+    'standardResourceFormat': 'formats',
+    'geoExtent': 'has_geo_extent',
+    'timeExtent': 'has_time_extent',
+    'orcid': 'orcids',
+}
+
+AUTHOR_CSV_FIELDS = ['name', 'element', 'word length', 'middle initial', 'flag']
+
+
+def get_report_rows(file, fields, report_types, check_non_datasets=True):
+    """ Run every requested report against a file's fields.
+        Returns a dictionary mapping each report type to its (rows, warnings).
+    """
+    return {report_type: REPORTS[report_type](file, fields, check_non_datasets=check_non_datasets)
+            for report_type in report_types}
+
+
+def scan_files(files, field_names=None, num_jobs=1):
+    """ Yield (file, fields, parse_error) for each file, in file list order.
+        With more than one job, files are parsed by a pool of worker processes, and their fields are streamed
+        back in order, so the reports are written by this process alone.
+    """
+    scan = partial(get_record_fields, field_names=field_names)
+    if num_jobs <= 1:
+        for file in files:
+            yield (file, *scan(file))
+        return
 
-parser.add_argument('--inputDir', nargs=1, help="base dir for XML files")
-parser.add_argument('--file', nargs=1, help="XML file to search")
-parser.add_argument('--datasetsOnly', action='store_true', help="Limit output to records with resource type 'Dataset'")
-parser.add_argument('--version', action='version', version="%(prog)s (" + __version__ + ")")
+    from concurrent.futures import ProcessPoolExecutor
+    from api.batch import getChunkSize
+    with ProcessPoolExecutor(max_workers=num_jobs) as executor:
+        for (file, result) in zip(files, executor.map(scan, files, chunksize=getChunkSize(len(files), num_jobs))):
+            yield (file, *result)
 
-requiredArgs = parser.add_argument_group('required arguments')
-typeChoices = ['author', 'publisher', 'resourceFormat', 'standardResourceFormat', 'geoExtent', 'timeExtent']
-requiredArgs.add_argument('--type', nargs=1, required=True, choices=typeChoices, help=f"Type of XML element")
 
-args = parser.parse_args()
+class ReportOutput:
+    """ Destination for the rows of one report: a CSV file for the author report, and otherwise a text file,
+        or standard output when no file name is given.
+    """
 
+    def __init__(self, report_type, file_name=None):
+        self.report_type = report_type
+        self.csv_writer = None
+        if file_name:
+            self.stream = open(file_name, 'w', newline='')
+        else:
+            self.stream = sys.stdout
+        if report_type == 'author':
+            import csv
+            self.csv_writer = csv.DictWriter(self.stream, fieldnames=AUTHOR_CSV_FIELDS)
+            self.csv_writer.writeheader()
+
+    def write_rows(self, rows):
+        if self.csv_writer:
+            self.csv_writer.writerows(rows)
+        else:
+            for row in rows:
+                print(row, file=self.stream)
 
-###
-### START OF MAIN PROGRAM
-###
+    def close(self):
+        if self.stream is not sys.stdout:
+            self.stream.close()
 
-def perform_operation(file, csv_writer):
-    """ Chooses which action to perform based on command-line options.
+
+def get_report_outputs(report_types, base_name, output_dir=None):
+    """ Open one output per report type.  The author report always goes to '<base_name>.csv'; other reports go to
+        standard output, unless output_dir is given, in which case each goes to '<output_dir>/<base_name>_<type>.txt'.
+    """
+    outputs = {}
+    for report_type in report_types:
+        if report_type == 'author':
+            file_name = os.path.join(output_dir or '', base_name + '.csv')
+        elif output_dir:
+            file_name = os.path.join(output_dir, f'{base_name}_{report_type}.txt')
+        else:
+            file_name = None
+        outputs[report_type] = ReportOutput(report_type, file_name)
+    return outputs
+
+
+def update_index(index, input_dir, files, num_jobs=1, batch_size=1000):
+    """ Bring the metadata index up to date with the files found in input_dir: new and modified files are parsed,
+        on num_jobs worker processes, and files that no longer exist are dropped from the index.
+        Returns (number of files parsed, number of files dropped).
+    """
+    changed, removed = index.plan_update(input_dir, files)
+    batch = []
+    for ((path, mtime_ns, size), (file, fields, parse_error)) in zip(changed, scan_files([c[0] for c in changed],
+                                                                                         num_jobs=num_jobs)):
+        batch.append((path, mtime_ns, size, fields, parse_error))
+        if len(batch) >= batch_size:
+            index.put_records(batch)
+            batch = []
+    index.put_records(batch)
+    index.remove_records(removed)
+    return len(changed), len(removed)
+
+
+def get_indexed_records(index, input_dir):
+    """ Yield (file, fields, parse_error) from the index for every file in input_dir, in path order.
+        File names are given relative to input_dir, as they would be when scanning the directory.
     """
+    base_dir = os.path.abspath(input_dir)
+    for (path, fields, parse_error) in index.get_records(input_dir):
+        yield (Path(input_dir) / os.path.relpath(path, base_dir)).as_posix(), fields, parse_error
+
+
+def main():
+    #
+    #  Parse and validate command line options.
+    #
+    program_help = PROGRAM_DESCRIPTION + __version__
+    parser = PrintHelpOnErrorParser(description=program_help, formatter_class=argparse.RawTextHelpFormatter)
+
+    parser.add_argument('--inputDir', nargs=1, help="base dir for XML files")
+    parser.add_argument('--file', nargs=1, help="XML file to search")
+    parser.add_argument('--datasetsOnly', action='store_true', help="Limit output to records with resource type 'Dataset'")
+    parser.add_argument('--outputDir', nargs=1, help="Directory for report files", default=[None])
+    parser.add_argument('--jobs', nargs=1, type=int, help="Number of worker processes", default=[1])
+    parser.add_argument('--index', nargs=1, help="SQLite metadata index file", default=[None])
+    parser.add_argument('--noIndexUpdate', action='store_true', help="Answer from the index without checking files")
+    parser.add_argument('--version', action='version', version="%(prog)s (" + __version__ + ")")
+
+    requiredArgs = parser.add_argument_group('required arguments')
+    typeChoices = list(REPORTS) + ['all']
+    requiredArgs.add_argument('--type', nargs='+', required=True, choices=typeChoices, help=f"Type(s) of XML element")
+
+    args = parser.parse_args()
+
+    if args.file is None and args.inputDir is None:
+        parser.error('either --file or --inputDir is required')
+    index_file = args.index[0]
+    if index_file is not None and args.inputDir is None:
+        parser.error('--index requires --inputDir')
+    if args.noIndexUpdate and index_file is None:
+        parser.error('--noIndexUpdate requires --index')
+
+    report_types = list(REPORTS) if 'all' in args.type else list(dict.fromkeys(args.type))
+
+    # Several reports cannot share standard output, so they default to report files in the current directory.
+    output_dir = args.outputDir[0]
+    if output_dir is None and len(report_types) > 1:
+        output_dir = '.'
+    if output_dir is not None:
+        check_directory_existence(parser, output_dir, 'Output directory')
+
+    if args.file is not None:
+        base_name = args.file[0].split('/')[-1]
+        files = [args.file[0]]
+    else:
+        check_directory_existence(parser, args.inputDir[0], 'Input directory')
+        base_name = args.inputDir[0].rstrip('/').split('/')[-1]
+        if not args.noIndexUpdate:
+            files = [path.as_posix() for path in Path(args.inputDir[0]).rglob('*.xml')]
+
     # Decide whether to limit output to dataset records only
     check_non_datasets = not args.datasetsOnly
 
-    if args.type[0] == 'publisher':
-        print_publisher(file, check_non_datasets)
-    elif args.type[0] == 'author':
-        print_author(file, csv_writer, check_non_datasets)
-    elif args.type[0] == 'resourceFormat':
-        print_resource_formats(file, check_non_datasets, use_format_mapping=False)
-    elif args.type[0] == 'standardResourceFormat':
-        print_resource_formats(file, check_non_datasets, use_format_mapping=True)
-    elif args.type[0] == 'geoExtent':
-        print_xpath_exists(file, [x_paths['geoExtent']], check_non_datasets)         # check geographical extent existence
-    elif args.type[0] == 'timeExtent':
-        print_xpath_exists(file, [x_paths['timeExtent']], check_non_datasets)      # check temporal extent existence
-
-    # printXPathExists(file, [xpaths['resourceFormat']], checkNonDatasets)  # check resource format existence
-    # check spatio-temporal extent existence
-    #printXPathExists(file, [xpaths['timeExtent'], xpaths['geoExtent']], checkNonDatasets)
-
-
-# readSTDIN = (args.inputDir == None)
-# if readSTDIN:
-#     tree = getXMLTree(sys.stdin)
-
-
-csvfile=None
-csv_writer = None
-if args.type[0] == 'author':
-    filename = 'author.csv'
-    if args.file is not None:
-        filename = args.file[0].split('/')[-1]
-    elif args.inputDir[0] is not None:
-        filename = args.inputDir[0].split('/')[-1]
-    fields = ['name', 'element', 'word length', 'middle initial', 'flag']
-    csvfile = open(filename + '.csv', 'w', newline='')
-    csv_writer = csv.DictWriter(csvfile, fieldnames=fields)
-    csv_writer.writeheader()
-
-readFile = (args.file is not None)
-if readFile:
-    perform_operation(args.file[0], csv_writer)
-else:
-    check_directory_existence(args.inputDir[0], 'Input directory')
-    for path in Path(args.inputDir[0]).rglob('*.xml'):
-        perform_operation(path.as_posix(), csv_writer)
+    if index_file is not None:
+        # Answer from the metadata index, after parsing only the files that changed since it was last updated.
+        from utils.iso_index import MetadataIndex
+        index = MetadataIndex(index_file)
+        if not args.noIndexUpdate:
+            num_parsed, num_dropped = update_index(index, args.inputDir[0], files, args.jobs[0])
+            print(f'Updated index {index_file}: {num_parsed} files parsed, {num_dropped} dropped.', file=sys.stderr)
+        records = get_indexed_records(index, args.inputDir[0])
+    else:
+        field_names = sorted({REPORT_FIELDS[report_type] for report_type in report_types})
+        records = scan_files(files, field_names, args.jobs[0])
+
+    from api.batch import BatchSummary
+    outputs = get_report_outputs(report_types, base_name, output_dir)
+    summary = BatchSummary('Parsed', 'files')
+    try:
+        for (file, fields, parse_error) in records:
+            summary.add(file, parse_error)
+            reports = get_report_rows(file, fields, report_types, check_non_datasets)
+            for (report_type, (rows, warnings)) in reports.items():
+                outputs[report_type].write_rows(rows)
+                for warning in warnings:
+                    print(warning)
+    finally:
+        for output in outputs.values():
+            output.close()
+    summary.report(sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
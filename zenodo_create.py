@@ -1,11 +1,11 @@
 import sys
 
-import requests
 import argparse
 import os
 import json
 
-from api.translate.zenodo import extract_metadata
+# The metadata extraction and upload modules, and lxml and requests with them, are imported once the command line
+# has been parsed, so --help and --version return at once.
 
 
 PROGRAM_DESCRIPTION = '''
@@ -30,6 +30,17 @@ Optional arguments:
        --test                        Upload to Zenodo's sandbox server instead; requires a sandbox API token.
        --resume <resume_file_path>   Resume uploading to a recently created dataset using an automatically generated 
                                      resume file; default location is /tmp/resume_upload_<dataset_id>.json .
+                                     Files already uploaded, and unchanged since, are skipped.
+       --workers <number>            Number of files to upload concurrently; default is 4.
+       --retries <number>            Number of times a failed file upload is retried, with exponential
+                                     backoff; default is 5.
+       --api_url <url>               Zenodo API base URL, e.g. for a local test server; overrides --test.
+       --verify_only <dataset_id>    Upload nothing; instead compare the MD5 checksum of every file in the folder
+                                     with the checksums listed for an existing dataset, hashing --workers files
+                                     at a time.  Exits with status 1 if any file is missing or differs.
+
+Each file's MD5 checksum is computed while it uploads and compared with the checksum reported by Zenodo;
+a file whose checksums differ is uploaded again.
 
        --version                     Print the program version and exit.
        --help                        Print the program description and exit.
@@ -42,157 +53,201 @@ __version_info__ = ('2025', '05', '02')
 __version__ = '-'.join(__version_info__)
 
 
-#
-#  Parse the command line options.
-#
-
-programHelp = PROGRAM_DESCRIPTION + __version__
-parser = argparse.ArgumentParser(description=programHelp)
-parser.add_argument("--test", help="Upload to Zenodo Sandbox server", action='store_const', const=True)
-parser.add_argument("--publish", help="Publish dataset after upload", action='store_const', const=True)
-parser.add_argument("--resume_file", nargs=1, help="Resume uploading using dataset resume file", default=['None'])
-parser.add_argument("--iso_file", nargs=1, help="Path to ISO XML Metadata file", default=['None'])
-parser.add_argument('--version', action='version', version="%(prog)s (" + __version__ + ")")
-
-requiredArgs = parser.add_argument_group('required arguments')
-requiredArgs.add_argument("--folder", nargs=1, required=True, help="File Upload Folder")
-
-args = parser.parse_args()
-
-upload_folder = args.folder[0]
-iso_file = args.iso_file[0]
-resume_file = args.resume_file[0]
-TEST_UPLOAD = args.test
-PUBLISH = args.publish
-
-# Check validity of upload folder path, resume file path, iso_file path
-assert(os.path.isdir(upload_folder))
-
-if resume_file != 'None':
-    assert (os.path.isfile(resume_file))
-
-metadata = {}
-if iso_file != 'None':
-    assert(os.path.isfile(iso_file))
-    metadata = extract_metadata(iso_file)
-    # Provide verbose feedback on the command line
-    metadata_pretty = json.dumps(metadata, indent=4)
-    print(f'metadata = {metadata_pretty}')
-
-
-if TEST_UPLOAD:
-    upload_url = 'https://sandbox.zenodo.org/api/deposit/depositions'
-else:
-    upload_url = 'https://zenodo.org/api/deposit/depositions'
-
-#
-# Get the environment variable 'ZENODO_TOKEN'
-#
-
-api_token = os.environ.get('ZENODO_TOKEN')
-params = {'access_token': api_token}
-headers = {"Content-Type": "application/json"}
-
-print(f'upload_url == {upload_url}')
-print(f'TEST_UPLOAD == {TEST_UPLOAD}')
-print(f'resume_file == {resume_file}')
-print(f'api_token == "{api_token}"')
-print(f'upload_folder == "{upload_folder}"\n\n')
-
-#
-#  Get the file paths for upload.
-#
-
-upload_folder = os.path.abspath(upload_folder)
-file_info = []
-print(f'Files to upload in {upload_folder}:')
-
-for root, subdirs, files in os.walk(upload_folder):
-    for file_name in files:
-        # Ignore hidden files always
-        if file_name.startswith('.'):
-            print(f'    (skipping hidden file {file_name} ...)')
-            continue
-        print(f'    {file_name}')
-        file_path = os.path.join(root, file_name)
-        file_info.append((file_name, file_path))
-
-# Verify that all filenames are unique
-file_names = [file_name for (file_name, file_path) in file_info]
-if len(file_names) != len(set(file_names)):
-    print('\n  ERROR: file names are not unique.  Aborting...', file=sys.stderr)
-    exit(2)
-
-
-#
-#  Create a new dataset on Zenodo if no resume file is provided.
-#
-if resume_file == 'None':
-    r = requests.post(upload_url, params=params, json={}, headers=headers)
-
-    # Exit if status code is not success.
-    if r.status_code != 201:
-        print(r.json())
-        exit(r.status_code)
-
-    dataset_id = r.json()["id"]
-    bucket_url = r.json()["links"]["bucket"]
-    # Archive DOI value to resume file if it exists
-    dataset_doi = metadata.get('doi', '')
-    resume_upload_data = {'dataset_id': dataset_id, 'bucket_url': bucket_url, 'doi': dataset_doi}
-
-    # Save upload ids to a 'resume file'
-    resume_file_folder = '/tmp'
-    resume_file_name = f'resume_upload_{dataset_id}.json'
-    resume_file = f'{resume_file_folder}/{resume_file_name}'
-    with open(resume_file, "w") as f:
-        json.dump(resume_upload_data, f, indent=4)
-else:
-    # Grab upload parameters from a previous upload attempt
-    with open(resume_file, 'r') as openfile:
-        resume_data = json.load(openfile)
-        dataset_id = resume_data['dataset_id']
-        bucket_url = resume_data['bucket_url']
-
-
-print(f'\n\n  "UPLOAD RESUME" CONFIGURATION FILE = {resume_file}\n\n')
-
-#
-#  Upload files.
-#
-for (file_name, file_path) in file_info:
-    with open(file_path, "rb") as fp:
-        r = requests.put(
-            "%s/%s" % (bucket_url, file_name),
-            data=fp,
-            params=params,
-        )
-        try:
-            checksum = r.json()['checksum']
-            size =  r.json()['size']
-            print(f'{file_name}: checksum= {checksum}, size= {size}')
-        except KeyError:
+def parse_arguments():
+    """ Parse the command line options. """
+    programHelp = PROGRAM_DESCRIPTION + __version__
+    parser = argparse.ArgumentParser(description=programHelp)
+    parser.add_argument("--test", help="Upload to Zenodo Sandbox server", action='store_const', const=True)
+    parser.add_argument("--publish", help="Publish dataset after upload", action='store_const', const=True)
+    parser.add_argument("--resume_file", nargs=1, help="Resume uploading using dataset resume file", default=['None'])
+    parser.add_argument("--iso_file", nargs=1, help="Path to ISO XML Metadata file", default=['None'])
+    parser.add_argument("--workers", nargs=1, type=int, help="Number of concurrent file uploads", default=[4])
+    parser.add_argument("--retries", nargs=1, type=int, help="Number of retries per failed file upload", default=[5])
+    parser.add_argument("--api_url", nargs=1, help="Zenodo API base URL", default=['None'])
+    parser.add_argument("--verify_only", "--verify-only", nargs=1,
+                        help="Compare local checksums with those of an existing dataset", default=['None'])
+    parser.add_argument('--version', action='version', version="%(prog)s (" + __version__ + ")")
+
+    requiredArgs = parser.add_argument_group('required arguments')
+    requiredArgs.add_argument("--folder", nargs=1, required=True, help="File Upload Folder")
+
+    args = parser.parse_args()
+    return args
+
+
+def main():
+    args = parse_arguments()
+
+    from api import zenodo_upload
+
+    upload_folder = args.folder[0]
+    iso_file = args.iso_file[0]
+    resume_file = args.resume_file[0]
+    TEST_UPLOAD = args.test
+    PUBLISH = args.publish
+    num_workers = max(1, args.workers[0])
+    num_retries = max(0, args.retries[0])
+    api_url = args.api_url[0]
+    verify_dataset_id = args.verify_only[0]
+
+    # Check validity of upload folder path, resume file path, iso_file path
+    assert(os.path.isdir(upload_folder))
+
+    if resume_file != 'None':
+        assert (os.path.isfile(resume_file))
+
+    metadata = {}
+    if iso_file != 'None':
+        assert(os.path.isfile(iso_file))
+        from api.translate.zenodo import extract_metadata
+        metadata = extract_metadata(iso_file)
+        # Provide verbose feedback on the command line
+        metadata_pretty = json.dumps(metadata, indent=4)
+        print(f'metadata = {metadata_pretty}')
+
+
+    if api_url == 'None':
+        api_url = zenodo_upload.ZENODO_SANDBOX_API_URL if TEST_UPLOAD else zenodo_upload.ZENODO_API_URL
+    upload_url = f'{api_url}/deposit/depositions'
+
+    #
+    # Get the environment variable 'ZENODO_TOKEN'
+    #
+
+    api_token = os.environ.get('ZENODO_TOKEN')
+    params = {'access_token': api_token}
+    headers = {"Content-Type": "application/json"}
+
+    print(f'upload_url == {upload_url}')
+    print(f'TEST_UPLOAD == {TEST_UPLOAD}')
+    print(f'resume_file == {resume_file}')
+    print(f'api_token == "{api_token}"')
+    print(f'upload_folder == "{upload_folder}"')
+    print(f'workers == {num_workers}\n\n')
+
+    # All requests share one pool of keep-alive connections.
+    session = zenodo_upload.get_session(num_workers)
+
+    #
+    #  Get the file paths for upload.
+    #
+
+    upload_folder = os.path.abspath(upload_folder)
+    file_info = []
+    print(f'Files to upload in {upload_folder}:')
+
+    for root, subdirs, files in os.walk(upload_folder):
+        for file_name in files:
+            # Ignore hidden files always
+            if file_name.startswith('.'):
+                print(f'    (skipping hidden file {file_name} ...)')
+                continue
+            print(f'    {file_name}')
+            file_path = os.path.join(root, file_name)
+            file_info.append((file_name, file_path))
+
+    # Verify that all filenames are unique
+    file_names = [file_name for (file_name, file_path) in file_info]
+    if len(file_names) != len(set(file_names)):
+        print('\n  ERROR: file names are not unique.  Aborting...', file=sys.stderr)
+        exit(2)
+
+
+    #
+    #  In verify-only mode, hash local files concurrently and compare them with the dataset's file listing.
+    #
+    if verify_dataset_id != 'None':
+        remote_checksums = zenodo_upload.get_deposition_checksums(session, f'{upload_url}/{verify_dataset_id}', params)
+        print(f'\nVerifying {len(file_info)} files against dataset {verify_dataset_id}:')
+        num_bad = 0
+        for (file_name, local_checksum, remote_checksum) in zenodo_upload.verify_files(file_info, remote_checksums,
+                                                                                       num_workers):
+            if remote_checksum is None:
+                status = 'MISSING from dataset'
+            elif local_checksum != remote_checksum:
+                status = f'MISMATCH: local {local_checksum}, Zenodo {remote_checksum}'
+            else:
+                print(f'    {file_name}: OK {local_checksum}')
+                continue
+            num_bad += 1
+            print(f'    {file_name}: {status}', file=sys.stderr)
+        print(f'\n{len(file_info) - num_bad} of {len(file_info)} files verified.')
+        exit(1 if num_bad else 0)
+
+
+    #
+    #  Create a new dataset on Zenodo if no resume file is provided.
+    #
+    if resume_file == 'None':
+        r = session.post(upload_url, params=params, json={}, headers=headers)
+
+        # Exit if status code is not success.
+        if r.status_code != 201:
             print(r.json())
             exit(r.status_code)
 
-#
-# Upload metadata if there is any.
-#
-if metadata:
-    print('\n Uploading metadata...\n')
-    upload_metadata = {'metadata': metadata}
-    r = requests.put('%s/%s' % (upload_url, dataset_id),
-                     params=params, data=json.dumps(upload_metadata),
-                     headers=headers)
-    if r.status_code != 200:
-        print(r.json())
-        exit(r.status_code)
+        dataset_id = r.json()["id"]
+        bucket_url = r.json()["links"]["bucket"]
+        # Archive DOI value to resume file if it exists
+        dataset_doi = metadata.get('doi', '')
+        resume_upload_data = {'dataset_id': dataset_id, 'bucket_url': bucket_url, 'doi': dataset_doi, 'files': {}}
+
+        # Save upload ids to a 'resume file'
+        resume_file_folder = '/tmp'
+        resume_file_name = f'resume_upload_{dataset_id}.json'
+        resume_file = f'{resume_file_folder}/{resume_file_name}'
+        resume = zenodo_upload.ResumeFile(resume_file, resume_upload_data)
+        resume.save()
+    else:
+        # Grab upload parameters, and the list of finished files, from a previous upload attempt
+        resume = zenodo_upload.ResumeFile.load(resume_file)
+        dataset_id = resume.data['dataset_id']
+        bucket_url = resume.data['bucket_url']
+
+
+    print(f'\n\n  "UPLOAD RESUME" CONFIGURATION FILE = {resume_file}\n\n')
+
+    #
+    #  Upload files concurrently; each finished file is recorded in the resume file.
+    #
+    failed_uploads = []
+    for (file_name, result, error) in zenodo_upload.upload_files(session, bucket_url, file_info, params, resume,
+                                                                 num_workers, num_retries):
+        if error:
+            print(f'{file_name}: UPLOAD FAILED: {error}', file=sys.stderr)
+            failed_uploads.append(file_name)
+        elif result is None:
+            print(f'{file_name}: already uploaded, skipping')
+        else:
+            print(f'{file_name}: checksum= {result["checksum"]}, size= {result["size"]}')
+
+    if failed_uploads:
+        print(f'\n  ERROR: {len(failed_uploads)} file(s) failed to upload; rerun with --resume_file {resume_file}',
+              file=sys.stderr)
+        exit(1)
+
+    #
+    # Upload metadata if there is any.
+    #
+    if metadata:
+        print('\n Uploading metadata...\n')
+        upload_metadata = {'metadata': metadata}
+        r = session.put('%s/%s' % (upload_url, dataset_id),
+                        params=params, data=json.dumps(upload_metadata),
+                        headers=headers)
+        if r.status_code != 200:
+            print(r.json())
+            exit(r.status_code)
+
+
+    if PUBLISH:
+        r = session.post(upload_url + '/%s/actions/publish' % dataset_id, params=params)
+        print(f'\nPublish status code: {r.status_code}')
 
 
-if PUBLISH:
-    r = requests.post(upload_url + '/%s/actions/publish' % dataset_id, params=params)
-    print(f'\nPublish status code: {r.status_code}')
 
+    print(f'\n...DONE\n')
 
 
-print(f'\n...DONE\n')
+if __name__ == '__main__':
+    main()